@@ -0,0 +1,178 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""A library interface to the operations, for calling them from other Python code (i.e. services).
+
+Each function takes an image as an (H, W, C) uint8 array or a batch of images of the same size as an (N, H, W, C)
+array (i.e. the frames of a video or a stack of thumbnails), and returns its result in the same layout. Options are
+keyword arguments with the defaults of the command line, and nothing is printed.
+
+A batch is processed with vectorized calls rather than a loop over its frames: pointwise operations treat the
+frames as the rows of one tall image, filters stack the frames along the channel axis (so one engine call filters
+a group of frames, see GROUP_PIXELS), geometric operations return views of the whole batch, and edge normalizes
+each frame on its own.
+
+    import api
+
+    thumbnails = api.gaussian_blur(thumbnails, sigma=1.5)
+    edges = api.chain(frames, ['grayscale', 'blur', 'edge'])
+
+As with the operations themselves, out= gives an array to write the result into instead of a new one.
+"""
+
+import numpy as np
+
+import operations as op
+from operations.colour import MODELS
+from operations.registry import get_operation
+
+# Filters and chains process the frames of a batch in groups of about this many pixels: enough to amortize the cost
+# of each call over small frames, and few enough for the planes of a group to stay in the processor caches
+# (larger groups were slower for 128² and 512² frames)
+GROUP_PIXELS = 1 << 18
+
+
+def check_images(images: np.ndarray) -> np.ndarray:
+    """Returns the array if it is a uint8 image or a batch of images.
+
+    Raises:
+        ValueError: If the array is not an (H, W, C) or (N, H, W, C) uint8 array with 1 to 4 channels
+            and at least one pixel (and frame)
+    """
+
+    if not isinstance(images, np.ndarray) or images.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 array (got {getattr(images, 'dtype', type(images).__name__)})")
+
+    if images.ndim not in (3, 4) or images.shape[-1] not in MODELS or 0 in images.shape:
+        raise ValueError(f"Expected an (H, W, C) image or an (N, H, W, C) batch of images with 1 to 4 channels "
+                         f"(got shape {images.shape})")
+
+    return images
+
+
+def box_blur(images: np.ndarray, *, radius: int = 1, passes: int = 1, collapse: bool = False,
+             precision: str = 'float64', out: np.ndarray = None) -> np.ndarray:
+    """Blurs images with a box blur (see operations.box_blur)."""
+    return _in_groups(lambda group, out: op.box_blur(group, radius, passes, collapse, precision, out), images, out)
+
+
+def chain(images: np.ndarray, operations: list[str], *, optimize: bool = True) -> np.ndarray:
+    """Applies operations with their default arguments in sequence (see operations.chain).
+
+    Raises:
+        ValueError: If an operation can not be used in a chain
+    """
+    return _in_groups(lambda group, _: op.chain(group, operations, optimize=optimize, verbose=False), images)
+
+
+def chain_many(images: np.ndarray, pipelines: list[list[str]], *, optimize: bool = True) -> list[np.ndarray]:
+    """Applies several chains of operations, performing the steps they share only once (see operations.chain_many)."""
+
+    # Perform the pipelines on each group of frames, then join the groups of each pipeline
+    groups = [op.chain_many(group, pipelines, optimize=optimize, verbose=False) for group in _groups(images)]
+    return [results[0] if len(results) == 1 else np.concatenate(results) for results in zip(*groups)]
+
+
+def convolve(images: np.ndarray, kernel: np.ndarray, *, passes: int = 1, method: str = 'auto',
+             collapse: bool = False, precision: str = 'float64', out: np.ndarray = None) -> np.ndarray:
+    """Convolves images with an odd-sized square kernel (see operations.convolve)."""
+    kernel = np.asarray(kernel)
+    return _in_groups(lambda group, out: op.convolve(group, kernel, passes, method, collapse, precision, out),
+                      images, out)
+
+
+def crop(images: np.ndarray, x1: int, y1: int, x2: int, y2: int, *, out: np.ndarray = None) -> np.ndarray:
+    """Crops images to within the given coordinates, returning a view unless out is given (see operations.crop)."""
+    return op.crop(check_images(images), x1, y1, x2, y2, out)
+
+
+def edge(images: np.ndarray, *, cutoff: int = 150, collapse: bool = False, operator: str = 'sobel',
+         direction: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Detects the edges in images, normalizing each frame by its own largest gradient (see operations.edge)."""
+    return _in_groups(lambda group, out: op.edge(group, cutoff, collapse, operator, direction, out), images, out)
+
+
+def gaussian_blur(images: np.ndarray, *, sigma: float = 2, precision: str = 'float64',
+                  out: np.ndarray = None) -> np.ndarray:
+    """Blurs images with an approximate Gaussian blur (see operations.gaussian_blur)."""
+    return _in_groups(lambda group, out: op.gaussian_blur(group, sigma, precision, out), images, out)
+
+
+def grayscale(images: np.ndarray, *, out: np.ndarray = None) -> np.ndarray:
+    """Converts images to a single luminance channel, plus alpha (see operations.grayscale)."""
+    return op.grayscale(check_images(images), out)
+
+
+def invert(images: np.ndarray, *, out: np.ndarray = None) -> np.ndarray:
+    """Inverts the colours of images (see operations.invert)."""
+    return op.invert(check_images(images), out)
+
+
+def mirror(images: np.ndarray, *, vertical: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Mirrors images, returning a view unless out is given (see operations.mirror)."""
+    return op.mirror(check_images(images), vertical, out)
+
+
+def perform(images: np.ndarray, operation: str) -> np.ndarray:
+    """Performs a registered operation (i.e. a third-party one) with its default arguments.
+
+    Raises:
+        ValueError: If no operation is registered with the name
+    """
+    return get_operation(operation).perform(check_images(images), None)
+
+
+def rotate(images: np.ndarray, *, turns: int = 1, ccw: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Rotates images in 90 degree turns, returning a view unless out is given (see operations.rotate)."""
+    return op.rotate(check_images(images), turns, ccw, out)
+
+
+def sepia(images: np.ndarray, *, out: np.ndarray = None) -> np.ndarray:
+    """Sepia tones images (see operations.sepia)."""
+    return op.sepia(check_images(images), out)
+
+
+def sharpen(images: np.ndarray, *, amount: float = 3, precision: str = 'float64',
+            out: np.ndarray = None) -> np.ndarray:
+    """Sharpens images with unsharp masking (see operations.sharpen)."""
+    return _in_groups(lambda group, out: op.sharpen(group, amount, precision, out), images, out)
+
+
+def threshold(images: np.ndarray, *, cutoff: int = 128, binary: bool = False, invert: bool = False,
+              out: np.ndarray = None) -> np.ndarray:
+    """Applies a threshold to images (see operations.threshold)."""
+    return op.threshold(check_images(images), cutoff, binary, invert, out)
+
+
+def _groups(images: np.ndarray) -> list[np.ndarray]:
+    """Splits a batch into groups of consecutive frames of about GROUP_PIXELS pixels (an image is one group)."""
+
+    images = check_images(images)
+    if images.ndim == 3:
+        return [images]
+
+    frames = max(1, GROUP_PIXELS // (images.shape[1] * images.shape[2]))
+    return [images[start:start + frames] for start in range(0, len(images), frames)]
+
+
+def _in_groups(function, images: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Applies a function of a group of frames and its output array to each group of a batch (see _groups)."""
+
+    groups = _groups(images)
+    if len(groups) == 1:
+        return function(groups[0], out)
+
+    # Write each group into its frames of the output, which is allocated once the first result gives its shape
+    start = 0
+    for group in groups:
+        frames = None if out is None else out[start:start + len(group)]
+        result = function(group, frames)
+        if out is None:
+            out = np.empty(images.shape[:1] + result.shape[1:], dtype=result.dtype)
+            frames = out[:len(group)]
+        if result is not frames:  # i.e. a chain, which always returns a new array
+            frames[...] = result
+        start += len(group)
+
+    return out
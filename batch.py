@@ -0,0 +1,189 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Processing many images in one invocation with a pipelined decode, process and encode."""
+
+import glob
+import queue
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from image_io import NPY_SUFFIX, RAW_SUFFIX, load_image, save_image
+from utils import get_file_size
+
+# Marks the end of the work in a pipeline queue
+_DONE = object()
+
+
+def collect_inputs(pattern: str, stdin=None) -> list[Path]:
+    """Expands a batch input specification into a list of image files.
+
+    Args:
+        pattern (str): A directory (all images directly inside it), a glob pattern (i.e. 'scans/**/*.png'),
+            or '-' to read one path per line from stdin
+        stdin (optional): The stream to read paths from when the pattern is '-'
+
+    Returns:
+        list[Path]: The input files in order
+    """
+
+    if pattern == '-':
+        return [Path(line.strip()) for line in stdin if line.strip()]
+
+    if Path(pattern).is_dir():
+        extensions = set(Image.registered_extensions()) | {NPY_SUFFIX, RAW_SUFFIX}
+        return sorted(path for path in Path(pattern).iterdir() if path.is_file() and path.suffix.lower() in extensions)
+
+    return [Path(path) for path in sorted(glob.glob(pattern, recursive=True)) if Path(path).is_file()]
+
+
+def output_path(in_file: Path, template: str) -> Path:
+    """Builds the output path of an image from a name template (saved in the same directory as the input).
+
+    The template may contain {stem} (the input name without its extension) and {suffix} (the input extension).
+    A template without {stem} is appended to the input name, i.e. 'edges.png' turns 'a.jpg' into 'a-edges.png'.
+    """
+
+    if '{stem}' not in template:
+        template = '{stem}-' + template
+
+    return in_file.parent.joinpath(template.format(stem=in_file.stem, suffix=in_file.suffix))
+
+
+def run_batch(in_files: list[Path], out_path, process, workers: int = 1, depth: int = None,
+              load=load_image, save=save_image, encoders: int = None) -> int:
+    """Decodes, processes and encodes many images, overlapping the three stages.
+
+    Each stage runs on its own threads and hands images to the next through a bounded queue, so at most
+    a few decoded images are held in memory at once (the decoder waits while the queues are full).
+    Encoding runs on its own pool of background threads (Pillow releases the GIL while compressing),
+    so processing does not wait for slow encoders such as zlib.
+    A summary of the throughput and the time spent in each stage is printed at the end.
+
+    Args:
+        in_files (list[Path]): The images to process
+        out_path: A function giving the output path of an input file
+        process: A function applying the operation(s) to an image array
+        workers (int, optional): The number of images processed concurrently. Defaults to 1
+        depth (int, optional): The capacity of each queue between stages. Defaults to twice the workers
+        load (optional): A function reading an image file into an array. Defaults to load_image
+        save (optional): A function writing an image array to a file. Defaults to save_image
+        encoders (int, optional): The number of images encoded concurrently. Defaults to the workers
+
+    Returns:
+        int: The number of images which failed
+    """
+
+    encoders = encoders or workers
+    depth = depth or workers * 2
+    decoded = queue.Queue(maxsize=depth)
+    processed = queue.Queue(maxsize=depth)
+    inputs = queue.Queue()
+    for in_file in in_files:
+        inputs.put(in_file)
+    for _ in range(workers):
+        inputs.put(_DONE)
+
+    lock = threading.Lock()
+    stats = {'done': 0, 'failed': 0, 'bytes': 0, 'pixels': 0}
+    seconds = {'decode': 0.0, 'process': 0.0, 'encode': 0.0}  # summed over the threads of each stage
+
+    def timed(stage: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with lock:
+                seconds[stage] += time.perf_counter() - start
+
+    def fail(in_file: Path, error: Exception):
+        with lock:
+            stats['failed'] += 1
+            print(f"[ERROR] {in_file}: {error}")
+
+    def decode(in_file: Path):
+        try:
+            img = timed('decode', load, in_file)
+            with lock:
+                stats['bytes'] += in_file.stat().st_size
+            return in_file, img
+        except Exception as e:
+            fail(in_file, e)
+
+    def compute(item):
+        in_file, img = item
+        try:
+            return in_file, timed('process', process, img)
+        except Exception as e:
+            fail(in_file, e)
+
+    def encode(item):
+        in_file, img = item
+        try:
+            out_file = out_path(in_file)
+            timed('encode', save, img, out_file)
+            with lock:
+                stats['done'] += 1
+                stats['pixels'] += img.shape[0] * img.shape[1]
+                print(f"[{stats['done'] + stats['failed']}/{len(in_files)}] {in_file.name} -> {out_file.name} "
+                      f"({img.shape[1]}x{img.shape[0]}), {get_file_size(out_file)}")
+        except Exception as e:
+            fail(in_file, e)
+
+    start = time.perf_counter()
+
+    threads = (_stage(decode, inputs, decoded, workers)
+               + _stage(compute, decoded, processed, workers, encoders)
+               + _stage(encode, processed, None, encoders))
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {stats['done']} image(s) in {elapsed:.2f} s ({stats['failed']} failed): "
+          f"{stats['done'] / elapsed:.2f} images/s, {stats['bytes'] / elapsed / 1024 ** 2:.2f} MB/s read, "
+          f"{stats['pixels'] / elapsed / 1e6:.2f} Mpix/s")
+
+    # The stage with the most time per thread limits the throughput
+    stage_threads = {'decode': workers, 'process': workers, 'encode': encoders}
+    bottleneck = max(seconds, key=lambda stage: seconds[stage] / stage_threads[stage])
+    print("Stage times (summed over threads): "
+          + ", ".join(f"{stage} {seconds[stage]:.2f} s ({stage_threads[stage]} thread(s))" for stage in seconds)
+          + f", bottleneck: {bottleneck}")
+
+    return stats['failed']
+
+
+def _stage(func, source: queue.Queue, sink: queue.Queue | None, threads: int, sink_threads: int = None) -> list:
+    """Starts threads which apply func to items from the source queue and put the results in the sink queue.
+
+    The stage ends when it receives one end marker per thread, and then passes one end marker per thread
+    of the next stage on to it (sink_threads, by default the same number of threads).
+    Items for which func returns None are dropped.
+    """
+
+    remaining = [threads]
+    lock = threading.Lock()
+
+    def work():
+        while (item := source.get()) is not _DONE:
+            result = func(item)
+            if result is not None and sink is not None:
+                sink.put(result)
+
+        # The last thread of the stage to finish tells the next stage there is no more work
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and sink is not None:
+            for _ in range(sink_threads or threads):
+                sink.put(_DONE)
+
+    started = [threading.Thread(target=work, daemon=True) for _ in range(threads)]
+    for thread in started:
+        thread.start()
+
+    return started
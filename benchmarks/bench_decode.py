@@ -0,0 +1,136 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Compares decoding whole images with cropping and downscaling while decoding (load_image box= and max_size=).
+
+Each measurement runs in a fresh process, so that its peak RSS (resident memory, read from /proc on Linux)
+is not hidden by earlier runs.
+The images are written to a temporary directory: a JPEG and an uncompressed TIFF stored in strips.
+
+Run from the repository root:  python -m benchmarks.bench_decode [--width 8000] [--height 6000] [--repeat 3]
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import SUPPRESS, ArgumentParser
+from ast import literal_eval
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+from image_io import load_image
+
+# The region of interest (x1, y1, x2, y2) and downscaling target of the cases
+BOX = (1000, 1000, 1512, 1512)
+MAX_SIZE = 1024
+
+# Cases: (name, file, crop box, max size)
+CASES = [
+    ('crop 512x512', 'image.jpg', BOX, None),
+    ('max-size 1024', 'image.jpg', None, MAX_SIZE),
+    ('crop 512x512', 'strips.tif', BOX, None),
+    ('max-size 1024', 'strips.tif', None, MAX_SIZE),
+]
+
+
+def write_images(directory: Path, width: int, height: int):
+    """Writes a smooth test image (which compresses like a photograph) as a JPEG and a striped TIFF."""
+
+    y, x = np.mgrid[:height, :width]
+    img = np.dstack([(x * 255 // width), (y * 255 // height), ((x + y) % 256)]).astype(np.uint8)
+    img_file = Image.fromarray(img)
+
+    img_file.save(directory / 'image.jpg', quality=90)
+
+    # Pillow only writes uncompressed TIFF files in strips through libtiff
+    TiffImagePlugin.WRITE_LIBTIFF = True
+    try:
+        img_file.save(directory / 'strips.tif', compression='raw', strip_size=1 << 16)
+    finally:
+        TiffImagePlugin.WRITE_LIBTIFF = False
+
+
+def measure(in_file: Path, box: tuple, max_size: int, pushdown: bool, repeat: int) -> tuple[float, float]:
+    """Loads an image in the current process and returns the fastest time (s) and the peak RSS (MB).
+
+    Without pushdown, the whole image is decoded and then cropped and resized, as before load_image took
+    box and max_size.
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if pushdown:
+            load_image(in_file, box=box, max_size=max_size)
+        else:
+            img = load_image(in_file)
+            if box is not None:
+                img = img[box[1]:box[3], box[0]:box[2]]
+            if max_size is not None:
+                with Image.fromarray(img) as img_file:
+                    img_file.thumbnail((max_size, max_size))
+        times.append(time.perf_counter() - start)
+
+    return min(times), peak_rss()
+
+
+def peak_rss() -> float:
+    """Returns the peak resident memory of the current process in MB.
+
+    This is read from /proc rather than with resource.getrusage, whose maximum carries over from the parent
+    process across fork and exec.
+    """
+
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith('VmHWM:'):
+            return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def run_case(in_file: Path, box: tuple, max_size: int, pushdown: bool, repeat: int) -> tuple[float, float]:
+    """Runs measure in a new process and returns its results."""
+
+    command = [sys.executable, '-m', 'benchmarks.bench_decode', '--child', str(in_file), repr(box), repr(max_size),
+               str(pushdown), '--repeat', str(repeat)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark cropping and downscaling while decoding")
+    parser.add_argument('--width', type=int, default=8000)
+    parser.add_argument('--height', type=int, default=6000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', nargs=4, help=SUPPRESS)  # used by run_case
+    args = parser.parse_args()
+
+    # Measure a single case (in a process started by run_case)
+    if args.child:
+        in_file, box, max_size, pushdown = args.child
+        print(*measure(Path(in_file), literal_eval(box), literal_eval(max_size), pushdown == 'True', args.repeat))
+        return
+
+    # The RSS of a process which only imports the modules, for reference
+    baseline = float(subprocess.run([sys.executable, '-c', 'from benchmarks.bench_decode import peak_rss; '
+                                     'print(peak_rss())'], capture_output=True, text=True, check=True).stdout)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        write_images(directory, args.width, args.height)
+
+        print(f"{args.width}x{args.height} RGB (peak RSS of the imports alone: {baseline:.0f} MB)")
+        print(f"{'file':<12} {'case':<15} {'full (ms)':>10} {'full (MB)':>10} {'pushdown (ms)':>14} "
+              f"{'pushdown (MB)':>14}")
+        for name, file_name, box, max_size in CASES:
+            before = run_case(directory / file_name, box, max_size, False, args.repeat)
+            after = run_case(directory / file_name, box, max_size, True, args.repeat)
+            print(f"{file_name:<12} {name:<15} {before[0] * 1000:>10.0f} {before[1]:>10.0f} "
+                  f"{after[0] * 1000:>14.0f} {after[1]:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Compares the lookup table engine with the previous implementations of the pointwise operations.
+
+Run from the repository root:  python -m benchmarks.bench_lut [--width 3840] [--height 2160] [--repeat 5]
+"""
+
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from operations.lut import apply_pointwise
+
+
+def invert_before(img):
+    """invert as implemented before lookup tables."""
+    return np.dstack((255 - img[..., :3], img[..., 3]))
+
+
+def grayscale_before(img):
+    """grayscale as implemented before lookup tables."""
+    gray = np.dot(img[..., :3], [0.2989, 0.5870, 0.1140])
+    gray = np.dstack((gray, gray, gray, img[..., 3]))
+    np.clip(gray, 0, 255, out=gray)
+    return gray.astype(np.uint8)
+
+
+def threshold_before(img, cutoff=128):
+    """threshold as implemented before lookup tables."""
+    red = np.where(img[..., 0] < cutoff, 0, 255)
+    green = np.where(img[..., 1] < cutoff, 0, 255)
+    blue = np.where(img[..., 2] < cutoff, 0, 255)
+    return np.dstack((red, green, blue, img[..., 3])).astype(np.uint8)
+
+
+CASES = {
+    'invert': (invert_before, (('invert',),)),
+    'grayscale': (grayscale_before, (('grayscale',),)),
+    'threshold': (threshold_before, (('threshold', 128, False, False),)),
+    'invert grayscale threshold': (lambda img: threshold_before(grayscale_before(invert_before(img))),
+                                   (('invert',), ('grayscale',), ('threshold', 128, False, False))),
+}
+
+
+def best_time(func, repeat: int) -> float:
+    """Returns the fastest of several timed runs in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark lookup tables against the previous pointwise implementations")
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    img = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 4), dtype=np.uint8)
+    mpix = args.width * args.height / 1e6
+
+    print(f"{args.width}x{args.height} RGBA")
+    print(f"{'operation':<28} {'before (ms)':>12} {'tables (ms)':>12} {'speedup':>8}")
+    for name, (before, specs) in CASES.items():
+        old = best_time(lambda: before(img), args.repeat)
+        new = best_time(lambda: apply_pointwise(img, specs), args.repeat)
+        print(f"{name:<28} {old * 1000:>12.1f} {new * 1000:>12.1f} {old / new:>7.1f}x   ({mpix / new:.0f} Mpix/s)")
+
+
+if __name__ == '__main__':
+    main()
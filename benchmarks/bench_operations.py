@@ -0,0 +1,229 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Times every operation exported by the operations package (and a few chains) across image sizes and colour models.
+
+The images are synthetic (a gradient with noise, so that thresholds and edges have realistic content) and are
+generated in memory, so the suite runs offline. Each case records the fastest wall time, the throughput in
+megapixels per second and the peak memory allocated (traced separately from the timed runs).
+
+Results can be written to a JSON file and compared against a saved baseline: any case slower than the baseline
+by more than the threshold is reported as a regression, and the exit status is 1.
+
+Run from the repository root:
+    python -m benchmarks.bench_operations [--sizes 256 1024 4096 8192] [--modes L RGB RGBA] [--repeat 3]
+        [--only edge box_blur] [--output results.json] [--baseline baseline.json] [--threshold 0.15]
+"""
+
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+import numpy as np
+import scipy
+
+import operations as op
+
+# Side lengths of the square test images
+SIZES = [256, 1024, 4096, 8192]
+
+# Channels of each colour model
+MODES = {'L': 1, 'RGB': 3, 'RGBA': 4}
+
+# Images with more pixels than this are only timed once (a single run already takes long enough to be stable)
+SINGLE_RUN_PIXELS = 4096 * 4096
+
+# A normalized 5x5 kernel with non-integer weights (not separable, timed with the default reference engine)
+KERNEL = np.random.default_rng(1).random((5, 5))
+KERNEL /= KERNEL.sum()
+
+# Cases: name -> (operation exported by operations, function applying it to an image)
+# Geometric operations return views, so they are timed copying into a new array with out=
+CASES = {
+    'box_blur': ('box_blur', lambda img: op.box_blur(img, 3)),
+    'convolve': ('convolve', lambda img: op.convolve(img, KERNEL)),
+    'crop': ('crop', lambda img: op.crop(img, 0, 0, img.shape[1] // 2, img.shape[0] // 2,
+                                         out=np.empty((img.shape[0] // 2, img.shape[1] // 2, img.shape[2]),
+                                                      dtype=np.uint8))),
+    'edge': ('edge', lambda img: op.edge(img)),
+    'gaussian_blur': ('gaussian_blur', lambda img: op.gaussian_blur(img, 2)),
+    'grayscale': ('grayscale', lambda img: op.grayscale(img)),
+    'invert': ('invert', lambda img: op.invert(img)),
+    'mirror': ('mirror', lambda img: op.mirror(img, out=np.empty_like(img))),
+    'rotate': ('rotate', lambda img: op.rotate(img, out=np.empty((img.shape[1], img.shape[0], img.shape[2]),
+                                                                 dtype=np.uint8))),
+    'sepia': ('sepia', lambda img: op.sepia(img)),
+    'sharpen': ('sharpen', lambda img: op.sharpen(img)),
+    'threshold': ('threshold', lambda img: op.threshold(img, 128)),
+    'chain pointwise': ('chain', lambda img: quiet_chain(img, ['invert', 'grayscale', 'threshold'])),
+    'chain blur edge': ('chain', lambda img: quiet_chain(img, ['grayscale', 'blur', 'edge'])),
+    'chain mixed': ('chain', lambda img: quiet_chain(img, ['rotateCW', 'sepia', 'sharpen', 'mirrorH'])),
+    'chain shared': ('chain_many', lambda img: quiet_chain_many(img, [['grayscale', 'blur', 'edge'],
+                                                                      ['grayscale', 'blur', 'threshold'],
+                                                                      ['grayscale', 'blur', 'invert']])),
+}
+
+
+def quiet_chain(img: np.ndarray, operations: list[str]) -> np.ndarray:
+    """Runs a chain without printing its progress."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return op.chain(img, operations)
+
+
+def quiet_chain_many(img: np.ndarray, pipelines: list[list[str]]) -> list[np.ndarray]:
+    """Runs several chains sharing their prefixes without printing their progress."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return op.chain_many(img, pipelines)
+
+
+def synthetic_image(size: int, channels: int) -> np.ndarray:
+    """Returns a square uint8 test image: a diagonal gradient in each channel with added noise."""
+
+    ramp = np.arange(size, dtype=np.uint16) * 255 // max(1, size - 1)
+    img = np.empty((size, size, channels), dtype=np.uint8)
+    noise = np.random.default_rng(0).integers(0, 32, (size, size), dtype=np.uint8)
+    for c in range(channels):
+        # Each channel runs in a different direction, and alpha is mostly opaque
+        if c == 3:
+            img[..., c] = 255 - noise
+        else:
+            img[..., c] = (ramp[:, np.newaxis] * (c != 1) + ramp[np.newaxis, :] * (c != 0)) // (1 + (c == 2)) + noise
+
+    return img
+
+
+def best_time(func, repeat: int) -> float:
+    """Returns the fastest of several timed runs in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func) -> int:
+    """Returns the peak memory allocated (by numpy and Python) while running a function, in bytes."""
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run_suite(cases: dict, sizes: list[int], modes: list[str], repeat: int) -> list[dict]:
+    """Runs every case on every image and returns the results (printing them as they are measured).
+
+    Returns:
+        list[dict]: One result per case, size and mode: its name, seconds, Mpix/s and peak bytes
+    """
+
+    results = []
+    print(f"{'case':<18} {'size':>6} {'mode':<5} {'time (ms)':>10} {'Mpix/s':>9} {'peak (MB)':>10}")
+    for size in sizes:
+        for mode in modes:
+            img = synthetic_image(size, MODES[mode])
+            runs = repeat if size * size <= SINGLE_RUN_PIXELS else 1
+            for name, (_, func) in cases.items():
+                seconds = best_time(lambda: func(img), runs)
+                peak = peak_memory(lambda: func(img))
+                mpix = size * size / 1e6 / seconds
+                results.append({'case': name, 'size': size, 'mode': mode, 'seconds': seconds,
+                                'mpix_per_s': mpix, 'peak_bytes': peak})
+                print(f"{name:<18} {size:>6} {mode:<5} {seconds * 1000:>10.2f} {mpix:>9.1f} {peak / 1e6:>10.1f}")
+
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """Compares results with a baseline, printing the change in time of each case measured in both.
+
+    Args:
+        results (list[dict]): The results of this run
+        baseline (list[dict]): The results of the baseline run
+        threshold (float): The fraction by which a case may be slower than the baseline (i.e. 0.15 for 15%)
+
+    Returns:
+        list[dict]: The results which are slower than the baseline by more than the threshold
+    """
+
+    previous = {(result['case'], result['size'], result['mode']): result for result in baseline}
+    regressions = []
+
+    print(f"\n{'case':<18} {'size':>6} {'mode':<5} {'baseline (ms)':>14} {'now (ms)':>10} {'change':>8}")
+    for result in results:
+        before = previous.get((result['case'], result['size'], result['mode']))
+        if before is None:
+            continue
+
+        change = result['seconds'] / before['seconds'] - 1
+        slower = change > threshold
+        if slower:
+            regressions.append(result)
+        print(f"{result['case']:<18} {result['size']:>6} {result['mode']:<5} {before['seconds'] * 1000:>14.2f} "
+              f"{result['seconds'] * 1000:>10.2f} {change:>+8.1%}{'  REGRESSION' if slower else ''}")
+
+    return regressions
+
+
+def environment() -> dict:
+    """Describes the machine and library versions the results were measured with."""
+
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark every operation across image sizes and colour models")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Image side lengths")
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES), help="Colour models")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case (the fastest is kept)")
+    parser.add_argument('--only', nargs='+', default=None, help="Only run cases whose name contains one of these")
+    parser.add_argument('--output', default=None, help="Write the results to this JSON file")
+    parser.add_argument('--baseline', default=None, help="Compare the results with this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Fraction by which a case may be slower than the baseline (default: 0.15)")
+    args = parser.parse_args()
+
+    # Every exported operation should have a case
+    missing = set(op.__all__) - {operation for operation, _ in CASES.values()}
+    if missing:
+        print(f"[WARNING] Operations without a benchmark case: {', '.join(sorted(missing))}")
+
+    cases = {name: case for name, case in CASES.items()
+             if args.only is None or any(part in name for part in args.only)}
+    results = run_suite(cases, args.sizes, args.modes, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+        print(f"\nSaved results: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
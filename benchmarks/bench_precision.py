@@ -0,0 +1,91 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Compares the float64, float32 and int16-fixed precisions of the filtering operations.
+
+For each operation and precision, prints the run time, throughput, peak memory allocated and the error
+against float64 (largest difference and the fraction of values which differ). Also measures the memory bandwidth
+of a plane update in each type, which is what most filtering passes are limited by.
+
+Run from the repository root:  python -m benchmarks.bench_precision [--width 1920] [--height 1080] [--repeat 3]
+"""
+
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import numpy as np
+
+import operations as op
+from operations.convolving import PRECISIONS
+
+CASES = {
+    'boxblur -r 3 -p 2': lambda img, precision: op.box_blur(img, 3, 2, precision=precision),
+    'gaussblur -s 4': lambda img, precision: op.gaussian_blur(img, 4, precision),
+    'sharpen': lambda img, precision: op.sharpen(img, precision=precision),
+    'convolve 5 (random)': lambda img, precision: op.convolve(img, KERNEL, precision=precision),
+}
+
+KERNEL = np.random.default_rng(1).normal(0, 0.2, (5, 5))
+
+
+def best_time(func, repeat: int) -> float:
+    """Returns the fastest of several timed runs in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func) -> int:
+    """Returns the peak memory allocated by numpy while running a function, in bytes."""
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bandwidth(shape: tuple, dtype: type, repeat: int) -> float:
+    """Measures the memory bandwidth of adding one plane into another (two reads and a write), in GB/s."""
+
+    a = np.ones(shape, dtype=dtype)
+    b = np.ones(shape, dtype=dtype)
+    seconds = best_time(lambda: np.add(a, b, out=a), repeat)
+    return 3 * a.nbytes / seconds / 1e9
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the precisions of the filtering operations")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    img = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 4), dtype=np.uint8)
+    mpix = args.width * args.height / 1e6
+
+    print(f"{args.width}x{args.height} RGBA")
+    print(f"{'operation':<20} {'precision':<12} {'time (ms)':>10} {'Mpix/s':>8} {'peak (MB)':>10} "
+          f"{'max err':>8} {'differ (%)':>11}")
+    for name, func in CASES.items():
+        reference = func(img, 'float64')
+        for precision in PRECISIONS:
+            seconds = best_time(lambda: func(img, precision), args.repeat)
+            peak = peak_memory(lambda: func(img, precision))
+            error = np.abs(func(img, precision).astype(np.int16) - reference)
+            print(f"{name:<20} {precision:<12} {seconds * 1000:>10.1f} {mpix / seconds:>8.1f} {peak / 1e6:>10.1f} "
+                  f"{error.max():>8} {np.count_nonzero(error) / error.size * 100:>11.4f}")
+
+    print("\nPlane update bandwidth (a += b)")
+    for dtype in (np.float64, np.float32, np.int32, np.int16):
+        print(f"  {np.dtype(dtype).name:<8} {bandwidth((args.height, args.width, 3), dtype, args.repeat):>6.1f} GB/s")
+
+
+if __name__ == '__main__':
+    main()
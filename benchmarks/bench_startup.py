@@ -0,0 +1,88 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Measures the startup cost of the command line: the time spent importing modules (from python -X importtime)
+and the wall time of the whole process, for --help and a few short operations on a small image.
+
+Each case has a budget for its import time; the exit status is 1 if any case is over its budget, so the
+benchmark can guard against an import which loads numpy, Pillow or scipy earlier than needed.
+
+Run from the repository root:  python -m benchmarks.bench_startup [--repeat 5] [--top 5]
+"""
+
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+# Cases: name -> (command line arguments after main.py, import time budget in seconds)
+# {in} and {out} are replaced by a small test image and an output file
+CASES = {
+    '--help': (['--help'], 0.1),
+    'invert': (['{in}', '{out}', 'invert'], 0.4),
+    'gaussblur': (['{in}', '{out}', 'gaussblur'], 0.4),
+    'edge': (['{in}', '{out}', 'edge'], 0.8),  # separable gradient filters use scipy.ndimage
+}
+
+# A line of -X importtime output: self and cumulative microseconds, then the module indented by its depth
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run_case(args: list[str]) -> tuple[float, float, list[tuple[int, str]]]:
+    """Runs main.py once with -X importtime.
+
+    Returns:
+        tuple[float, float, list[tuple[int, str]]]: The wall time and import time in seconds, and the
+            cumulative microseconds of each module imported directly (not by another module)
+    """
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', 'main.py', *args], capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"main.py {' '.join(args)} failed:\n{result.stdout}{result.stderr}")
+
+    top_level = [(int(match[2]), match[4]) for match in map(IMPORT_LINE.match, result.stderr.splitlines())
+                 if match and len(match[3]) == 1]
+    return wall, sum(micros for micros, _ in top_level) / 1e6, top_level
+
+
+def main():
+    parser = ArgumentParser(description="Measure the import time and wall time of short command line calls")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per case (the fastest is kept)")
+    parser.add_argument('--top', type=int, default=5, help="Number of slowest imports to list for each case")
+    args = parser.parse_args()
+
+    over = []
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'case':<12} {'wall (ms)':>10} {'imports (ms)':>13} {'budget (ms)':>12}  slowest imports")
+        for name, (case_args, budget) in CASES.items():
+            case_args = [arg.format(**{'in': 'tests/logo.png', 'out': str(Path(directory) / 'out.png')})
+                         for arg in case_args]
+
+            # Keep the run with the fastest imports (the first run also warms the file system cache)
+            runs = [run_case(case_args) for _ in range(args.repeat)]
+            wall = min(run[0] for run in runs)
+            _, imports, top_level = min(runs, key=lambda run: run[1])
+
+            slowest = ', '.join(f"{module} {micros / 1000:.0f}"
+                                for micros, module in sorted(top_level, reverse=True)[:args.top])
+            flag = '  OVER BUDGET' if imports > budget else ''
+            print(f"{name:<12} {wall * 1000:>10.0f} {imports * 1000:>13.0f} {budget * 1000:>12.0f}  {slowest}{flag}")
+            if imports > budget:
+                over.append(name)
+
+            for out_file in Path(directory).iterdir():
+                out_file.unlink()
+
+    if over:
+        print(f"\n{len(over)} case(s) over their import budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
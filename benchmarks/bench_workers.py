@@ -0,0 +1,79 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Measures how strip-parallel processing scales with the number of worker threads.
+
+Run from the repository root:  python -m benchmarks.bench_workers [--workers 1 2 4 8] [--repeat 3]
+"""
+
+import os
+import time
+from argparse import ArgumentParser, Namespace
+
+import numpy as np
+
+from tiling import process_tiled
+
+# Image sizes (width, height) to benchmark
+SIZES = {'4K': (3840, 2160), '8K': (7680, 4320)}
+
+# Operations and their arguments
+OPERATIONS = {
+    'convolve': Namespace(kernel=np.random.default_rng(0).random((5, 5)) / 12, iterations=1, method='auto',
+                          collapse=False),
+    'edge': Namespace(threshold=150, collapse=False, operator='sobel', direction=False),
+    'sharpen': Namespace(amount=3),
+}
+
+
+def best_time(func, repeat: int) -> float:
+    """Returns the fastest of several timed runs in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark strip-parallel processing with different numbers of workers")
+    parser.add_argument('--workers', metavar='<count>', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', metavar='<runs>', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"CPU cores available: {os.cpu_count()}")
+    print(f"{'size':<5} {'operation':<10} {'workers':>7} {'seconds':>9} {'Mpix/s':>8} {'speedup':>8}")
+
+    rng = np.random.default_rng(0)
+    for size_name, (width, height) in SIZES.items():
+        img = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+
+        for op_name, op_args in OPERATIONS.items():
+            baseline = None
+            reference = None
+
+            for workers in args.workers:
+                result = None
+
+                def run():
+                    nonlocal result
+                    result = process_tiled(img, op_name, op_args, workers=workers)
+
+                seconds = best_time(run, args.repeat)
+                baseline = baseline or seconds
+
+                # The output must not depend on the number of workers
+                if reference is None:
+                    reference = result
+                elif not np.array_equal(result, reference):
+                    raise AssertionError(f"{op_name} output differs with {workers} workers")
+
+                mpix = width * height / seconds / 1e6
+                print(f"{size_name:<5} {op_name:<10} {workers:>7} {seconds:>9.3f} {mpix:>8.1f} {baseline / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
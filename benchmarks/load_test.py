@@ -0,0 +1,99 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Sends concurrent jobs to a running image processing server and reports latency percentiles.
+
+Run from the repository root (with the server started separately):
+    python -m benchmarks.load_test tests/logo.png --op "boxblur -r 3" --requests 200 --clients 8
+    python -m benchmarks.load_test tests/logo.png --socket /tmp/imageproc.sock
+"""
+
+import http.client
+import socket
+import statistics
+import threading
+import time
+from argparse import ArgumentParser
+from urllib.parse import urlencode
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket."""
+
+    def __init__(self, path: str):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Returns the value below which the given fraction of the (sorted) values fall."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = ArgumentParser(description="Load test the image processing server")
+    parser.add_argument('image', metavar='<image-path>', help="Image to send with every job")
+    parser.add_argument('--op', metavar='<operation>', default='boxblur -r 3', help="Operation of every job")
+    parser.add_argument('--requests', metavar='<count>', type=int, default=200, help="Total number of jobs")
+    parser.add_argument('--clients', metavar='<count>', type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument('--host', metavar='<address>', default='127.0.0.1')
+    parser.add_argument('--port', metavar='<port>', type=int, default=8765)
+    parser.add_argument('--socket', metavar='<path>', default=None, help="Connect to a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        body = f.read()
+    url = '/process?' + urlencode({'op': args.op})
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = iter(range(args.requests))
+
+    def client():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+
+            if args.socket:
+                connection = UnixHTTPConnection(args.socket)
+            else:
+                connection = http.client.HTTPConnection(args.host, args.port)
+
+            start = time.perf_counter()
+            connection.request('POST', url, body=body, headers={'Content-Type': 'application/octet-stream'})
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            connection.close()
+
+            with lock:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+                if response.status == 200:
+                    latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Jobs: {args.requests} ({args.clients} clients), responses: {statuses}")
+    print(f"Throughput: {len(latencies) / total:.1f} jobs/s")
+    if latencies:
+        print(f"Latency: p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+              f"mean {statistics.mean(latencies) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
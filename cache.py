@@ -0,0 +1,207 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""An on-disk cache of operation results, addressed by the content of the input and the operation performed.
+
+The key of a result is a hash of the input pixels (shape, type and bytes) followed by the normalized spec of each
+operation applied to it, so the result of a chain step is found from the key of the previous step without hashing
+the intermediate image again. Results are stored as .npy files in a directory which several processes may share:
+
+- files are written to a temporary name and renamed into place, so a reader never sees a partial result
+- reading a result updates its modification time, and the least recently used files are deleted once the
+  directory grows beyond its size limit
+- a file deleted by another process between finding and reading it is treated as a miss
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from argparse import Namespace
+from pathlib import Path
+
+import numpy as np
+
+from operations.registry import get_operation
+
+# Changing the format of the keys or files invalidates every existing entry
+CACHE_VERSION = 1
+
+# Arguments which do not change the result of an operation (where and how images are read, written and scheduled)
+NON_RESULT_ARGS = {
+    'in_file', 'out_file', 'operation', 'batch', 'frames', 'prefetch', 'workers', 'max_memory', 'encode_workers',
+    'raw_shape', 'planar', 'max_size', 'compress_level', 'optimize', 'quality', 'subsampling', 'tiff_compression',
+    'tiff_strip_rows', 'profile', 'trace', 'explain', 'verbose', 'plugin', 'cache_dir', 'cache_size', 'cache',
+    'kernel_size',
+}
+
+# Operations with a lower estimated cost (nanoseconds per pixel, see operations.registry) are performed again
+# rather than cached, as hashing the input and loading the result costs about as much
+MIN_CACHED_COST = 15
+
+# Number of bytes hashed at a time for images which are not contiguous (i.e. views of memory-mapped files)
+HASH_BLOCK_BYTES = 1 << 24
+
+
+def operation_spec(op_name: str, args: Namespace = None) -> dict:
+    """Returns the normalized description of an operation and the arguments which affect its result.
+
+    Args:
+        op_name (str): The name of the operation
+        args (Namespace, optional): The arguments perform_operation receives (see operations.registry).
+            Defaults to the default arguments
+
+    Returns:
+        dict: The operation and its arguments, with arrays (i.e. a convolution kernel) as nested lists
+    """
+
+    spec = {'operation': op_name}
+    for name, value in sorted(vars(args or Namespace()).items()):
+        if name not in NON_RESULT_ARGS:
+            spec[name] = value.tolist() if isinstance(value, np.ndarray) else value
+
+    return spec
+
+
+def worth_caching(op_name: str, args: Namespace = None) -> bool:
+    """Returns whether the result of an operation is worth caching, by its registered cost per pixel."""
+    return get_operation(op_name).cost_for(args) >= MIN_CACHED_COST
+
+
+class ResultCache:
+    """A size-bounded least recently used cache of result images in a directory.
+
+    Args:
+        directory (Path): The directory to store results in (created if needed)
+        max_bytes (int): The total size of the stored results above which the oldest are evicted
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def input_key(self, img: np.ndarray) -> str:
+        """Returns the key of an input image: a hash of its shape, type and pixels."""
+
+        digest = hashlib.blake2b(f'{CACHE_VERSION} {img.shape} {img.dtype}'.encode(), digest_size=20)
+        if img.flags.c_contiguous:
+            digest.update(memoryview(img).cast('B'))
+        else:
+            rows = max(1, HASH_BLOCK_BYTES // max(1, img[0].nbytes))
+            for start in range(0, img.shape[0], rows):
+                digest.update(np.ascontiguousarray(img[start:start + rows]).data)
+
+        return digest.hexdigest()
+
+    def derive(self, key: str, spec: dict) -> str:
+        """Returns the key of the result of applying an operation (see operation_spec) to the image with the key."""
+
+        text = json.dumps(spec, sort_keys=True, default=str)
+        return hashlib.blake2b(f'{key} {text}'.encode(), digest_size=20).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """Returns whether a result is stored (without counting a hit or miss)."""
+        return self._path(key).is_file()
+
+    def get(self, key: str) -> np.ndarray | None:
+        """Returns a stored result (marking it as recently used), or None if there is none."""
+
+        path = self._path(key)
+        try:
+            img = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):  # missing, evicted meanwhile or unreadable
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return img
+
+    def find(self, keys: list[str]) -> tuple[int, np.ndarray | None]:
+        """Returns the last of a sequence of keys (i.e. of the steps of a chain) with a stored result.
+
+        Args:
+            keys (list[str]): The keys to look for, in order. Keys which are None are skipped
+
+        Returns:
+            tuple[int, np.ndarray | None]: The index of the key and its result, or -1 and None if none is stored
+        """
+
+        for index in reversed(range(len(keys))):
+            if keys[index] is not None and self.contains(keys[index]):
+                img = self.get(key=keys[index])
+                if img is not None:
+                    return index, img
+
+        with self._lock:
+            self.misses += 1
+        return -1, None
+
+    def put(self, key: str, img: np.ndarray):
+        """Stores a result atomically, then evicts the least recently used results if over the size limit."""
+
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        # Write to a temporary file in the same directory, so the rename is atomic
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.save(file, img)
+            os.replace(temporary, path)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def lookup(self, key: str, func) -> np.ndarray:
+        """Returns the stored result for the key, or computes it with func() and stores it."""
+
+        img = self.get(key)
+        if img is None:
+            img = func()
+            self.put(key, img)
+        return img
+
+    def evict(self):
+        """Deletes the least recently used results until the stored results fit in the size limit."""
+
+        entries = []
+        for path in self.directory.glob('*/*.npy'):
+            try:
+                status = path.stat()
+            except FileNotFoundError:  # deleted by another process
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def summary(self) -> str:
+        """Describes the hits and misses of this process and the current contents of the cache."""
+
+        sizes = [path.stat().st_size for path in self.directory.glob('*/*.npy') if path.is_file()]
+        lookups = self.hits + self.misses
+        rate = f" ({self.hits / lookups:.0%} hit rate)" if lookups else ""
+        return (f"Cache: {self.hits} hit(s), {self.misses} miss(es){rate}, {self.evictions} eviction(s), "
+                f"{len(sizes)} entries using {sum(sizes) / 1024 ** 2:.1f} MB of {self.max_bytes / 1024 ** 2:.0f} MB")
+
+    def _path(self, key: str) -> Path:
+        """Returns the file of a key (in a subdirectory named by its first two characters)."""
+        return self.directory / key[:2] / f'{key}.npy'
@@ -0,0 +1,468 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Reading and writing image files as numpy arrays.
+
+Besides the formats supported by Pillow, images can be stored uncompressed as .npy files or as raw bytes
+(.raw, interleaved (H, W, C) or planar (C, H, W) uint8 samples, with the size given separately). These are
+memory-mapped instead of decoded, so operations run directly on the mapped pages, and views such as crops
+and flips only read the pages they cover.
+
+The loader can also crop and downscale while decoding (see load_image), so that as few pixels as possible
+are decoded and converted: JPEG files are decoded at a reduced scale, and only the strips or tiles of an
+uncompressed TIFF file which cover the region are read.
+
+Animations (GIF, APNG and WebP) and multi-page TIFF files are read one frame at a time with load_frames,
+and written one frame at a time with a FrameWriter.
+"""
+
+import math
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from PIL.TiffImagePlugin import AppendingTiffWriter
+
+from operations.colour import has_alpha, is_gray
+from operations.cropping import check_box
+
+# The colour model images of each Pillow mode are loaded as (palette images depend on their transparency,
+# and any other mode is loaded as RGB)
+LOAD_MODES = {
+    '1': 'L', 'L': 'L', 'I': 'L', 'I;16': 'L', 'F': 'L',
+    'LA': 'LA', 'La': 'LA',
+    'RGB': 'RGB',
+    'RGBA': 'RGBA', 'RGBa': 'RGBA', 'PA': 'RGBA',
+}
+
+# Pillow's names of the TIFF compression schemes
+TIFF_COMPRESSIONS = {
+    'none': 'raw', 'lzw': 'tiff_lzw', 'deflate': 'tiff_adobe_deflate', 'packbits': 'packbits', 'jpeg': 'jpeg',
+}
+
+# The TIFF tag giving the number of rows in each strip
+ROWS_PER_STRIP = 278
+
+# Formats which store several frames in one file (animations and multi-page TIFF files)
+FRAME_FORMATS = ('GIF', 'PNG', 'WEBP', 'TIFF')
+
+# How long each frame of an animation is shown when its input did not say (milliseconds)
+DEFAULT_DURATION = 100
+
+# Extensions of the uncompressed formats which are memory-mapped instead of decoded
+NPY_SUFFIX = '.npy'
+RAW_SUFFIX = '.raw'
+
+
+def is_mapped_format(path: Path) -> bool:
+    """Returns whether a file is in one of the uncompressed formats which are memory-mapped (.npy or .raw)."""
+    return isinstance(path, Path) and path.suffix.lower() in (NPY_SUFFIX, RAW_SUFFIX)
+
+
+def load_image(in_file: Path, raw_shape: tuple[int, int, int] = None, planar: bool = False,
+               box: tuple[int, int, int, int] = None, max_size: int = None) -> np.ndarray:
+    """Reads an image file into an (H, W, C) uint8 array.
+
+    Grayscale files are loaded as a single luminance channel (L or LA, see operations.colour),
+    and palette and other colour files as RGB or RGBA. .npy and .raw files are memory-mapped read-only.
+
+    Args:
+        in_file (Path): The image file to read (or a binary file object)
+        raw_shape (tuple[int, int, int], optional): The width, height and channels of a .raw file
+        planar (bool, optional): Whether a .raw file stores each channel as a separate plane. Defaults to False
+        box (tuple[int, int, int, int], optional): Only load the region (x1, y1, x2, y2), as operations.crop would
+            crop it. Defaults to the whole image
+        max_size (int, optional): Scale the (cropped) image down so that neither side is longer than this,
+            keeping its aspect ratio. Defaults to no limit
+
+    Raises:
+        PIL.UnidentifiedImageError: If the file is not a valid image
+        ValueError: If a .npy or .raw file does not hold a uint8 image (of the given shape),
+            or the box is not within the image
+
+    Returns:
+        np.ndarray: The image contents
+    """
+
+    if is_mapped_format(in_file):
+        img = _map_image(in_file, raw_shape, planar)
+        if box is not None:
+            check_box(img.shape[1], img.shape[0], *box)
+            img = img[box[1]:box[3], box[0]:box[2]]
+        if max_size is None or max(img.shape[:2]) <= max_size:
+            return img
+        with to_pil_image(img) as img_file:
+            img_file.thumbnail((max_size, max_size))
+            return _to_array(img_file, img_file.mode)
+
+    with Image.open(in_file) as img_file:
+        mode = _load_mode(img_file)
+
+        if box is None and max_size is None:
+            return _to_array(img_file, mode)
+
+        region = box or (0, 0) + img_file.size
+        check_box(*img_file.size, *region)
+
+        # Decode at the smallest scale the decoder supports which is still larger than the result
+        if max_size is not None:
+            region = _draft(img_file, region, max_size)
+
+        # Skip the parts of the file outside the region
+        _prune_tiles(img_file, region)
+
+        region_file = img_file.crop(region) if region != (0, 0) + img_file.size else img_file
+        if max_size is not None:
+            region_file.thumbnail((max_size, max_size))
+
+        return _to_array(region_file, mode)
+
+
+def load_frames(in_file: Path) -> Iterator[tuple[np.ndarray, float | None]]:
+    """Reads the frames of an animation (GIF, APNG or WebP) or a multi-page TIFF file one at a time.
+
+    Every frame is loaded in the colour model of the first (see load_image), so that the frames can be processed
+    and saved together. Other images yield their only frame.
+
+    Args:
+        in_file (Path): The image file to read
+
+    Raises:
+        PIL.UnidentifiedImageError: If the file is not a valid image
+
+    Yields:
+        tuple[np.ndarray, float | None]: Each (H, W, C) frame, and how long it is shown in milliseconds
+            (None if the file does not say, i.e. for multi-page files)
+    """
+
+    with Image.open(in_file) as img_file:
+        mode = _load_mode(img_file)
+        for index in range(getattr(img_file, 'n_frames', 1)):
+            img_file.seek(index)
+            yield _to_array(img_file, mode), img_file.info.get('duration')
+
+
+class FrameWriter:
+    """Writes frames one at a time to an animation (GIF, APNG or WebP), a multi-page TIFF file, or one file per
+    frame when the file name contains {index} (i.e. 'frames/{index:04d}.png').
+
+    Multi-page TIFF files and files per frame are written as the frames arrive. Pillow only encodes an animation
+    once it has all of its frames (it compares each frame with the one before), so animation frames are held until
+    the writer is closed: GIF frames are reduced to their 256 colour palette as they arrive (one byte per pixel),
+    APNG and WebP frames are held as they are.
+
+    Use as a context manager, or call close once the last frame has been written.
+    """
+
+    def __init__(self, out_file: Path, options: dict = None, loop: int = 0):
+        """Creates a writer (and the TIFF file, if writing one).
+
+        Args:
+            out_file (Path): The file to write (or the name template of the files, with {index})
+            options (dict, optional): Encoder options passed to Pillow (see encoder_options). Defaults to
+                Pillow's defaults
+            loop (int, optional): The number of times an animation plays (0 for forever). Defaults to 0
+
+        Raises:
+            ValueError: If the output format can not store several frames
+        """
+
+        self.out_file = out_file
+        self.options = options or {}
+        self.loop = loop
+        self.count = 0
+
+        # The format is only needed for a single file (each file of a sequence has its own extension)
+        self.sequence = '{index' in out_file.name
+        self.format = None if self.sequence else Image.registered_extensions().get(out_file.suffix.lower())
+        if not self.sequence and self.format not in FRAME_FORMATS:
+            raise ValueError(f"{out_file.suffix or out_file.name} files can not store several frames "
+                             f"(write a GIF, PNG, WebP or TIFF file, or one file per frame with {{index}} "
+                             f"in the output name)")
+
+        self._tiff = AppendingTiffWriter(out_file, new=True) if self.format == 'TIFF' else None
+        self._frames = []
+        self._durations = []
+
+    def write(self, img: np.ndarray, duration: float = None):
+        """Writes the next frame.
+
+        Args:
+            img (np.ndarray): The (H, W, C) frame
+            duration (float, optional): How long the frame is shown in milliseconds. Defaults to DEFAULT_DURATION
+        """
+
+        if self.sequence:
+            self.out_file.parent.mkdir(parents=True, exist_ok=True)
+            save_image(img, self.out_file.with_name(self.out_file.name.format(index=self.count)),
+                       options=self.options)
+
+        elif self._tiff is not None:
+            with to_pil_image(img) as img_file:
+                img_file.save(self._tiff, format='TIFF', **self.options)
+            self._tiff.newFrame()
+
+        else:
+            img_file = to_pil_image(img)
+            self._frames.append(_gif_frame(img_file) if self.format == 'GIF' else img_file)
+            self._durations.append(duration or DEFAULT_DURATION)
+
+        self.count += 1
+
+    def close(self):
+        """Finishes the file (encoding an animation from its frames)."""
+
+        if self._tiff is not None:
+            self._tiff.close()
+            self._tiff = None
+
+        elif self._frames:
+            # Transparent GIF frames clear the frame before them (instead of showing it through)
+            options = dict(self.options)
+            if any('transparency' in frame.info for frame in self._frames):
+                options.setdefault('disposal', 2)
+
+            first, *rest = self._frames
+            first.save(self.out_file, format=self.format, save_all=True, append_images=rest,
+                       duration=self._durations, loop=self.loop, **options)
+            self._frames, self._durations = [], []
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An animation is only encoded if every frame was written
+        if exc_type is not None:
+            self._frames, self._durations = [], []
+        self.close()
+
+
+def to_pil_image(img: np.ndarray) -> Image.Image:
+    """Converts an (H, W, C) image array to a Pillow image of the matching mode (L, LA, RGB or RGBA)."""
+
+    return Image.fromarray(img[..., 0] if img.shape[2] == 1 else img)
+
+
+def save_image(img: np.ndarray, out_file: Path, planar: bool = False, options: dict = None):
+    """Writes an image array to a file, in the format given by its extension.
+
+    Grayscale (L and LA) images are saved as such where the format allows it.
+    .npy and .raw files are written through a memory map, without encoding.
+
+    Args:
+        img (np.ndarray): The image to write
+        out_file (Path): The file to write to
+        planar (bool, optional): Whether to store each channel of a .raw file as a separate plane.
+            Defaults to False (interleaved)
+        options (dict, optional): Encoder options passed to Pillow (see encoder_options). Defaults to
+            Pillow's defaults
+
+    Raises:
+        ValueError: If the output format is not recognized
+        OSError: If the file can not be written
+    """
+
+    if is_mapped_format(out_file):
+        target = create_mapped_image(out_file, img.shape, planar)
+        target[...] = img
+        target.flush()
+        return
+
+    options = options or {}
+    with to_pil_image(img) as img_file:
+        try:
+            img_file.save(out_file, **options)
+        except OSError:
+            # Grayscale images are only expanded to colour for formats which can not store them
+            if not is_gray(img):
+                raise
+            with img_file.convert('RGBA' if has_alpha(img) else 'RGB') as expanded:
+                expanded.save(out_file, **options)
+
+
+def encoder_options(out_file: Path, compress_level: int = None, optimize: bool = False, quality: int = None,
+                    subsampling: str = None, tiff_compression: str = None, strip_rows: int = None) -> dict:
+    """Returns the Pillow save options of an output file, keeping only those its format uses.
+
+    Args:
+        out_file (Path): The file to be written (its extension gives the format)
+        compress_level (int, optional): The zlib compression level of PNG files (0-9, lower is faster)
+        optimize (bool, optional): Whether to spend extra time making PNG and JPEG files smaller.
+            Defaults to False
+        quality (int, optional): The quality of JPEG and WebP files, and of JPEG-compressed TIFF files (1-100)
+        subsampling (str, optional): The chroma subsampling of JPEG files ('4:4:4', '4:2:2' or '4:2:0')
+        tiff_compression (str, optional): The compression of TIFF files (see TIFF_COMPRESSIONS)
+        strip_rows (int, optional): The number of rows in each strip of TIFF files
+
+    Returns:
+        dict: The options to pass to save_image
+    """
+
+    options = {}
+    match Image.registered_extensions().get(out_file.suffix.lower()):
+        case 'PNG':
+            if compress_level is not None:
+                options['compress_level'] = compress_level
+            if optimize:
+                options['optimize'] = True
+
+        case 'JPEG':
+            if quality is not None:
+                options['quality'] = quality
+            if subsampling is not None:
+                options['subsampling'] = subsampling
+            if optimize:
+                options['optimize'] = True
+
+        case 'WEBP':
+            if quality is not None:
+                options['quality'] = quality
+
+        case 'TIFF':
+            if tiff_compression is not None:
+                options['compression'] = TIFF_COMPRESSIONS[tiff_compression]
+                if tiff_compression == 'jpeg' and quality is not None:
+                    options['quality'] = quality
+            if strip_rows is not None:  # written as given since Pillow 11 (earlier versions write one strip)
+                options['tiffinfo'] = {ROWS_PER_STRIP: strip_rows}
+
+    return options
+
+
+def create_mapped_image(out_file: Path, shape: tuple, planar: bool = False) -> np.memmap:
+    """Creates a .npy or .raw file of the given image shape and returns it memory-mapped for writing.
+
+    Args:
+        out_file (Path): The file to create (overwritten if it exists)
+        shape (tuple): The (H, W, C) shape of the image
+        planar (bool, optional): Whether to store each channel of a .raw file as a separate plane.
+            Defaults to False (interleaved)
+
+    Returns:
+        np.memmap: The (H, W, C) image array backed by the file (a transposed view for planar files)
+    """
+
+    if out_file.suffix.lower() == NPY_SUFFIX:
+        return np.lib.format.open_memmap(out_file, mode='w+', dtype=np.uint8, shape=tuple(shape))
+
+    height, width, channels = shape
+    if planar:
+        return np.memmap(out_file, dtype=np.uint8, mode='w+', shape=(channels, height, width)).transpose(1, 2, 0)
+    return np.memmap(out_file, dtype=np.uint8, mode='w+', shape=(height, width, channels))
+
+
+def _gif_frame(img_file: Image.Image) -> Image.Image:
+    """Reduces a frame to the modes GIF files store (L, or a palette of up to 256 colours with one transparent
+    colour), as Pillow's GIF encoder would."""
+
+    if img_file.mode == 'L':
+        return img_file
+
+    if img_file.mode == 'LA':
+        img_file = img_file.convert('RGBA')
+    img_file = img_file.convert('P', palette=Image.Palette.ADAPTIVE)
+    if img_file.palette.mode == 'RGBA':
+        transparent = [index for colour, index in img_file.palette.colors.items() if colour[3] == 0]
+        if transparent:
+            img_file.info['transparency'] = transparent[0]
+
+    return img_file
+
+
+def _load_mode(img_file: Image.Image) -> str:
+    """Returns the colour model an opened image file is loaded as (see LOAD_MODES)."""
+
+    if img_file.mode == 'P':
+        return 'RGBA' if 'transparency' in img_file.info else 'RGB'
+    return LOAD_MODES.get(img_file.mode, 'RGB')
+
+
+def _to_array(img_file: Image.Image, mode: str) -> np.ndarray:
+    """Converts a Pillow image to an (H, W, C) uint8 array in the given mode."""
+
+    img = np.asarray(img_file if img_file.mode == mode else img_file.convert(mode), dtype=np.uint8)
+
+    # Single channel images have no channel axis
+    return img[..., np.newaxis] if img.ndim == 2 else img
+
+
+def _draft(img_file: Image.Image, region: tuple, max_size: int) -> tuple:
+    """Asks the decoder to reduce the image while decoding (i.e. JPEG DCT scaling by 1/2, 1/4 or 1/8)
+    as far as possible without the region becoming smaller than max_size.
+
+    Returns:
+        tuple: The region in the coordinates of the reduced image
+    """
+
+    width, height = img_file.size
+    factor = max(region[2] - region[0], region[3] - region[1]) / max_size
+    if factor < 2:
+        return region
+
+    # Formats which can not decode at a reduced scale ignore the draft request
+    img_file.draft(None, (math.ceil(width / factor), math.ceil(height / factor)))
+    if img_file.size == (width, height):
+        return region
+
+    # Scale the region outwards, so that it covers at least the requested pixels
+    x_scale, y_scale = img_file.size[0] / width, img_file.size[1] / height
+    x1, y1 = math.floor(region[0] * x_scale), math.floor(region[1] * y_scale)
+    x2, y2 = math.ceil(region[2] * x_scale), math.ceil(region[3] * y_scale)
+    return x1, y1, min(x2, img_file.size[0]), min(y2, img_file.size[1])
+
+
+def _prune_tiles(img_file: Image.Image, region: tuple):
+    """Removes the tiles (strips or tiles of a TIFF file) outside the region, so they are not read or decoded.
+
+    Files whose whole image is a single tile (i.e. compressed TIFF files decoded by libtiff) are read in full.
+    """
+
+    if img_file.format != 'TIFF' or len(img_file.tile) < 2:
+        return
+
+    # Each tile is (decoder, extents, offset, arguments), a plain tuple before Pillow 11 and a named tuple since
+    x1, y1, x2, y2 = region
+    img_file.tile = [tile for tile in img_file.tile
+                     if tile[1][0] < x2 and tile[1][2] > x1 and tile[1][1] < y2 and tile[1][3] > y1]
+
+
+def _map_image(in_file: Path, raw_shape: tuple[int, int, int], planar: bool) -> np.ndarray:
+    """Memory-maps a .npy or .raw file read-only as an (H, W, C) uint8 image (see load_image)."""
+
+    if in_file.suffix.lower() == NPY_SUFFIX:
+        img = np.load(in_file, mmap_mode='r')
+        if img.dtype != np.uint8 or img.ndim not in (2, 3) or (img.ndim == 3 and not 1 <= img.shape[2] <= 4):
+            raise ValueError(f"Expected a uint8 (H, W) or (H, W, C) array with 1 to 4 channels "
+                             f"(got {img.dtype} {img.shape})")
+        return img[..., np.newaxis] if img.ndim == 2 else img
+
+    if raw_shape is None:
+        raise ValueError("The size of a raw image must be given (width, height and channels)")
+
+    width, height, channels = raw_shape
+    if not 1 <= channels <= 4:
+        raise ValueError(f"Raw images must have 1 to 4 channels (got {channels})")
+
+    # The file must hold exactly the samples of the image
+    expected = width * height * channels
+    size = in_file.stat().st_size
+    if size != expected:
+        raise ValueError(f"Raw image of {width}x{height}x{channels} should be {expected} bytes (got {size})")
+
+    if planar:
+        return np.memmap(in_file, dtype=np.uint8, mode='r', shape=(channels, height, width)).transpose(1, 2, 0)
+    return np.memmap(in_file, dtype=np.uint8, mode='r', shape=(height, width, channels))
+
+
+def unique_path(out_file: Path) -> Path:
+    """Returns the given path, or if it already exists, the path with the first free number appended to its name."""
+
+    i = 1
+    stem = out_file.stem
+    while out_file.exists():
+        out_file = out_file.with_name(f'{stem}-{i}{out_file.suffix}')
+        i += 1
+
+    return out_file
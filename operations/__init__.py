@@ -2,16 +2,51 @@
 #  Licensed Under the GNU GPL v3.0 License
 #  See LICENSE for more information
 
-"""Provides functions for manipulating images."""
-
-from .box_blur import box_blur
-from .chain import chain
-from .convolve import convolve
-from .crop import crop
-from .edge import edge
-from .grayscale import grayscale
-from .invert import invert
-from .mirror import mirror
-from .rotate import rotate
-from .sharpen import sharpen
-from .threshold import threshold
+"""Provides functions for manipulating images.
+
+Every operation accepts an optional out= array to write its result into instead of allocating a new image
+(pointwise operations and filters may be given the input image itself to work in place). Mirroring, rotating and
+cropping return views of the input unless out= is given.
+
+The module of each operation is imported the first time the operation is used, so that importing the package
+(i.e. to parse command line arguments) does not load numpy's submodules or scipy.
+"""
+
+import importlib
+
+# Exported operations, as the module defining each one (the modules are not named after their operation, so that
+# importing one, which binds it on the package, does not hide the operation)
+_EXPORTS = {
+    'box_blur': 'box_blurring',
+    'chain': 'chaining',
+    'chain_many': 'chaining',
+    'convolve': 'convolving',
+    'crop': 'cropping',
+    'edge': 'edge_detection',
+    'gaussian_blur': 'gaussian_blurring',
+    'grayscale': 'grayscaling',
+    'invert': 'inverting',
+    'mirror': 'mirroring',
+    'rotate': 'rotating',
+    'sepia': 'sepia_toning',
+    'sharpen': 'sharpening',
+    'threshold': 'thresholding',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    """Imports an operation's module on first use and returns the operation."""
+
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
@@ -0,0 +1,170 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .convolving import check_precision, colour_planes, convolve, planes_to_image
+from .fixed_point import accumulator_type, rescale
+from .profiling import note_engine
+
+
+def box_blur(img: np.ndarray, radius: int = 1, passes: int = 1, collapse: bool = False,
+             precision: str = 'float64', out: np.ndarray = None) -> np.ndarray:
+    """Blurs an image using a box blur.
+
+    Each pass is computed with running sums, so the cost per pixel does not depend on the radius.
+
+    Args:
+        img (np.ndarray): The image to blur
+        radius (int, optional): The radius of pixels to sample for blurring. Defaults to 1
+        passes (int, optional): The number of times to apply the blur. Defaults to 1
+        collapse (bool, optional): Whether to apply all passes at once with a composed kernel
+            (differs slightly near the borders, see convolve). Defaults to False
+        precision (str, optional): The arithmetic to use (see convolve). 'int16-fixed' keeps exact integer
+            window sums and matches float64. Defaults to 'float64'
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Raises:
+        ValueError: If the radius is not positive or the precision is not recognized
+
+    Returns:
+        np.ndarray: The blurred image
+    """
+
+    if radius < 1:
+        raise ValueError("Radius must be at least 1")
+
+    # A composed box kernel is no longer a box, so it is applied as a regular convolution
+    if collapse and passes > 1:
+        return convolve(img, box_kernel(radius), passes, collapse=True, precision=precision, out=out)
+
+    if check_precision(precision) == 'int16-fixed':
+        return box_blur_fixed(img, [radius] * passes, out)
+
+    planes = colour_planes(img, np.float32 if precision == 'float32' else np.float64)
+    note_engine(f"running sums {planes.dtype}")
+    for _ in range(passes):
+        planes = box_filter(planes, radius)
+
+    return planes_to_image(planes, img, out=out)
+
+
+def box_blur_fixed(img: np.ndarray, radii: list[int], out: np.ndarray = None) -> np.ndarray:
+    """Applies box blurs of the given radii in turn using exact integer window sums.
+
+    The sums are only divided by the product of the window areas at the end, so the result matches
+    float64 arithmetic (until the sums would overflow 64 bits, after which they are rescaled, see rescale).
+
+    Args:
+        img (np.ndarray): The image to blur
+        radii (list[int]): The radius of each pass
+        out (np.ndarray, optional): The uint8 array to write the result into. Defaults to a new array
+
+    Returns:
+        np.ndarray: The blurred image
+    """
+
+    note_engine('running sums int16-fixed')
+    planes = colour_planes(img, np.int16)
+    bound, divisor = 255, 1
+    for radius in radii:
+        if radius == 0:
+            continue
+        area = (radius * 2 + 1) ** 2
+        planes, bound, divisor = rescale(planes, bound, divisor, area)
+        bound *= area
+        divisor *= area
+        planes = box_sum(planes.astype(accumulator_type(bound), copy=False), radius)
+
+    return planes_to_image(planes, img, divisor, out)
+
+
+def box_kernel(radius: int = 1) -> np.ndarray:
+    """Builds the dense box blur kernel with the given radius (all pixels are equally weighted).
+
+    Args:
+        radius (int, optional): The radius of the kernel. Defaults to 1
+
+    Returns:
+        np.ndarray: The (2r + 1) x (2r + 1) kernel
+    """
+
+    kernel_size = radius * 2 + 1
+    return np.full((kernel_size, kernel_size), 1 / kernel_size ** 2)
+
+
+def box_filter(planes: np.ndarray, radius: int) -> np.ndarray:
+    """Averages each pixel of an (H, W, C) float array with its neighbours within a square of the given radius.
+
+    The borders are extended symmetrically (matching convolve2d(..., boundary='symm')).
+
+    Args:
+        planes (np.ndarray): The colour channels to filter
+        radius (int): The radius of the square window (0 leaves the planes unchanged)
+
+    Returns:
+        np.ndarray: The filtered colour channels
+    """
+
+    if radius == 0:
+        return planes
+
+    # Sum each window and divide by the window area once
+    planes = box_sum(planes, radius)
+    planes /= (radius * 2 + 1) ** 2
+
+    return planes
+
+
+def box_sum(planes: np.ndarray, radius: int) -> np.ndarray:
+    """Sums each pixel of an (H, W, C) array with its neighbours within a square of the given radius.
+
+    Integer planes must have a type which can hold the window sums. The running sums may wrap around,
+    but the differences between them (the window sums) are still exact. The running sums of float32 planes are
+    accumulated in float64, as they grow along the axis: in float32 their rounding error would reach 0.1 on wide
+    images, and would depend on where the planes start (so strips of an image would not match the whole image).
+
+    Args:
+        planes (np.ndarray): The colour channels to sum
+        radius (int): The radius of the square window
+
+    Returns:
+        np.ndarray: The window sums, of the same type as the planes
+    """
+
+    # Sum each window along the columns, then along the rows
+    planes = _window_sum(planes, radius, axis=0)
+    return _window_sum(planes, radius, axis=1)
+
+
+def _window_sum(planes: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Sums a sliding window of 2r + 1 elements along one axis using a running (prefix) sum."""
+
+    width = radius * 2 + 1
+
+    # Extend the axis symmetrically and accumulate (in place, unless float32 planes need float64 running sums)
+    pad = [(0, 0)] * planes.ndim
+    pad[axis] = (radius, radius)
+    sums = np.pad(planes, pad, mode='symmetric')
+    if sums.dtype == np.float32:
+        sums = np.cumsum(sums, axis=axis, dtype=np.float64)
+    else:
+        np.cumsum(sums, axis=axis, out=sums)
+
+    # Window i covers padded elements [i, i + width), so its sum is prefix[i + width - 1] - prefix[i - 1]
+    out = np.empty_like(planes)
+    out[_index(axis, 0)] = sums[_index(axis, width - 1)]
+    np.subtract(sums[_index(axis, slice(width, None))], sums[_index(axis, slice(None, -width))],
+                out=out[_index(axis, slice(1, None))])
+
+    return out
+
+
+def _index(axis: int, key) -> tuple:
+    """Builds an index which applies the key along the given axis of an (H, W, C) array."""
+
+    index = [slice(None)] * 3
+    index[axis] = key
+    return tuple(index)
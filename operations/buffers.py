@@ -0,0 +1,52 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Helpers for operations which can write their result into a caller-provided buffer (the out= parameter)."""
+
+import numpy as np
+
+
+def output_buffer(shape: tuple, out: np.ndarray = None) -> np.ndarray:
+    """Returns the array an operation should write its uint8 result into.
+
+    Args:
+        shape (tuple): The shape of the result
+        out (np.ndarray, optional): The caller's buffer. Defaults to a new array
+
+    Raises:
+        ValueError: If the buffer does not have the shape and type of the result
+
+    Returns:
+        np.ndarray: The buffer to write into
+    """
+
+    if out is None:
+        return np.empty(shape, dtype=np.uint8)
+
+    if out.shape != tuple(shape) or out.dtype != np.uint8:
+        raise ValueError(f"Output buffer must be a uint8 array of shape {tuple(shape)} "
+                         f"(got {out.dtype} {out.shape})")
+
+    return out
+
+
+def store(result: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Copies a result into the caller's buffer, if one was given (for code paths which can not write in place).
+
+    Args:
+        result (np.ndarray): The result of the operation
+        out (np.ndarray, optional): The caller's buffer. Defaults to None (the result is returned as is)
+
+    Raises:
+        ValueError: If the buffer does not have the shape of the result or is not uint8
+
+    Returns:
+        np.ndarray: The buffer holding the result
+    """
+
+    if out is None:
+        return result
+
+    np.copyto(output_buffer(result.shape, out), result, casting='unsafe')
+    return out
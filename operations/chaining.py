@@ -0,0 +1,461 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .convolving import convolve, full_convolve
+from .lut import apply_pointwise, compile_pointwise, result_channels
+from .profiling import profiled
+from .registry import GEOMETRIC, POINTWISE, get_operation, perform_operation
+
+# Intermediate results held by chain_many for pipelines which branch off them (the default limit), in bytes
+PREFIX_CACHE_BYTES = 512 * 1024 ** 2
+
+
+@dataclass
+class Step:
+    """A step of an optimized chain, standing in for one or more of the requested operations."""
+
+    kind: str  # 'pointwise', 'geometric', 'linear' or 'other'
+    operations: list[str]
+    turns: int = 0  # geometric steps: counter-clockwise quarter turns, followed by...
+    flip: bool = False  # ...a horizontal mirror if set
+    kernel: np.ndarray = field(default=None, repr=False)  # linear steps: the combined kernel
+
+    def describe(self) -> str:
+        """Returns a one-line description of the step."""
+
+        names = ' '.join(self.operations)
+        match self.kind:
+            case 'pointwise':
+                passes = len(compile_pointwise(_specs(self)))
+                return f"lookup table ({passes} pass{'es' if passes > 1 else ''}): {names}"
+            case 'geometric':
+                return f"view transform (rotate {self.turns * 90} CCW{', mirror' if self.flip else ''}): {names}"
+            case 'linear':
+                size = self.kernel.shape[0]
+                return f"single {size}x{size} convolution: {names}"
+            case _:
+                return names
+
+
+@dataclass(eq=False)
+class Node:
+    """A step of a tree of plans, shared by every pipeline whose plan starts with the steps leading to it."""
+
+    step: Step | None  # None for the root (the source image)
+    children: list['Node'] = field(default_factory=list)
+    outputs: list[int] = field(default_factory=list)  # the pipelines whose plan ends with this step
+
+
+class PrefixCache:
+    """A least recently used store of intermediate images, bounded by their total size.
+
+    Args:
+        max_bytes (int): The total size of the images above which the least recently used are dropped
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, node: Node) -> np.ndarray | None:
+        """Returns the image held for a node (marking it as recently used), or None if it was dropped."""
+
+        img = self.images.get(node)
+        if img is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.images.move_to_end(node)
+        return img
+
+    def put(self, node: Node, img: np.ndarray):
+        """Holds the image of a node, dropping the least recently used images if over the size limit."""
+
+        if img.nbytes > self.max_bytes:
+            return
+
+        self.images[node] = img
+        self.nbytes += img.nbytes
+        while self.nbytes > self.max_bytes:
+            _, dropped = self.images.popitem(last=False)
+            self.nbytes -= dropped.nbytes
+
+
+def chain(img: np.ndarray, operations: list[str], explain: bool = False, optimize: bool = True, cache=None,
+          key: str = None, verbose: bool = True) -> np.ndarray:
+    """Apply multiple operations to the image in sequence
+
+    The operations are first turned into a plan (see plan_chain) and then executed. With optimization enabled,
+    pointwise operations are compiled into lookup tables, geometric operations into one view transform and
+    consecutive blurs and sharpens into one convolution. Steps write their results into two alternating buffers
+    rather than allocating a new image each.
+
+    With a cache (see cache.ResultCache), the chain resumes after the last step whose result is stored, and the
+    result of each step performed is stored (except view transforms, which cost nothing to perform again).
+
+    Args:
+        img (np.ndarray): The image to apply the operations to
+        operations (list[str]): The operations to apply to the image
+        explain (bool, optional): Whether to print the plan before executing it. Defaults to False
+        optimize (bool, optional): Whether to fuse operations where possible. Defaults to True
+        cache (ResultCache, optional): The cache to look up and store step results in. Defaults to None
+        key (str, optional): The cache key of the image. Defaults to hashing the image
+        verbose (bool, optional): Whether to print each step as it is performed. Defaults to True
+
+    Returns:
+        np.ndarray: The image after the operations have been applied
+    """
+
+    plan = plan_chain(operations, optimize)
+
+    if explain:
+        print(explain_plan(operations, plan))
+
+    # Derive the key of each step's result from the previous one, and resume after the last stored result
+    keys = []
+    if cache is not None and plan:
+        key = key or cache.input_key(img)
+        for step in plan:
+            key = cache.derive(key, {'chain step': step.kind, 'operations': step.operations})
+            keys.append(None if step.kind == 'geometric' else key)
+        resume, cached = cache.find(keys)
+        if cached is not None:
+            if verbose:
+                print(f"Using cached result: {', '.join(op for step in plan[:resume + 1] for op in step.operations)}")
+            img, plan, keys = cached, plan[resume + 1:], keys[resume + 1:]
+
+    buffers = []
+    for i, step in enumerate(plan):
+        out = None
+        if step.kind == 'pointwise':
+            channels = result_channels(_specs(step), img.shape[-1])
+            out = _spare_buffer(buffers, img, img.shape[:-1] + (channels,))
+        elif step.kind == 'linear':
+            out = _spare_buffer(buffers, img, img.shape)
+        img = profiled(f"{step.kind}: {', '.join(step.operations)}", lambda: run_step(img, step, out, verbose), img)
+        if keys and keys[i] is not None:
+            cache.put(keys[i], img)
+
+    return img
+
+
+def chain_many(img: np.ndarray, pipelines: list[list[str]], explain: bool = False, optimize: bool = True,
+               max_bytes: int = PREFIX_CACHE_BYTES, verbose: bool = True) -> list[np.ndarray]:
+    """Apply several chains of operations to the same image, performing the steps they share only once
+
+    The pipelines are planned as by chain and combined into a tree (see plan_tree), which is walked depth first.
+    The result of a step which several pipelines continue from is held in memory (up to max_bytes in total,
+    least recently used first) until its last branch has been performed; a result which had to be dropped is
+    performed again from the closest step still held.
+
+    Args:
+        img (np.ndarray): The image to apply the operations to
+        pipelines (list[list[str]]): The operations of each pipeline
+        explain (bool, optional): Whether to print the combined plan before executing it. Defaults to False
+        optimize (bool, optional): Whether to fuse operations where possible. Defaults to True
+        max_bytes (int, optional): The memory for shared intermediate results. Defaults to PREFIX_CACHE_BYTES
+        verbose (bool, optional): Whether to print each step as it is performed. Defaults to True
+
+    Returns:
+        list[np.ndarray]: The result of each pipeline, in order
+    """
+
+    root = plan_tree(pipelines, optimize)
+
+    if explain:
+        print(explain_tree(pipelines, root))
+
+    results = [None] * len(pipelines)
+    prefixes = PrefixCache(max_bytes)
+
+    def perform(node: Node, img: np.ndarray) -> np.ndarray:
+        step = node.step
+        return profiled(f"{step.kind}: {', '.join(step.operations)}", lambda: run_step(img, step, verbose=verbose), img)
+
+    def result_of(path: list[Node]) -> np.ndarray:
+        # Start from the last step of the path still held (or the source image)
+        start, prefix = 0, img
+        for depth in reversed(range(1, len(path))):
+            if (held := prefixes.get(path[depth])) is not None:
+                start, prefix = depth, held
+                break
+
+        for node in path[start + 1:]:
+            prefix = perform(node, prefix)
+        return prefix
+
+    def visit(path: list[Node], prefix: np.ndarray):
+        node = path[-1]
+        for index in node.outputs:
+            results[index] = prefix
+        if len(node.children) > 1 and node.step is not None:
+            prefixes.put(node, prefix)
+
+        for i, child in enumerate(node.children):
+            if i:  # the branches before may have pushed it out of the cache
+                prefix = result_of(path)
+            result, prefix = perform(child, prefix), None
+            visit(path + [child], result)
+
+    visit([root], img)
+    return results
+
+
+def plan_tree(pipelines: list[list[str]], optimize: bool = True) -> Node:
+    """Builds the execution plans of several chains as a tree, sharing the steps at the start of the plans.
+
+    Each pipeline is planned on its own (see plan_chain), so pipelines share a step only if their plans agree
+    up to it: operations fused into one step in one pipeline (i.e. 'blur sharpen') are not split apart to share
+    a step with another ('blur edge').
+
+    Args:
+        pipelines (list[list[str]]): The operations of each pipeline
+        optimize (bool, optional): Whether to fuse operations where possible. Defaults to True
+
+    Raises:
+        ValueError: If an operation can not be used in chain mode
+
+    Returns:
+        Node: The root of the tree, standing for the source image
+    """
+
+    root = Node(None)
+    for index, operations in enumerate(pipelines):
+        node = root
+        for step in plan_chain(operations, optimize):
+            child = next((child for child in node.children if _same_step(child.step, step)), None)
+            if child is None:
+                child = Node(step)
+                node.children.append(child)
+            node = child
+        node.outputs.append(index)
+
+    return root
+
+
+def plan_chain(operations: list[str], optimize: bool = True) -> list[Step]:
+    """Builds the execution plan for a chain of operations.
+
+    How each operation is fused is read from its metadata in the registry (see operations.registry).
+    Geometric operations which rotate or mirror the image are combined into a single rotation and mirror
+    (cancelling out entirely if possible) and are moved ahead of any pointwise operations with lookup tables
+    they are mixed with, which they commute with. Consecutive linear filters (i.e. blur and sharpen) are combined
+    into one kernel when the earlier kernels can not push values outside [0, 255]. The combined convolution skips
+    the intermediate uint8 truncations, each of which loses up to 1 LSB (the reference convolution truncates its own
+    rounding error), scaled by the weights of the kernels after it. So the result differs from running the
+    operations separately by at most n LSB for n blurs, and by at most 4 LSB for blur then sharpen (whose centre
+    weight of 3.4 scales the loss of the blur's truncation).
+
+    Args:
+        operations (list[str]): The operations to apply to the image
+        optimize (bool, optional): Whether to fuse operations where possible. Defaults to True
+
+    Raises:
+        ValueError: If an operation can not be used in chain mode
+
+    Returns:
+        list[Step]: The steps to execute in order
+    """
+
+    for operation in operations:
+        if not get_operation(operation).chainable:
+            raise ValueError(f"Operation {operation} is not supported in chain mode")
+
+    if not optimize:
+        return [Step('linear', [operation], kernel=_kernel(operation)) if _kernel(operation) is not None
+                else Step('other', [operation]) for operation in operations]
+
+    plan = []
+    geometric = []  # pending geometric operations
+    pointwise = []  # pending pointwise operations (applied after the geometric ones)
+
+    def flush():
+        if geometric:
+            turns, flip = _dihedral(geometric)
+            if turns or flip:
+                plan.append(Step('geometric', geometric.copy(), turns, flip))
+            geometric.clear()
+        if pointwise:
+            plan.append(Step('pointwise', pointwise.copy()))
+            pointwise.clear()
+
+    for operation in operations:
+        metadata = get_operation(operation)
+        if metadata.kind == GEOMETRIC and _dihedral([operation]) is not None:
+            geometric.append(operation)
+
+        elif metadata.kind == POINTWISE and metadata.lookup is not None:
+            pointwise.append(operation)
+
+        elif metadata.kernel is not None:
+            flush()
+            kernel = _kernel(operation)
+            previous = plan[-1] if plan else None
+            if previous is not None and previous.kind == 'linear' and _is_bounded(previous.kernel):
+                previous.operations.append(operation)
+                previous.kernel = full_convolve(previous.kernel, kernel)
+            else:
+                plan.append(Step('linear', [operation], kernel=kernel))
+
+        else:
+            flush()
+            plan.append(Step('other', [operation]))
+
+    flush()
+    return plan
+
+
+def explain_plan(operations: list[str], plan: list[Step]) -> str:
+    """Formats an execution plan for display.
+
+    Args:
+        operations (list[str]): The requested operations
+        plan (list[Step]): The plan built from the operations
+
+    Returns:
+        str: The plan, one step per line
+    """
+
+    lines = [f"Optimized plan ({len(operations)} operations -> {len(plan)} steps):"]
+    lines += [f"  {i}. {step.describe()}" for i, step in enumerate(plan, 1)]
+    if not plan:
+        lines.append("  (nothing to do)")
+
+    return '\n'.join(lines)
+
+
+def explain_tree(pipelines: list[list[str]], root: Node) -> str:
+    """Formats a tree of plans for display.
+
+    Args:
+        pipelines (list[list[str]]): The requested pipelines
+        root (Node): The tree built from the pipelines
+
+    Returns:
+        str: The tree, one step per line (indented below the step it continues from)
+    """
+
+    lines = []
+    unshared = 0  # steps performed if each pipeline ran on its own
+
+    def describe(node: Node, depth: int):
+        nonlocal unshared
+        unshared += depth * len(node.outputs)
+        outputs = ', '.join(str(index + 1) for index in node.outputs)
+        lines.append(f"{'  ' * depth}- {node.step.describe()}{f' -> output {outputs}' if outputs else ''}")
+        for child in node.children:
+            describe(child, depth + 1)
+
+    for child in root.children:
+        describe(child, 1)
+    steps = len(lines)
+    if root.outputs:
+        lines.append(f"  (output {', '.join(str(index + 1) for index in root.outputs)}: nothing to do)")
+
+    lines.insert(0, f"Shared plan ({len(pipelines)} pipelines -> {steps} steps, {unshared} without sharing):")
+    return '\n'.join(lines)
+
+
+def run_step(img: np.ndarray, step: Step, out: np.ndarray = None, verbose: bool = True) -> np.ndarray:
+    """Executes a single step of a plan.
+
+    Args:
+        img (np.ndarray): The image to apply the step to
+        step (Step): The step to execute
+        out (np.ndarray, optional): The array to write the result of pointwise and linear steps into.
+            Defaults to a new array
+        verbose (bool, optional): Whether to print the operations performed. Defaults to True
+
+    Returns:
+        np.ndarray: The image after the step has been applied
+    """
+
+    match step.kind:
+        case 'pointwise':
+            if verbose:
+                print(f"Performing operations: {', '.join(step.operations)} (fused)")
+            return apply_pointwise(img, _specs(step), out)
+
+        case 'geometric':
+            if verbose:
+                print(f"Performing operations: {', '.join(step.operations)} (view)")
+            img = np.rot90(img, step.turns, axes=(-3, -2))
+            return np.flip(img, axis=-2) if step.flip else img
+
+        case 'linear':
+            if verbose:
+                print(f"Performing operations: {', '.join(step.operations)} (combined kernel)")
+            return convolve(img, step.kernel, out=out)
+
+        case _:
+            return perform_operation(img, step.operations[0], verbose=verbose)
+
+
+def _same_step(a: Step, b: Step) -> bool:
+    """Checks whether two steps perform the same work (the kernel of a linear step follows from its operations)."""
+    return (a.kind, a.operations, a.turns, a.flip) == (b.kind, b.operations, b.turns, b.flip)
+
+
+def _specs(step: Step) -> tuple:
+    """Returns the lookup table specs of a pointwise step."""
+    return tuple(get_operation(operation).lookup for operation in step.operations)
+
+
+def _kernel(operation: str) -> np.ndarray | None:
+    """Returns the kernel of a linear filter with its default arguments, or None for other operations."""
+
+    kernel = get_operation(operation).kernel
+    return None if kernel is None else kernel()
+
+
+def _spare_buffer(buffers: list, img: np.ndarray, shape: tuple) -> np.ndarray:
+    """Returns a buffer of the given shape which does not overlap the image (at most two are kept)."""
+
+    # Buffers of another shape (before a rotation or a change of colour model) are no longer useful
+    buffers[:] = [buffer for buffer in buffers if buffer.shape == shape]
+
+    for buffer in buffers:
+        if not np.may_share_memory(buffer, img):
+            return buffer
+
+    buffers.append(np.empty(shape, dtype=np.uint8))
+    return buffers[-1]
+
+
+def _dihedral(operations: list[str]) -> tuple[int, bool] | None:
+    """Reduces a sequence of geometric operations to counter-clockwise quarter turns followed by an optional mirror.
+
+    Returns None if the operations do not rotate or mirror the image (i.e. a registered crop or shift).
+    """
+
+    # Track where the pixels of a small asymmetric probe image end up
+    probe = np.arange(6, dtype=np.uint8).reshape(2, 3, 1)
+    expected = probe
+    for operation in operations:
+        expected = get_operation(operation).perform(expected, None)
+
+    for flip in (False, True):
+        for turns in range(4):
+            candidate = np.rot90(probe, turns)
+            if flip:
+                candidate = np.fliplr(candidate)
+            if candidate.shape == expected.shape and np.array_equal(candidate, expected):
+                return turns, flip
+
+    return None
+
+
+def _is_bounded(kernel: np.ndarray) -> bool:
+    """Checks whether a kernel keeps every result within [0, 255] (so no clipping is skipped by combining it)."""
+
+    return bool(np.all(kernel >= 0) and kernel.sum() <= 1 + 1e-9)
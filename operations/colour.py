@@ -0,0 +1,68 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""The colour models of image arrays.
+
+Images are (H, W, C) uint8 arrays whose channel count records their colour model:
+
+- 1 channel: L (luminance)
+- 2 channels: LA (luminance and alpha)
+- 3 channels: RGB
+- 4 channels: RGBA
+
+Grayscale images are kept as a single luminance plane throughout, and are only expanded to RGB when an operation
+introduces colour (i.e. sepia) or a file format needs it.
+
+Batches of images of the same size are (N, H, W, C) arrays, which the operations process in one call.
+"""
+
+import numpy as np
+
+# The colour model of each channel count
+MODELS = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+
+
+def colour_model(img: np.ndarray) -> str:
+    """Returns the colour model of an image ('L', 'LA', 'RGB' or 'RGBA').
+
+    Raises:
+        ValueError: If the array is not an image with 1 to 4 channels
+    """
+
+    if img.ndim != 3 or img.shape[2] not in MODELS:
+        raise ValueError(f"Expected an (H, W, C) image with 1 to 4 channels (got shape {img.shape})")
+
+    return MODELS[img.shape[2]]
+
+
+def has_alpha(img: np.ndarray) -> bool:
+    """Returns whether an image (or an (N, H, W, C) batch of images) has an alpha channel (its last channel)."""
+    return img.shape[-1] in (2, 4)
+
+
+def colour_channels(img: np.ndarray) -> int:
+    """Returns the number of colour channels of an image (1 for grayscale, 3 for RGB), excluding alpha."""
+    return img.shape[-1] - has_alpha(img)
+
+
+def is_gray(img: np.ndarray) -> bool:
+    """Returns whether an image is stored as a single luminance plane (L or LA)."""
+    return colour_channels(img) == 1
+
+
+def to_rgb(img: np.ndarray) -> np.ndarray:
+    """Expands a grayscale (L or LA) image to RGB (or RGBA), copying the luminance to each colour channel.
+
+    Args:
+        img (np.ndarray): The image to expand
+
+    Returns:
+        np.ndarray: The RGB(A) image (the image itself if it is already in colour)
+    """
+
+    if not is_gray(img):
+        return img
+
+    # Repeat the luminance channel three times, keeping the alpha channel (if any) last
+    return img[..., [0, 0, 0, 1] if has_alpha(img) else [0, 0, 0]]
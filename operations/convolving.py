@@ -0,0 +1,354 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import output_buffer
+from .colour import colour_channels, has_alpha
+from .fixed_point import correlate_fixed, fixed_kernel, rescale, separate_fixed
+from .profiling import note_engine
+
+# Convolution engines which can be requested explicitly (for benchmarking)
+METHODS = ('auto', 'reference', 'direct', 'separable', 'fft')
+
+# Arithmetic used for filtering (see convolve for the error of each against the float64 reference)
+PRECISIONS = ('float64', 'float32', 'int16-fixed')
+
+# Kernels with at least this many taps are convolved in the frequency domain when picking the fastest engine
+FFT_MIN_TAPS = 15 ** 2
+
+# Singular values below this fraction of the largest one are treated as zero when detecting separable kernels
+SEPARABLE_TOLERANCE = 1e-10
+
+# Results of the fast engines this close below an integer are rounded up before truncation, so that they agree on
+# exact values. The reference engine truncates its own rounding error instead, as the original per-channel convolve2d
+# path did (i.e. a 3x3 box blur of the values 1 to 9 gives 4.999999999999999, and so 4 instead of 5). No engine
+# summing in another order can reproduce that error, so the fast engines differ from it by up to 1 LSB.
+ROUNDING_SLACK = 1e-6
+FLOAT32_ROUNDING_SLACK = 1e-3  # float32 sums of 8-bit values are only accurate to about 1e-4
+
+
+def convolve(img: np.ndarray, kernel: np.ndarray, passes: int = 1, method: str = 'auto',
+             collapse: bool = False, precision: str = 'float64', out: np.ndarray = None) -> np.ndarray:
+    """Convolves an image with a kernel.
+
+    With collapse enabled, multiple passes are precomposed into a single larger kernel (see compose_kernel)
+    which is applied once. The result matches repeated passes to within 1 LSB, except within
+    passes * radius pixels of the image border: repeated passes reflect each intermediate result at the border,
+    whereas the composed kernel only reflects the original image.
+
+    The precision sets the arithmetic used, trading accuracy against memory traffic:
+
+    - 'float64' is the reference. By default the result is identical to the original per-channel convolve2d
+      output. The direct, separable and fft engines are faster but must be requested: they take values within
+      ROUNDING_SLACK below an integer as that integer, so their results are the exact truncated values (1 LSB above
+      the convolve2d output where its rounding error fell just below an integer).
+    - 'float32' halves the size of the intermediate planes. Results differ from float64 by at most 1 LSB.
+    - 'int16-fixed' uses int16 weights and integer sums (see operations.fixed_point). It is exact (matches float64)
+      for kernels whose weights have a common denominator d with d * max|weight| <= 32767, such as box, Sobel,
+      1-2-1 and sharpen kernels. Other kernels are quantized, which changes each value by at most
+      255 * taps * max|weight| / 32767 per pass before truncation. Only the direct and separable engines are available.
+
+    At float32 and int16-fixed, which already differ from the reference output, 'auto' picks the fastest engine.
+
+    Args:
+        img (np.ndarray): The image to convolve
+        kernel (np.ndarray): The kernel to convolve with (internally flipped in both axes)
+        passes (int, optional): The number of times to convolve the image. Defaults to 1
+        method (str, optional): The convolution engine to use, one of 'auto', 'reference', 'direct', 'separable'
+            or 'fft'. Defaults to 'auto', which picks the reference engine at float64 precision
+        collapse (bool, optional): Whether to apply all passes at once with a composed kernel. Defaults to False
+        precision (str, optional): The arithmetic to use, one of 'float64', 'float32' or 'int16-fixed'.
+            Defaults to 'float64'
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Raises:
+        ValueError: If the kernel is invalid or the requested engine or precision cannot be used with it
+
+    Returns:
+        np.ndarray: The convolved image
+    """
+
+    # Ensure the kernel is square and is odd-sized
+    if kernel.shape[0] != kernel.shape[1] or kernel.shape[0] % 2 == 0:
+        raise ValueError("Kernel must be an odd-sized square")
+
+    # Promote the kernel type
+    kernel = kernel.astype(np.float64)
+
+    # Replace multiple passes with a single pass of the equivalent kernel if requested
+    if collapse and passes > 1:
+        kernel = compose_kernel(kernel, passes)
+        passes = 1
+
+    # Integer arithmetic has its own engines
+    if check_precision(precision) == 'int16-fixed':
+        return _convolve_fixed(img, kernel, passes, method, out)
+
+    # Choose the convolution engine for this kernel (only the reference engine reproduces the original float64 output)
+    dtype = np.float32 if precision == 'float32' else np.float64
+    if method == 'auto' and dtype == np.float64:
+        method = 'reference'
+    engine = _select_engine(kernel, method, dtype)
+
+    # Convert the colour channels to floating point once
+    planes = colour_planes(img, dtype)
+
+    # Perform the convolution on all colour channels at once, alternating between two buffers
+    spare = np.empty_like(planes)
+    for _ in range(passes):
+        result = engine(planes, spare)
+        if result is not planes:
+            spare = planes
+        planes = result
+
+    return planes_to_image(planes, img, out=out, slack=method != 'reference')
+
+
+def check_precision(precision: str) -> str:
+    """Returns the precision if it is one of PRECISIONS.
+
+    Raises:
+        ValueError: If the precision is not recognized
+    """
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unrecognized precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+
+    return precision
+
+
+def colour_planes(img: np.ndarray, dtype: type = np.float64) -> np.ndarray:
+    """Extracts the colour channels of an image as an (H, W, C) array for filtering.
+
+    The frames of an (N, H, W, C) batch are stacked along the channel axis, giving (H, W, N * C) planes,
+    so the engines filter the whole batch in one call (see planes_to_image).
+
+    Args:
+        img (np.ndarray): The image (or batch of images) to extract the colour channels from
+        dtype (type, optional): The type of the planes. Defaults to np.float64
+
+    Returns:
+        np.ndarray: The colour channels (a single channel if the image is grayscale, see operations.colour)
+    """
+
+    colours = img[..., :colour_channels(img)]
+    if img.ndim == 3:
+        return colours.astype(dtype)
+
+    # Copy the batch into frame-major channels in one pass (the reshape is then a view)
+    frames, height, width, channels = colours.shape
+    planes = np.empty((height, width, frames, channels), dtype=dtype)
+    planes[...] = np.moveaxis(colours, 0, 2)
+    return planes.reshape(height, width, frames * channels)
+
+
+def planes_to_image(planes: np.ndarray, img: np.ndarray, divisor: int = 1, out: np.ndarray = None,
+                    slack: bool = True) -> np.ndarray:
+    """Converts filtered colour channels back to a uint8 image, taking the alpha channel from the original image.
+
+    The planes are clipped in place.
+
+    Args:
+        planes (np.ndarray): The filtered colour channels from colour_planes
+        img (np.ndarray): The original image (or batch of images)
+        divisor (int, optional): What integer planes are divided by (rounding down) to get the pixel values.
+            Defaults to 1
+        out (np.ndarray, optional): The uint8 array to write the image into (may be the original image,
+            as the planes are a copy). Defaults to a new array
+        slack (bool, optional): Whether floating point values within ROUNDING_SLACK below an integer are taken as
+            that integer. Defaults to True
+
+    Returns:
+        np.ndarray: The filtered image
+    """
+
+    # Allocate the output once (unless given) and copy the alpha channel straight across (no float round trip)
+    out = output_buffer(img.shape, out)
+    if has_alpha(img) and out is not img:
+        out[..., -1] = img[..., -1]
+
+    if np.issubdtype(planes.dtype, np.integer):
+        # Integer sums are exact, so clipping and dividing gives the same result as the float64 reference
+        np.clip(planes, 0, 255 * divisor, out=planes)
+        if divisor > 1:
+            planes //= divisor
+    else:
+        # Absorb floating point error so that every engine truncates exact values the same way
+        if slack:
+            planes += FLOAT32_ROUNDING_SLACK if planes.dtype == np.float32 else ROUNDING_SLACK
+
+        # Clip values to the range [0, 255] before converting back to uint8
+        np.clip(planes, 0, 255, out=planes)
+
+    # Convert back to uint8 (truncating) while writing into the output (unstacking the frames of a batch)
+    if img.ndim == 3:
+        out[..., :planes.shape[2]] = planes
+    else:
+        # Narrowing to uint8 before the transposing copy moves a quarter (or eighth) of the bytes
+        channels = planes.shape[2] // img.shape[0]
+        frames = planes.astype(np.uint8).reshape(planes.shape[:2] + (img.shape[0], channels))
+        np.moveaxis(out[..., :channels], 0, 2)[...] = frames
+    return out
+
+
+def compose_kernel(kernel: np.ndarray, passes: int) -> np.ndarray:
+    """Builds the kernel equivalent to correlating with the given kernel several times (ignoring boundaries).
+
+    Args:
+        kernel (np.ndarray): The odd-sized square kernel applied on each pass
+        passes (int): The number of passes to combine
+
+    Returns:
+        np.ndarray: The composed kernel, with a radius of passes times the original radius
+    """
+
+    composed = kernel
+    for _ in range(passes - 1):
+        composed = full_convolve(composed, kernel)
+
+    return composed
+
+
+def full_convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the full 2D convolution of two small kernels: the kernel equivalent to applying one after the other.
+
+    Kernels are small, so this sums shifted copies of one kernel rather than loading scipy.signal for it.
+    """
+
+    result = np.zeros((a.shape[0] + b.shape[0] - 1, a.shape[1] + b.shape[1] - 1), dtype=np.result_type(a, b))
+    for (y, x), weight in np.ndenumerate(a):
+        result[y:y + b.shape[0], x:x + b.shape[1]] += weight * b
+
+    return result
+
+
+def separate_kernel(kernel: np.ndarray) -> tuple[np.ndarray, np.ndarray] | None:
+    """Splits a rank-1 kernel into a column and a row vector using the singular value decomposition.
+
+    Args:
+        kernel (np.ndarray): The 2D kernel to split
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] | None: The column and row vectors whose outer product is the kernel,
+            or None if the kernel is not separable
+    """
+
+    u, s, vt = np.linalg.svd(kernel)
+
+    # An all-zero kernel has no meaningful decomposition
+    if s[0] == 0:
+        return None
+
+    # Separable kernels have exactly one non-zero singular value
+    if np.any(s[1:] > s[0] * SEPARABLE_TOLERANCE):
+        return None
+
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+def _select_engine(kernel: np.ndarray, method: str, dtype: type = np.float64):
+    """Returns a function which correlates an (H, W, C) array with the kernel across all channels at once.
+
+    Correlation is equivalent to convolution with the kernel flipped in both axes.
+    All engines reproduce the symmetric boundary handling of convolve2d(..., boundary='symm').
+    The returned function takes the input and a spare buffer of the same shape which it may write its result into.
+    The engine is chosen using the float64 kernel, which is then converted to the type of the planes.
+    """
+
+    if method not in METHODS:
+        raise ValueError(f"Unrecognized convolution method: {method} (expected one of {', '.join(METHODS)})")
+
+    if method in ('auto', 'separable'):
+        vectors = separate_kernel(kernel)
+        if vectors is not None:
+            column, row = (vector.astype(dtype) for vector in vectors)
+            note_engine(f"separable {np.dtype(dtype).name}")
+            return lambda planes, spare: _separable(planes, spare, column, row)
+        elif method == 'separable':
+            raise ValueError("Kernel is not separable (it is not the outer product of two vectors)")
+
+    kernel = kernel.astype(dtype)
+    if method == 'reference':
+        note_engine(f"reference {np.dtype(dtype).name}")
+        return lambda planes, spare: _reference(planes, spare, kernel)
+
+    if method == 'fft' or (method == 'auto' and kernel.size >= FFT_MIN_TAPS):
+        note_engine(f"fft {np.dtype(dtype).name}")
+        return lambda planes, spare: _fft(planes, kernel)
+
+    note_engine(f"direct {np.dtype(dtype).name}")
+    return lambda planes, spare: _direct(planes, spare, kernel)
+
+
+def _reference(planes: np.ndarray, spare: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Convolves each channel in turn with convolve2d and the flipped kernel, exactly as the original path did."""
+
+    from scipy.signal import convolve2d
+
+    # Flipping the kernel for convolve2d correlates with it (the same sums, in the same order, as before)
+    flipped = np.flip(kernel)
+    for channel in range(planes.shape[2]):
+        spare[..., channel] = convolve2d(planes[..., channel], flipped, mode='same', boundary='symm')
+    return spare
+
+
+def _direct(planes: np.ndarray, spare: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Correlates each channel with a kernel by direct summation (O(k²) per pixel)."""
+
+    from scipy.ndimage import correlate  # scipy is only loaded once an engine needs it
+
+    # scipy.ndimage's 'reflect' mode repeats the edge pixel, matching boundary='symm'
+    return correlate(planes, kernel[..., np.newaxis], output=spare, mode='reflect')
+
+
+def _separable(planes: np.ndarray, spare: np.ndarray, column: np.ndarray, row: np.ndarray) -> np.ndarray:
+    """Correlates each channel with the outer product of two vectors using two 1D passes (O(2k) per pixel)."""
+
+    from scipy.ndimage import correlate1d
+
+    # The input is no longer needed once the first pass is done, so it holds the final result
+    correlate1d(planes, column, axis=0, output=spare, mode='reflect')
+    return correlate1d(spare, row, axis=1, output=planes, mode='reflect')
+
+
+def _fft(planes: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Correlates each channel with a kernel in the frequency domain using overlap-add (O(log k) per pixel)."""
+
+    from scipy.signal import oaconvolve
+
+    # Pad the spatial axes symmetrically (once for all channels) so the 'valid' region is the same size as the input
+    radius = kernel.shape[0] // 2
+    padded = np.pad(planes, ((radius, radius), (radius, radius), (0, 0)), mode='symmetric')
+
+    # oaconvolve flips the kernel, so flip it beforehand to correlate
+    return oaconvolve(padded, np.flip(kernel)[..., np.newaxis], mode='valid', axes=(0, 1))
+
+
+def _convolve_fixed(img: np.ndarray, kernel: np.ndarray, passes: int, method: str,
+                    out: np.ndarray = None) -> np.ndarray:
+    """Convolves an image using int16 weights and integer sums (see convolve)."""
+
+    if method not in METHODS:
+        raise ValueError(f"Unrecognized convolution method: {method} (expected one of {', '.join(METHODS)})")
+    if method in ('reference', 'fft'):
+        raise ValueError(f"The {method} engine can not be used with int16-fixed precision")
+
+    weights, scale, _ = fixed_kernel(kernel)
+    separable = method != 'direct'
+    if method == 'separable' and separate_fixed(weights) is None:
+        raise ValueError("Kernel is not separable (it is not the outer product of two integer vectors)")
+
+    # The sums are divided by the kernel scale once per pass, all at the end
+    planes = colour_planes(img, np.int16)
+    bound, divisor = 255, 1
+    growth = int(np.abs(weights.astype(np.int64)).sum())
+    for _ in range(passes):
+        planes, bound, divisor = rescale(planes, bound, divisor, growth)
+        planes, bound = correlate_fixed(planes, weights, bound, separable)
+        divisor *= scale
+
+    return planes_to_image(planes, img, divisor, out)
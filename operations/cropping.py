@@ -4,8 +4,10 @@
 
 import numpy as np
 
+from .buffers import store
 
-def crop(img: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+
+def crop(img: np.ndarray, x1: int, y1: int, x2: int, y2: int, out: np.ndarray = None) -> np.ndarray:
     """Crops the image to within the specified coordinates.
 
     Args:
@@ -14,6 +16,8 @@ def crop(img: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
         y1 (int): The y-coordinate of the top left corner
         x2 (int): The x-coordinate of the bottom right corner
         y2 (int): The y-coordinate of the bottom right corner
+        out (np.ndarray, optional): An array to copy the result into. Defaults to None (a view of the image
+            is returned without copying any pixels)
 
     Raises:
         ValueError: If the coordinates are invalid
@@ -22,11 +26,18 @@ def crop(img: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
         np.ndarray: The cropped image
     """
 
-    # Image dimensions (upper bounds for coordinates)
-    height = img.shape[0]
-    width = img.shape[1]
+    check_box(img.shape[-2], img.shape[-3], x1, y1, x2, y2)
+    return store(img[..., y1:y2, x1:x2, :], out)  # height-wise, then width-wise (after the frames of a batch)
+
+
+def check_box(width: int, height: int, x1: int, y1: int, x2: int, y2: int):
+    """Checks that crop coordinates describe a non-empty region within an image of the given size.
+
+    Raises:
+        ValueError: If the coordinates are invalid
+    """
 
-    # Validate coordinates
+    # Validate coordinates (the image dimensions are upper bounds)
     if x1 < 0 or y1 < 0 or x1 > width or y1 > height:
         raise ValueError(f"Invalid coordinates: ({x1}, {y1}) is out of bounds")
 
@@ -41,6 +52,3 @@ def crop(img: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
 
     elif y1 == y2:
         raise ValueError("Invalid coordinates: specified region has a height of 0 pixels")
-
-    else:
-        return img[y1:y2, x1:x2]  # first dimension is height-wise, second is width-wise
@@ -0,0 +1,156 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import output_buffer
+from .colour import has_alpha
+from .grayscaling import grayscale
+from .profiling import note_engine
+
+# Gradient operators: the smoothing taps across the gradient and the derivative taps along it
+OPERATORS = {
+    'sobel': (np.array([1, 2, 1], dtype=np.float32), np.array([-1, 0, 1], dtype=np.float32)),
+    'scharr': (np.array([3, 10, 3], dtype=np.float32), np.array([-1, 0, 1], dtype=np.float32)),
+    'prewitt': (np.array([1, 1, 1], dtype=np.float32), np.array([-1, 0, 1], dtype=np.float32)),
+}
+
+# The noise filter: two passes of the 1-2-1 blur along each axis, or one pass of their composition
+BLUR_TAPS = np.array([1, 2, 1], dtype=np.float32) / 4
+COLLAPSED_BLUR_TAPS = np.array([1, 4, 6, 4, 1], dtype=np.float32) / 16
+
+# Rows and columns of neighbours each output pixel depends on (two blur passes and the 3x3 operator)
+EDGE_RADIUS = 3
+
+
+def edge(img: np.ndarray, cutoff: int = 150, collapse: bool = False, operator: str = 'sobel',
+         direction: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Applies edge detection to an image using a gradient operator (Sobel, Scharr or Prewitt).
+
+    The luminance is blurred to filter noise, and the gradient magnitude of each pixel is normalized by the
+    largest in the image (in each frame of a batch) to [0, 255] and thresholded. Edges are white (or with direction,
+    their gradient direction), and the alpha channel of the image is kept.
+
+    Args:
+        img (np.ndarray): The image to apply edge detection to
+        cutoff (int, optional): The threshold to use for edge detection. Defaults to 150.
+        collapse (bool, optional): Whether to apply both blur passes at once with a composed 5-tap filter
+            (differs slightly near the borders). Defaults to False
+        operator (str, optional): The gradient operator, one of 'sobel', 'scharr' or 'prewitt'. Defaults to 'sobel'
+        direction (bool, optional): Whether edge pixels hold the direction of the gradient instead of white
+            (see edge_image). Defaults to False
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place) if it is grayscale. Defaults to a new array
+
+    Raises:
+        ValueError: If the operator is not recognized
+
+    Returns:
+        np.ndarray: The edge-detected image (L, or LA if the image has an alpha channel)
+    """
+
+    # Compute the gradient magnitude (and direction) of each pixel
+    magnitude, angle = gradients(img, collapse, operator, direction)
+
+    # Threshold each frame relative to its largest gradient
+    peak = np.max(magnitude, axis=(-2, -1), keepdims=True)
+    return edge_image(img, magnitude, angle, peak, cutoff, out)
+
+
+def gradients(img: np.ndarray, collapse: bool = False, operator: str = 'sobel',
+              direction: bool = False) -> tuple[np.ndarray, np.ndarray | None]:
+    """Computes the gradient magnitude (and direction) of the blurred luminance of an image, as used by edge.
+
+    The luminance is converted to float32 once, and the blur and both gradients are computed with 1D passes over
+    that single plane (the operators are separable), so no intermediate result is rounded or clipped.
+    Each output pixel depends only on the input pixels within EDGE_RADIUS rows and columns of it.
+
+    Args:
+        img (np.ndarray): The image (or batch of images) to compute the gradients of
+        collapse (bool, optional): Whether to apply both blur passes at once with a composed 5-tap filter.
+            Defaults to False
+        operator (str, optional): The gradient operator, one of 'sobel', 'scharr' or 'prewitt'. Defaults to 'sobel'
+        direction (bool, optional): Whether to compute the direction too. Defaults to False
+
+    Raises:
+        ValueError: If the operator is not recognized
+
+    Returns:
+        tuple[np.ndarray, np.ndarray | None]: The float32 (H, W) (or (N, H, W)) gradient magnitude, and the
+            direction in radians (atan2 of the vertical and horizontal gradients, with y pointing down the image)
+            or None
+    """
+
+    if operator not in OPERATORS:
+        raise ValueError(f"Unrecognized edge operator: {operator} (expected one of {', '.join(OPERATORS)})")
+
+    from scipy.ndimage import correlate1d  # scipy is only loaded once edges are detected
+
+    note_engine(f"separable {operator} float32")
+    smooth, derivative = OPERATORS[operator]
+
+    # Convert to a single float32 luminance plane (per frame)
+    plane = grayscale(img)[..., 0].astype(np.float32)
+    rows, columns = plane.ndim - 2, plane.ndim - 1
+
+    # Filter noise by blurring the plane (approximate Gaussian blur, in place)
+    for axis in (rows, columns):
+        for taps in [COLLAPSED_BLUR_TAPS] if collapse else [BLUR_TAPS, BLUR_TAPS]:
+            correlate1d(plane, taps, axis, output=plane, mode='reflect')
+
+    # Smooth across each gradient and differentiate along it (the vertical gradient reuses the blurred plane)
+    spare = np.empty_like(plane)
+    gx = correlate1d(correlate1d(plane, smooth, rows, output=spare, mode='reflect'), derivative, columns,
+                     mode='reflect')
+    gy = correlate1d(correlate1d(plane, smooth, columns, output=spare, mode='reflect'), derivative, rows,
+                     output=plane, mode='reflect')
+
+    # Combine the gradients (the magnitude overwrites the horizontal gradient once the direction is taken)
+    angle = np.arctan2(gy, gx) if direction else None
+    return np.hypot(gx, gy, out=gx), angle
+
+
+def edge_image(img: np.ndarray, magnitude: np.ndarray, angle: np.ndarray | None, peak, cutoff: int,
+               out: np.ndarray = None) -> np.ndarray:
+    """Thresholds gradient magnitudes normalized to [0, 255] by the peak into an edge image.
+
+    Edge pixels are 255, or with angles, their direction mapped to 1 (-180 degrees) to 255 (180 degrees).
+    Other pixels are 0. The alpha channel of the image is copied across.
+
+    Args:
+        img (np.ndarray): The image the gradients were computed from
+        magnitude (np.ndarray): The gradient magnitudes (see gradients)
+        angle (np.ndarray | None): The gradient directions in radians, or None
+        peak: The magnitude normalized to 255 (the largest of the image or frame, also when processing a strip)
+        cutoff (int): The normalized magnitude from which pixels are edges [0-255]
+        out (np.ndarray, optional): The uint8 array to write the result into. Defaults to a new array
+
+    Raises:
+        ValueError: If the cutoff is not in the range [0, 255]
+
+    Returns:
+        np.ndarray: The edge image (L, or LA if the image has an alpha channel)
+    """
+
+    if cutoff < 0 or cutoff > 255:
+        raise ValueError("Threshold value must be in the range [0, 255]")
+
+    out = output_buffer(img.shape[:-1] + (1 + has_alpha(img),), out)
+
+    # Compare against the cutoff scaled to the peak instead of normalizing every magnitude (a flat image has no edges)
+    edges = magnitude >= np.float32(cutoff / 255) * peak
+    if cutoff:
+        edges &= magnitude > 0
+
+    if angle is None:
+        out[..., 0] = np.where(edges, np.uint8(255), np.uint8(0))
+    else:
+        levels = ((angle + np.pi) * np.float32(254 / (2 * np.pi)) + 1).astype(np.uint8)
+        out[..., 0] = np.where(edges, levels, np.uint8(0))
+
+    # Copy the alpha channel across
+    if has_alpha(img) and out is not img:
+        out[..., -1] = img[..., -1]
+
+    return out
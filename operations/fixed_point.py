@@ -0,0 +1,200 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Scaled-integer (fixed-point) filtering, used by the 'int16-fixed' precision.
+
+A kernel is turned into int16 weights and a divisor. Kernels whose weights are all multiples of 1/d for a small d
+(box blurs, the 1-2-1 blur, Sobel, sharpening with a rational amount) are represented exactly, so the integer result
+matches the float64 reference bit for bit. Other kernels are quantized so that the largest weight uses the full
+int16 range.
+
+The filtered values are kept as unnormalized integer sums, in the narrowest integer type which can not overflow,
+and are only divided by the accumulated divisor when converting back to uint8.
+"""
+
+import math
+from fractions import Fraction
+
+import numpy as np
+
+from .profiling import note_engine
+
+# Largest denominator of a single weight when looking for an exact integer form of a kernel
+MAX_DIVISOR = 1 << 15
+
+# Fractional bits kept when sums have to be divided down to avoid overflowing (see rescale)
+FRACTION_BITS = 14
+
+# Sums are rescaled once their bound would exceed this (leaving room for the next multiplication)
+MAX_SUM = 1 << 62
+
+_INT16_MAX = np.iinfo(np.int16).max
+
+
+def fixed_kernel(kernel: np.ndarray) -> tuple[np.ndarray, int, bool]:
+    """Converts a kernel to int16 weights and a divisor, so that kernel ≈ weights / divisor.
+
+    Args:
+        kernel (np.ndarray): The (float) kernel to convert
+
+    Returns:
+        tuple[np.ndarray, int, bool]: The integer weights, the divisor, and whether the conversion is exact
+    """
+
+    largest = float(np.max(np.abs(kernel)))
+    if largest == 0:
+        return np.zeros(kernel.shape, dtype=np.int16), 1, True
+
+    # Look for the smallest common denominator which makes every weight an integer (giving up once the scaled
+    # weights could no longer fit in int16, before the denominator grows without bound)
+    divisor = 1
+    for weight in np.unique(kernel):
+        divisor = math.lcm(divisor, Fraction(float(weight)).limit_denominator(MAX_DIVISOR).denominator)
+        if divisor > MAX_DIVISOR or largest * divisor > _INT16_MAX:
+            break
+    else:
+        scaled = kernel * divisor
+        if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-9):
+            return np.round(scaled).astype(np.int16), divisor, True
+
+    # Otherwise quantize with as many fractional bits as fit in int16 (so the largest weight is at least 2^14)
+    bits = math.floor(math.log2(_INT16_MAX / largest))
+    if bits >= 0:
+        return np.round(kernel * (1 << bits)).astype(np.int16), 1 << bits, False
+    raise ValueError("Kernel weights are too large for int16-fixed precision")
+
+
+def separate_fixed(weights: np.ndarray) -> tuple[np.ndarray, np.ndarray] | None:
+    """Splits integer weights into integer column and row vectors whose outer product equals them exactly.
+
+    Args:
+        weights (np.ndarray): The 2D integer weights to split
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] | None: The column and row vectors, or None if there is no exact integer split
+    """
+
+    weights = weights.astype(np.int64)
+    rows, columns = np.nonzero(weights)
+    if rows.size == 0:
+        return None
+
+    # The column through a non-zero weight, reduced by its common factor, is the only candidate column vector
+    column = weights[:, columns[0]]
+    column = column // np.gcd.reduce(column)
+    pivot = rows[0]
+
+    # Each row of the weights must then be the pivot row scaled by the column
+    if np.any(weights[pivot] % column[pivot]):
+        return None
+    row = weights[pivot] // column[pivot]
+
+    if not np.array_equal(np.outer(column, row), weights):
+        return None
+
+    return column, row
+
+
+def accumulator_type(bound: int) -> type:
+    """Returns the narrowest signed integer type which can hold values up to the given magnitude."""
+
+    for dtype in (np.int16, np.int32, np.int64):
+        if bound <= np.iinfo(dtype).max:
+            return dtype
+
+    raise OverflowError("Integer sums are too large (rescale them first)")
+
+
+def rescale(planes: np.ndarray, bound: int, divisor: int, growth: int) -> tuple[np.ndarray, int, int]:
+    """Divides the sums down if multiplying them by the growth of the next pass could overflow.
+
+    Only happens after many passes of large kernels. The sums keep FRACTION_BITS fractional bits,
+    so the added error is well below 1 LSB.
+
+    Args:
+        planes (np.ndarray): The integer sums
+        bound (int): The largest magnitude the sums can have
+        divisor (int): The divisor of the sums
+        growth (int): The factor the bound grows by in the next pass (the sum of the absolute weights)
+
+    Returns:
+        tuple[np.ndarray, int, int]: The (possibly rescaled) sums, their bound and their divisor
+    """
+
+    if bound * growth <= MAX_SUM or divisor <= 1 << FRACTION_BITS:
+        return planes, bound, divisor
+
+    factor = divisor >> FRACTION_BITS
+    planes //= factor
+    return planes, bound // factor + 1, divisor // factor
+
+
+def correlate_fixed(planes: np.ndarray, weights: np.ndarray, bound: int,
+                    separable: bool = True) -> tuple[np.ndarray, int]:
+    """Correlates each channel of an (H, W, C) integer array with integer weights by summing shifted slices.
+
+    The borders are extended symmetrically (matching convolve2d(..., boundary='symm')), separable weights are applied
+    as two 1D passes (the result is the same either way), and the result is kept unnormalized.
+
+    Args:
+        planes (np.ndarray): The integer colour channels
+        weights (np.ndarray): The odd-sized square integer weights
+        bound (int): The largest magnitude of the input values
+        separable (bool, optional): Whether to split the weights into two 1D passes when possible. Defaults to True
+
+    Returns:
+        tuple[np.ndarray, int]: The integer sums and their largest possible magnitude
+    """
+
+    vectors = separate_fixed(weights) if separable else None
+    if vectors is not None:
+        note_engine('separable int16-fixed')
+        column, row = vectors
+        planes, bound = _correlate_axis(planes, column, bound, axis=0)
+        return _correlate_axis(planes, row, bound, axis=1)
+
+    note_engine('direct int16-fixed')
+    radius = weights.shape[0] // 2
+    padded = np.pad(planes, ((radius, radius), (radius, radius), (0, 0)), mode='symmetric')
+    bound *= int(np.abs(weights.astype(np.int64)).sum())
+
+    height, width = planes.shape[:2]
+    taps = [(i, j, int(weights[i, j])) for i, j in zip(*np.nonzero(weights))]
+    return _sum_taps(taps, lambda i, j: padded[i:i + height, j:j + width], planes.shape, bound), bound
+
+
+def _correlate_axis(planes: np.ndarray, vector: np.ndarray, bound: int, axis: int) -> tuple[np.ndarray, int]:
+    """Correlates an (H, W, C) integer array with an integer vector along one axis."""
+
+    radius = vector.size // 2
+    pad = [(0, 0)] * 3
+    pad[axis] = (radius, radius)
+    padded = np.pad(planes, pad, mode='symmetric')
+    bound *= int(np.abs(vector.astype(np.int64)).sum())
+
+    length = planes.shape[axis]
+    taps = [(i, i, int(vector[i])) for i in np.nonzero(vector)[0]]
+    if axis == 0:
+        return _sum_taps(taps, lambda i, _: padded[i:i + length], planes.shape, bound), bound
+    return _sum_taps(taps, lambda i, _: padded[:, i:i + length], planes.shape, bound), bound
+
+
+def _sum_taps(taps: list, window, shape: tuple, bound: int) -> np.ndarray:
+    """Adds up weight * window(i, j) over the taps, in the narrowest integer type which can hold the result."""
+
+    dtype = accumulator_type(bound)
+    out = np.zeros(shape, dtype=dtype)
+    product = np.empty(shape, dtype=dtype)
+
+    for i, j, weight in taps:
+        values = window(i, j)
+        if weight == 1:
+            np.add(out, values, out=out, dtype=dtype)
+        elif weight == -1:
+            np.subtract(out, values, out=out, dtype=dtype)
+        else:
+            np.multiply(values, weight, out=product, dtype=dtype)
+            out += product
+
+    return out
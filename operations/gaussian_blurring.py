@@ -0,0 +1,71 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import math
+
+import numpy as np
+
+from .box_blurring import box_blur_fixed, box_filter
+from .convolving import check_precision, colour_planes, planes_to_image
+from .profiling import note_engine
+
+
+def gaussian_blur(img: np.ndarray, sigma: float = 2, precision: str = 'float64',
+                  out: np.ndarray = None) -> np.ndarray:
+    """Blurs an image with an approximate Gaussian blur made of three box blur passes.
+
+    The box sizes are chosen so that their combined variance matches the requested standard deviation,
+    and each pass uses running sums, so large sigmas cost the same as small ones.
+
+    Args:
+        img (np.ndarray): The image to blur
+        sigma (float, optional): The standard deviation of the Gaussian in pixels. Defaults to 2
+        precision (str, optional): The arithmetic to use (see convolve). Defaults to 'float64'
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Raises:
+        ValueError: If sigma is not positive or the precision is not recognized
+
+    Returns:
+        np.ndarray: The blurred image
+    """
+
+    if sigma <= 0:
+        raise ValueError("Sigma must be positive")
+
+    if check_precision(precision) == 'int16-fixed':
+        return box_blur_fixed(img, box_radii(sigma), out)
+
+    planes = colour_planes(img, np.float32 if precision == 'float32' else np.float64)
+    note_engine(f"running sums {planes.dtype}")
+    for radius in box_radii(sigma):
+        planes = box_filter(planes, radius)
+
+    return planes_to_image(planes, img, out=out)
+
+
+def box_radii(sigma: float, passes: int = 3) -> list[int]:
+    """Returns the box radii whose successive application best approximates a Gaussian blur.
+
+    Args:
+        sigma (float): The standard deviation of the Gaussian in pixels
+        passes (int, optional): The number of box passes. Defaults to 3
+
+    Returns:
+        list[int]: The radius of each pass (smaller boxes first)
+    """
+
+    # Ideal (odd) box width if every pass used the same box
+    ideal = math.sqrt(12 * sigma ** 2 / passes + 1)
+    lower = math.floor(ideal)
+    if lower % 2 == 0:
+        lower -= 1
+    upper = lower + 2
+
+    # Use the smaller box for as many passes as keeps the total variance closest to sigma²
+    smaller = round((12 * sigma ** 2 - passes * lower ** 2 - 4 * passes * lower - 3 * passes) / (-4 * lower - 4))
+    smaller = min(max(smaller, 0), passes)
+
+    return [(lower if i < smaller else upper) // 2 for i in range(passes)]
@@ -0,0 +1,45 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import store
+from .colour import has_alpha, is_gray
+from .lut import apply_pointwise
+
+
+def grayscale(img: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Converts the image to grayscale, as a single luminance channel (L, or LA if the image has alpha).
+
+    Args:
+        img (np.ndarray): The image to convert to grayscale
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Returns:
+        np.ndarray: The grayscale image
+    """
+
+    # Use lookup tables for uint8 images (the weighted sum is computed exactly in integers)
+    if img.dtype == np.uint8:
+        return apply_pointwise(img, (('grayscale',),), out)
+
+    # Average of all colour channels weighted equally for simple grayscale (naive)
+    # gray = np.mean(img[..., :3], axis=2)
+
+    # Gamma-corrected grayscale (weighted colour channels, vectorized for speed)
+    if is_gray(img):
+        gray = img[..., :1].astype(np.float64)
+    else:
+        gray = np.dot(img[..., :3], [0.2989, 0.5870, 0.1140])[..., np.newaxis]
+
+    # Add the alpha channel back in if necessary (the result is a single luminance channel, L or LA)
+    if has_alpha(img):
+        gray = np.concatenate((gray, img[..., -1:]), axis=-1)
+
+    # Clip values to the range [0, 255]
+    np.clip(gray, 0, 255, out=gray)
+
+    # Convert back to uint8
+    return store(gray.astype(np.uint8), out)
@@ -0,0 +1,35 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import store
+from .colour import colour_channels, has_alpha
+from .lut import apply_pointwise
+
+
+def invert(img: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Inverts the image colours.
+
+    Args:
+        img (np.ndarray): The image to invert
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Returns:
+        np.ndarray: The inverted image
+    """
+
+    # Use a lookup table for uint8 images
+    if img.dtype == np.uint8:
+        return apply_pointwise(img, (('invert',),), out)
+
+    # Invert the colour channels (one for grayscale images)
+    inverted = 255 - img[..., :colour_channels(img)]
+
+    # Add the alpha channel back in if necessary
+    if has_alpha(img):
+        inverted = np.concatenate((inverted, img[..., -1:]), axis=-1)
+
+    return store(inverted, out)
@@ -0,0 +1,323 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Compiles pointwise operations on uint8 images into lookup tables.
+
+A pointwise operation is described by a spec tuple: ('invert',), ('grayscale',), ('sepia',) or
+('threshold', cutoff, binary, invert). A sequence of specs compiles into a few stages, each made of:
+
+- an optional colour mix (a weighted sum of the red, green and blue values, for grayscale and sepia),
+  precomputed as one integer table per input channel, and
+- a 256-entry table per channel applied to the result (or to the input if there is no mix).
+
+Consecutive per-channel maps collapse into a single table, and maps before a mix are folded into its tables,
+so for example 'grayscale threshold invert' is one pass over the image.
+"""
+
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+from .buffers import output_buffer
+from .colour import to_rgb
+from .profiling import note_engine
+
+# Integer colour mixing weights (each output channel is the weighted sum of red, green and blue divided by the scale)
+GRAYSCALE_WEIGHTS = ((2989, 5870, 1140),) * 3
+GRAYSCALE_SCALE = 10000
+SEPIA_WEIGHTS = ((393, 769, 189), (349, 686, 168), (272, 534, 131))
+SEPIA_SCALE = 1000
+
+# Number of pixels mixed or looked up at a time (keeps the intermediates in cache)
+BLOCK_PIXELS = 1 << 16
+
+_IDENTITY = np.arange(256, dtype=np.uint8)
+
+
+@dataclass(frozen=True, eq=False)
+class Stage:
+    """One pass over the image: an optional colour mix followed by a table per channel (red, green, blue, alpha)."""
+
+    tables: np.ndarray  # (4, 256) uint8, applied after the mix (or to the input if there is no mix)
+    mix: np.ndarray = None  # (3, 3, 256) int32: the contribution of each input channel value to each output channel
+    scale: int = 1  # the mixed sums are divided by this
+    pairs: dict = field(default_factory=dict, repr=False)  # combined tables of channel pairs, built when first used
+
+    @property
+    def keeps_gray(self) -> bool:
+        """Whether a grayscale input stays grayscale (every colour channel gets the same value from a gray pixel)."""
+
+        tables = self.tables
+        if not (np.array_equal(tables[0], tables[1]) and np.array_equal(tables[0], tables[2])):
+            return False
+        if self.mix is None:
+            return True
+
+        sums = self.mix.sum(axis=1)
+        return np.array_equal(sums[0], sums[1]) and np.array_equal(sums[0], sums[2])
+
+    @property
+    def makes_gray(self) -> bool:
+        """Whether the output is grayscale whatever the input (the same mix and table for every colour channel)."""
+
+        mix = self.mix
+        return (mix is not None and self.keeps_gray
+                and np.array_equal(mix[0], mix[1]) and np.array_equal(mix[0], mix[2]))
+
+    def output_channels(self, channels: int) -> int:
+        """Returns the number of channels the stage produces from an image with the given number of channels."""
+
+        if channels <= 2:
+            return channels if self.keeps_gray else channels + 2
+        return channels - 2 if self.makes_gray else channels
+
+    def gray_tables(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the luminance and alpha tables equivalent to the stage for a grayscale input (see keeps_gray)."""
+
+        if self.mix is None:
+            return self.tables[0], self.tables[3]
+
+        # A gray pixel has the same value in every input channel of the mix
+        mixed = np.minimum(self.mix[0].sum(axis=0) // self.scale, 255)
+        return self.tables[0][mixed], self.tables[3]
+
+    def pair_table(self, key, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Returns the table of two adjacent channels indexed by both bytes read as a uint16 (see _apply_tables).
+
+        Args:
+            key: Identifies the pair of tables (they are only combined the first time)
+            low (np.ndarray): The table of the first channel
+            high (np.ndarray): The table of the second channel
+
+        Returns:
+            np.ndarray: The 65536-entry uint16 table
+        """
+
+        if key not in self.pairs:
+            # The first channel is the low byte of the uint16 (on little-endian machines)
+            if not np.little_endian:
+                low, high = high, low
+            table = low.astype(np.uint16)[np.newaxis, :] | (high.astype(np.uint16)[:, np.newaxis] << 8)
+            self.pairs[key] = table.reshape(-1)
+
+        return self.pairs[key]
+
+
+def apply_pointwise(img: np.ndarray, specs: tuple, out: np.ndarray = None) -> np.ndarray:
+    """Applies a sequence of pointwise operations to a uint8 image using compiled lookup tables.
+
+    Grayscale results (i.e. of grayscale or binary threshold) have a single luminance channel (plus alpha),
+    and grayscale images are only expanded to RGB by operations which add colour (see operations.colour).
+
+    Args:
+        img (np.ndarray): The uint8 image (L, LA, RGB or RGBA), or an (N, H, W, C) batch of images
+        specs (tuple): The operations to apply, as spec tuples (see module documentation)
+        out (np.ndarray, optional): The array to write the result into, which may be the image itself
+            if the operations keep its colour model. Defaults to a new array
+
+    Returns:
+        np.ndarray: The resulting image
+    """
+
+    # The operations are pointwise, so the frames of a batch are processed as the rows of one tall image
+    if img.ndim == 4:
+        out = output_buffer(img.shape[:3] + (result_channels(specs, img.shape[3]),), out)
+        rows = img.reshape((-1,) + img.shape[2:])
+        if out.flags.c_contiguous:
+            apply_pointwise(rows, specs, out.reshape((-1,) + out.shape[2:]))
+        else:
+            out[...] = apply_pointwise(rows, specs).reshape(out.shape)
+        return out
+
+    stages = compile_pointwise(tuple(specs))
+    note_engine(f"lookup tables ({len(stages)} pass{'es' if len(stages) > 1 else ''})")
+    out = output_buffer(img.shape[:2] + (result_channels(specs, img.shape[2]),), out)
+
+    for stage in stages:
+        channels = stage.output_channels(img.shape[2])
+
+        # Stages write into the output (working in place after the first), unless they change the colour model
+        target = out if channels == out.shape[2] else np.empty(img.shape[:2] + (channels,), dtype=np.uint8)
+        _apply_stage(img, stage, target)
+        img = target
+
+    return out
+
+
+def result_channels(specs: tuple, channels: int) -> int:
+    """Returns the number of channels of the result of applying pointwise operations to an image.
+
+    Args:
+        specs (tuple): The operations to apply, as spec tuples (see module documentation)
+        channels (int): The number of channels of the image
+
+    Returns:
+        int: The number of channels of the result
+    """
+
+    for stage in compile_pointwise(tuple(specs)):
+        channels = stage.output_channels(channels)
+
+    return channels
+
+
+@lru_cache(maxsize=128)
+def compile_pointwise(specs: tuple) -> tuple[Stage, ...]:
+    """Compiles a sequence of pointwise operations into lookup table stages (cached).
+
+    Args:
+        specs (tuple): The operations to compile, as spec tuples (see module documentation)
+
+    Raises:
+        ValueError: If an operation is not pointwise or its arguments are invalid
+
+    Returns:
+        tuple[Stage, ...]: The stages to apply in order
+    """
+
+    stages = []
+    tables = np.tile(_IDENTITY, (4, 1))
+    mix, scale = None, 1
+
+    def add_tables(new_tables):
+        nonlocal tables
+        tables = np.stack([new_tables[c][tables[c]] for c in range(4)])
+
+    def add_mix(weights, new_scale):
+        nonlocal tables, mix, scale
+
+        # A second mix needs the first one's (rounded) result, so it starts a new stage
+        if mix is not None:
+            stages.append(Stage(tables, mix, scale))
+            tables = np.tile(_IDENTITY, (4, 1))
+
+        # Fold the tables applied so far into the mix: output c gets weights[c][j] * table_j[value of channel j]
+        weights = np.array(weights, dtype=np.int32)
+        mix = weights[:, :, np.newaxis] * tables[np.newaxis, :3].astype(np.int32)
+        scale = new_scale
+        tables = np.stack([_IDENTITY, _IDENTITY, _IDENTITY, tables[3]])
+
+    for spec in specs:
+        match spec:
+            case ('invert',):
+                add_tables(np.stack([255 - _IDENTITY] * 3 + [_IDENTITY]))
+
+            case ('grayscale',):
+                add_mix(GRAYSCALE_WEIGHTS, GRAYSCALE_SCALE)
+
+            case ('sepia',):
+                add_mix(SEPIA_WEIGHTS, SEPIA_SCALE)
+
+            case ('threshold', cutoff, binary, invert):
+                if cutoff < 0 or cutoff > 255:
+                    raise ValueError("Threshold value must be in the range [0, 255]")
+                if binary:
+                    add_mix(GRAYSCALE_WEIGHTS, GRAYSCALE_SCALE)
+
+                cut = np.where(_IDENTITY < cutoff, 0, 255).astype(np.uint8)
+                add_tables(np.stack([cut] * 3 + [_IDENTITY]))
+
+                # Inverting the threshold inverts every channel (including alpha)
+                if invert:
+                    add_tables(np.tile(255 - _IDENTITY, (4, 1)))
+
+            case _:
+                raise ValueError(f"Not a pointwise operation: {spec}")
+
+    stages.append(Stage(tables, mix, scale))
+    return tuple(stages)
+
+
+def _apply_stage(img: np.ndarray, stage: Stage, out: np.ndarray):
+    """Applies one compiled stage to a uint8 image, writing into out (which may be the image itself)."""
+
+    channels = img.shape[2]
+
+    # Grayscale images only need the luminance table, unless the stage adds colour
+    if channels <= 2:
+        if stage.keeps_gray:
+            _apply_tables(img, stage, stage.gray_tables()[:channels], out)
+            return
+        img = to_rgb(img)
+        channels += 2
+
+    if stage.mix is None:
+        _apply_tables(img, stage, [stage.tables[c] for c in range(channels)], out)
+        return
+
+    # Output channels with the same weights (i.e. all three for grayscale) are only mixed once,
+    # and a grayscale result is only written once
+    outputs = [0] if stage.makes_gray else [0, 1, 2]
+    unique = {}
+    for c in outputs:
+        unique.setdefault(stage.mix[c].tobytes(), []).append(c)
+
+    rows = max(1, BLOCK_PIXELS // max(1, img.shape[1]))
+    for start in range(0, img.shape[0], rows):
+        block = img[start:start + rows]
+
+        # Every mix is computed before any output is written, as the output may be the input
+        values = []
+        for group in unique.values():
+            weights = stage.mix[group[0]]
+            total = weights[0][block[..., 0]]
+            total += weights[1][block[..., 1]]
+            total += weights[2][block[..., 2]]
+            total //= stage.scale
+            np.minimum(total, 255, out=total)
+            values.append(total.astype(np.uint8))
+
+        for group, value in zip(unique.values(), values):
+            for c in group:
+                np.take(stage.tables[c], value, out=out[start:start + rows, ..., c], mode='clip')
+
+    if channels == 4:
+        _take(stage.tables[3], img[..., 3], out[..., -1])
+
+
+def _apply_tables(img: np.ndarray, stage: Stage, tables: list[np.ndarray], out: np.ndarray):
+    """Maps each channel through its table, using a single indexing step when the tables allow it.
+
+    Each value is read before its output is written, so the output may be the input.
+    """
+
+    channels = img.shape[2]
+    all_same = all(np.array_equal(tables[0], table) for table in tables[1:])
+    colour_same = all(np.array_equal(tables[0], table) for table in tables[1:3])
+
+    # Contiguous images are mapped two bytes at a time through 65536-entry tables (half as many lookups)
+    contiguous = img.flags.c_contiguous and out.flags.c_contiguous and img.size % 2 == 0
+    if contiguous and (all_same or channels % 2 == 0):
+        values = img.reshape(-1).view(np.uint16)
+        results = out.reshape(-1).view(np.uint16)
+        if all_same:
+            _take(stage.pair_table((channels, 'all'), tables[0], tables[0]), values, results)
+        else:
+            values, results = values.reshape(-1, channels // 2), results.reshape(-1, channels // 2)
+            for pair in range(channels // 2):
+                table = stage.pair_table((channels, pair), tables[2 * pair], tables[2 * pair + 1])
+                _take(table, values[:, pair], results[:, pair])
+    elif all_same:
+        _take(tables[0], img, out)
+    elif colour_same and channels == 4:
+        _take(tables[0], img[..., :3], out[..., :3])
+        _take(tables[3], img[..., 3], out[..., 3])
+    else:
+        for c in range(channels):
+            _take(tables[c], img[..., c], out[..., c])
+
+
+def _take(table: np.ndarray, values: np.ndarray, out: np.ndarray):
+    """Looks up values in a table, writing into out, a block of rows at a time.
+
+    numpy converts the indices of a lookup to a temporary intp array, so looking up small blocks keeps that
+    temporary small (and in cache). 'clip' mode avoids another temporary copy numpy makes to guard against
+    out-of-range indices, and never clips as the values of uint8 (or paired uint16) images are always valid indices.
+    """
+
+    rows = max(1, BLOCK_PIXELS // max(1, math.prod(values.shape[1:])))
+    for start in range(0, values.shape[0], rows):
+        np.take(table, values[start:start + rows], out=out[start:start + rows], mode='clip')
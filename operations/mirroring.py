@@ -0,0 +1,27 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import store
+
+
+def mirror(img: np.ndarray, vertical: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Mirrors the image across the vertical or horizontal axis
+
+    Args:
+        img (np.ndarray): The image to mirror
+        horizontal (bool, optional): Whether to mirror the image across the horizontal axis. Defaults to False
+        out (np.ndarray, optional): An array to copy the result into. Defaults to None (a view of the image
+            is returned without copying any pixels)
+
+    Returns:
+        np.ndarray: The mirrored image
+    """
+
+    # Flip the rows or columns (the axes before the channels, so batches of images are mirrored frame by frame)
+    if vertical:
+        return store(np.flip(img, axis=-3), out)
+    else:
+        return store(np.flip(img, axis=-2), out)
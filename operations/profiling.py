@@ -0,0 +1,190 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Optional instrumentation of operations: wall time, CPU time, memory, shapes and the engine used.
+
+Code which performs an operation wraps it in profiled(), and engines describe themselves with note_engine().
+Both return immediately unless a hook is registered, so instrumentation costs a single check when disabled.
+
+A hook is any function taking a Record, called as each operation finishes (after the operations nested
+inside it). Profiler is a hook which collects the records and formats them as a summary table or as a
+Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev):
+
+    with Profiler() as profiler:
+        chain(img, ['grayscale', 'blur', 'edge'])
+    print(profiler.summary())
+    profiler.write_trace('trace.json')
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# The registered hooks (called with each Record)
+_hooks = []
+
+# The operations in progress on each thread, innermost last
+_local = threading.local()
+
+
+@dataclass
+class Record:
+    """The measurements of one operation."""
+
+    name: str
+    start: float  # time.perf_counter() when the operation started, in seconds
+    wall: float = 0.0  # elapsed time in seconds
+    cpu: float = 0.0  # CPU time of the calling thread in seconds (excluding other threads, i.e. strip workers)
+    allocated: int = 0  # peak memory allocated above the level at the start, in bytes (traced process-wide)
+    input: str = ''  # shape and type of the input image, i.e. '1080x1920x4 uint8'
+    output: str = ''  # shape and type of the result
+    engines: list[str] = field(default_factory=list)  # the engines which performed the work (see note_engine)
+    depth: int = 0  # number of enclosing operations
+    thread: int = 0  # the thread the operation ran on
+    base: int = field(default=0, repr=False)  # memory traced when the operation started, in bytes
+
+
+def add_hook(hook):
+    """Registers a function to be called with the Record of every operation (and starts tracing memory)."""
+
+    if not _hooks and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregisters a hook (and stops tracing memory once no hooks are left)."""
+
+    _hooks.remove(hook)
+    if not _hooks and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def profiled(name: str, func, img: 'np.ndarray' = None):
+    """Calls func() and, if any hooks are registered, measures it as the operation name.
+
+    Args:
+        name (str): The name of the operation
+        func: The function performing the operation, called without arguments
+        img (np.ndarray, optional): The input image (for its shape). Defaults to None
+
+    Returns:
+        The result of func()
+    """
+
+    if not _hooks:
+        return func()
+
+    stack = _stack()
+    record = Record(name, time.perf_counter(), input=_describe(img), depth=len(stack),
+                    thread=threading.get_ident())
+
+    # Memory is measured from the peak since the start of the operation (the enclosing operation keeps its
+    # peak so far, as the peak is reset)
+    record.base, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1].allocated = max(stack[-1].allocated, peak - stack[-1].base)
+    tracemalloc.reset_peak()
+    stack.append(record)
+    cpu = time.thread_time()
+    try:
+        result = func()
+    finally:
+        record.cpu = time.thread_time() - cpu
+        record.wall = time.perf_counter() - record.start
+        record.allocated = max(record.allocated, tracemalloc.get_traced_memory()[1] - record.base)
+        stack.pop()
+
+        # The peak was reset by this operation, so the enclosing one takes it over
+        if stack:
+            stack[-1].allocated = max(stack[-1].allocated, record.base + record.allocated - stack[-1].base)
+
+    record.output = _describe(result)
+    for hook in list(_hooks):
+        hook(record)
+
+    return result
+
+
+def note_engine(engine: str):
+    """Records the engine performing the current operation (i.e. 'separable float32'), if it is being profiled."""
+
+    if _hooks and (stack := _stack()) and engine not in stack[-1].engines:
+        stack[-1].engines.append(engine)
+
+
+class Profiler:
+    """A hook collecting the records of the operations performed while it is registered (use it with 'with')."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Record):
+        with self._lock:
+            self.records.append(record)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self)
+
+    def summary(self) -> str:
+        """Formats the records as a table in the order the operations started (nested ones indented)."""
+
+        lines = [f"{'operation':<36} {'wall (ms)':>10} {'cpu (ms)':>9} {'alloc (MB)':>11} "
+                 f"{'input':<22} {'output':<22} engine"]
+        for record in sorted(self.records, key=lambda record: record.start):
+            name = '  ' * record.depth + record.name
+            lines.append(f"{name:<36} {record.wall * 1000:>10.1f} {record.cpu * 1000:>9.1f} "
+                         f"{record.allocated / 1024 ** 2:>11.1f} {record.input:<22} {record.output:<22} "
+                         f"{', '.join(record.engines)}")
+
+        return '\n'.join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Returns the records as Chrome trace events (complete events, times in microseconds)."""
+
+        pid = os.getpid()
+        events = [{
+            'name': record.name, 'cat': 'operation', 'ph': 'X', 'pid': pid, 'tid': record.thread,
+            'ts': record.start * 1e6, 'dur': record.wall * 1e6,
+            'args': {'cpu_ms': record.cpu * 1000, 'allocated_bytes': record.allocated, 'input': record.input,
+                     'output': record.output, 'engine': ', '.join(record.engines)},
+        } for record in self.records]
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path):
+        """Writes the Chrome trace to a JSON file."""
+
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+def _stack() -> list[Record]:
+    """Returns the operations in progress on the current thread."""
+
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _describe(value) -> str:
+    """Describes the shape and type of an image (or of the first image of a tuple)."""
+
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if not hasattr(value, 'shape') or not hasattr(value, 'dtype'):  # numpy is not imported here to keep startup fast
+        return ''
+    return f"{'x'.join(map(str, value.shape))} {value.dtype}"
@@ -0,0 +1,305 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""The operations which can be performed by name (by the command line, the server and chain), and their metadata.
+
+Each operation declares what a scheduler needs to know about it without running it:
+
+- its kind: pointwise (each output pixel depends only on the same input pixel), geometric (it only moves pixels),
+  filter (each output pixel depends on the input pixels within a radius) or global (it depends on the whole image,
+  i.e. edge normalizes by the largest gradient)
+- the radius of a filter, whether the alpha channel passes through unchanged, and an estimated cost per pixel
+- what chain needs to fuse it with its neighbours: a lookup table spec or a kernel (for the default arguments)
+
+Tiling reads the kind and radius to split an operation into strips, chain reads the kind, lookup table and kernel
+to fuse operations, and the result cache reads the cost to skip operations cheaper than storing their result.
+Values which depend on the arguments are given as functions of the parsed arguments (None for the defaults).
+
+Other modules can register operations too, which the command line (see --plugin), the server and chain then accept:
+
+    @register('emboss', FILTER, radius=1, cost=40, help="Emboss the image")
+    def emboss(img, args):
+        return convolve(img, EMBOSS_KERNEL)
+
+The module of each built-in operation (and scipy) is only imported when the operation is first performed.
+"""
+
+from argparse import ArgumentParser, Namespace
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable
+
+import operations as op
+
+from .profiling import profiled
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Kinds of operations
+POINTWISE = 'pointwise'
+GEOMETRIC = 'geometric'
+FILTER = 'filter'
+GLOBAL = 'global'
+KINDS = (POINTWISE, GEOMETRIC, FILTER, GLOBAL)
+
+# The registered operations by name, in the order they were registered
+_operations = {}
+
+
+@dataclass(frozen=True)
+class Operation:
+    """An operation which can be performed by name, and its metadata (see the module description).
+
+    Fields marked 'or a function of the arguments' may be a value or a function of the parsed arguments, which is
+    called with None for the default arguments (i.e. in a chain). Use the *_for methods to read them.
+    """
+
+    name: str
+    perform: Callable  # function of the image and the parsed arguments (None for the defaults), returning the result
+    kind: str  # POINTWISE, GEOMETRIC, FILTER or GLOBAL
+    radius: Any = 0  # filters: rows and columns of neighbours each output pixel depends on, or a function of the args
+    keeps_alpha: Any = True  # whether the alpha channel is unchanged (or moved with its pixels), or a function
+    cost: Any = 1.0  # estimated nanoseconds per pixel (4096² RGBA with the default arguments), or a function
+    chainable: bool = True  # whether it can be performed with the default arguments (in a chain)
+    lookup: tuple = None  # pointwise operations: the lookup table spec of the default arguments (see operations.lut)
+    kernel: Callable = None  # linear filters: a function returning the kernel of the default arguments
+    command: bool = True  # whether the command line has a sub-command for it
+    help: str = None  # the description of its sub-command
+    add_arguments: Callable = None  # a function adding the arguments of its sub-command to an ArgumentParser
+
+    def radius_for(self, args: Namespace = None) -> int:
+        """Returns the radius of the neighbourhood each output pixel depends on."""
+        return _value(self.radius, args)
+
+    def keeps_alpha_for(self, args: Namespace = None) -> bool:
+        """Returns whether the alpha channel passes through the operation unchanged."""
+        return _value(self.keeps_alpha, args)
+
+    def cost_for(self, args: Namespace = None) -> float:
+        """Returns the estimated cost of the operation in nanoseconds per pixel."""
+        return _value(self.cost, args)
+
+
+def register(name: str, kind: str, *, replace: bool = False, **metadata):
+    """Returns a decorator which registers a function as an operation (see Operation for the metadata).
+
+    Args:
+        name (str): The name of the operation
+        kind (str): POINTWISE, GEOMETRIC, FILTER or GLOBAL
+        replace (bool, optional): Whether to replace an operation registered with the same name. Defaults to False
+        **metadata: The other fields of the Operation
+
+    Raises:
+        ValueError: If the kind is unknown or the name is already registered (without replace)
+    """
+
+    if kind not in KINDS:
+        raise ValueError(f"Unrecognized operation kind: {kind} (expected one of {', '.join(KINDS)})")
+    if name in _operations and not replace:
+        raise ValueError(f"Operation {name} is already registered")
+
+    def decorator(perform: Callable) -> Callable:
+        _operations[name] = Operation(name, perform, kind, **metadata)
+        return perform
+
+    return decorator
+
+
+def unregister(name: str):
+    """Removes a registered operation."""
+    del _operations[name]
+
+
+def get_operation(name: str) -> Operation:
+    """Returns a registered operation.
+
+    Raises:
+        ValueError: If no operation is registered with the name
+    """
+
+    if name not in _operations:
+        raise ValueError(f"Unrecognized operation: {name}")
+    return _operations[name]
+
+
+def operations() -> list[Operation]:
+    """Returns the registered operations, in the order they were registered."""
+    return list(_operations.values())
+
+
+def chain_operations() -> list[str]:
+    """Returns the names of the operations which can be used in a chain."""
+    return [operation.name for operation in _operations.values() if operation.chainable]
+
+
+def perform_operation(img: 'np.ndarray', op_name: str, args: Namespace = None, verbose: bool = True) -> 'np.ndarray':
+    """Performs the requested operation on the image array.
+
+    Args:
+        op_name (str): The name of the operation to perform
+        img (np.ndarray): The image array to perform the operation on
+        args: The arguments to pass to the operation. Defaults to the default arguments
+        verbose (bool, optional): Whether to print the operation performed. Defaults to True
+
+    Raises:
+        ValueError: If the operation is not registered
+
+    Returns:
+        np.ndarray: The image array after the operation has been performed
+    """
+
+    operation = get_operation(op_name)
+    if verbose:
+        print(f"Performing operation: {op_name}")
+    return profiled(op_name, lambda: operation.perform(img, args), img)
+
+
+def add_operation_arguments(subparsers):
+    """Adds a sub-command for each registered operation which does not have one yet (i.e. third-party ones)."""
+
+    for operation in _operations.values():
+        if operation.command and operation.name not in subparsers.choices:
+            parser: ArgumentParser = subparsers.add_parser(operation.name, help=operation.help)
+            if operation.add_arguments is not None:
+                operation.add_arguments(parser)
+
+
+def _value(value, args: Namespace = None):
+    """Returns a metadata value, calling it with the arguments if it is a function of them."""
+    return value(args) if callable(value) else value
+
+
+def _precision(args: Namespace = None) -> str:
+    """Returns the precision of the filters (a global option, so jobs parsed on their own may not have it)."""
+    return getattr(args, 'precision', 'float64')
+
+
+# Built-in operations
+# The costs were measured with benchmarks/bench_operations.py (4096² RGBA, float64)
+
+@register('boxblur', FILTER, radius=lambda args: args.radius * args.passes if args else 1, cost=130)
+def _box_blur(img, args):
+    if args is None:
+        return op.box_blur(img)
+    return op.box_blur(img, args.radius, args.passes, args.collapse, _precision(args))
+
+
+@register('blur', FILTER, radius=1, cost=60, kernel=lambda: _kernels().box_kernel(), command=False)
+def _blur(img, args):
+    # The chain-only blur is a convolution with the 3x3 box kernel
+    return op.convolve(img, _kernels().box_kernel(), precision=_precision(args))
+
+
+@register('chain', GLOBAL, chainable=False, keeps_alpha=False,
+          cost=lambda args: sum(get_operation(name).cost_for() for name in args.operations) if args else 0)
+def _chain(img, args):
+    if args is None:
+        raise ValueError("Chain operation requires arguments")
+    verbose = getattr(args, 'verbose', True)  # i.e. not for each frame of a stream
+    if getattr(args, 'then', None):
+        return op.chain_many(img, [args.operations + tail for tail in args.then], args.explain, verbose=verbose)
+    return op.chain(img, args.operations, args.explain, cache=getattr(args, 'cache', None), verbose=verbose)
+
+
+@register('composite', GLOBAL, chainable=False, keeps_alpha=False)
+def _composite(img, args):
+    if args is None:
+        raise ValueError("Composite operation requires arguments")
+    raise NotImplementedError("TODO")  # TODO
+
+
+@register('crop', GEOMETRIC, chainable=False, cost=0)
+def _crop(img, args):
+    if args is None:
+        raise ValueError("Crop operation requires arguments")
+    return op.crop(img, args.x1, args.y1, args.x2, args.y2)
+
+
+# The radius covers two 3x3 blur passes and the 3x3 gradient operator (the normalization makes edge global)
+@register('edge', GLOBAL, radius=3, cost=140)
+def _edge(img, args):
+    if args is None:
+        return op.edge(img)
+    return op.edge(img, args.threshold, args.collapse, args.operator, args.direction)
+
+
+@register('gaussblur', FILTER, radius=lambda args: sum(_kernels().box_radii(args.sigma if args else 2)), cost=330)
+def _gaussian_blur(img, args):
+    if args is None:
+        return op.gaussian_blur(img)
+    return op.gaussian_blur(img, args.sigma, _precision(args))
+
+
+@register('grayscale', POINTWISE, lookup=('grayscale',), cost=18)
+def _grayscale(img, args):
+    return op.grayscale(img)
+
+
+@register('invert', POINTWISE, lookup=('invert',), cost=8)
+def _invert(img, args):
+    return op.invert(img)
+
+
+@register('convolve', FILTER, radius=lambda args: args.kernel.shape[0] // 2 * args.iterations if args else 1,
+          cost=120)
+def _convolve(img, args):
+    if args is None:
+        from utils import get_kernel_from_terminal  # only needed without arguments
+        return op.convolve(img, get_kernel_from_terminal(3))
+
+    kernel = getattr(args, 'kernel', None)  # read ahead of time by main
+    if kernel is None:
+        from utils import get_kernel_from_terminal
+        kernel = get_kernel_from_terminal(args.kernel_size)
+    return op.convolve(img, kernel, args.iterations, args.method, args.collapse, _precision(args))
+
+
+@register('mirrorH', GEOMETRIC, cost=0)
+def _mirror_horizontal(img, args):
+    return op.mirror(img)
+
+
+@register('mirrorV', GEOMETRIC, cost=0)
+def _mirror_vertical(img, args):
+    return op.mirror(img, vertical=True)
+
+
+@register('rotateCW', GEOMETRIC, cost=0)
+def _rotate_clockwise(img, args):
+    return op.rotate(img) if args is None else op.rotate(img, args.turns)
+
+
+@register('rotateCCW', GEOMETRIC, cost=0)
+def _rotate_counter_clockwise(img, args):
+    return op.rotate(img, ccw=True) if args is None else op.rotate(img, args.turns, ccw=True)
+
+
+@register('sepia', POINTWISE, lookup=('sepia',), cost=53)
+def _sepia(img, args):
+    return op.sepia(img)
+
+
+@register('sharpen', FILTER, radius=1, cost=67, kernel=lambda: _kernels().sharpen_kernel())
+def _sharpen(img, args):
+    if args is None:
+        return op.sharpen(img)
+    return op.sharpen(img, args.amount, _precision(args))
+
+
+# Inverting the threshold inverts the alpha channel too
+@register('threshold', POINTWISE, lookup=('threshold', 128, False, False), cost=9,
+          keeps_alpha=lambda args: not (args and args.invert))
+def _threshold(img, args):
+    if args is None:
+        return op.threshold(img)
+    return op.threshold(img, args.threshold, args.binary, args.invert)
+
+
+def _kernels() -> Namespace:
+    """Imports the kernel builders of the built-in filters (only once a filter is used)."""
+
+    from .box_blurring import box_kernel
+    from .gaussian_blurring import box_radii
+    from .sharpening import sharpen_kernel
+    return Namespace(box_kernel=box_kernel, box_radii=box_radii, sharpen_kernel=sharpen_kernel)
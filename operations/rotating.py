@@ -4,14 +4,18 @@
 
 import numpy as np
 
+from .buffers import store
 
-def rotate(img: np.ndarray, turns: int = 1, ccw: bool = False) -> np.ndarray:
+
+def rotate(img: np.ndarray, turns: int = 1, ccw: bool = False, out: np.ndarray = None) -> np.ndarray:
     """Rotates the image in 90 degree increments.
 
     Args:
         img (np.ndarray): The image to rotate
         CCW (bool, optional): Whether to rotate the image counterclockwise. Defaults to False
         turns (int, optional): The number of 90 degree turns to rotate the image. Defaults to 1
+        out (np.ndarray, optional): An array to copy the result into. Defaults to None (a view of the image
+            is returned without copying any pixels)
 
     Returns:
         np.ndarray: The rotated image
@@ -21,4 +25,5 @@ def rotate(img: np.ndarray, turns: int = 1, ccw: bool = False) -> np.ndarray:
     if not ccw:
         turns = -turns
 
-    return np.rot90(img, turns)
+    # Rotate the plane of the rows and columns (so batches of images are rotated frame by frame)
+    return store(np.rot90(img, turns, axes=(-3, -2)), out)
@@ -0,0 +1,40 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import store
+from .colour import has_alpha, to_rgb
+from .lut import SEPIA_SCALE, SEPIA_WEIGHTS, apply_pointwise
+
+
+def sepia(img: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Applies a sepia tone to the image.
+
+    Args:
+        img (np.ndarray): The image to tone
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Returns:
+        np.ndarray: The sepia toned image (RGB or RGBA, also for grayscale images)
+    """
+
+    # Use lookup tables for uint8 images
+    if img.dtype == np.uint8:
+        return apply_pointwise(img, (('sepia',),), out)
+
+    # Mix the colour channels with the sepia weights (grayscale images gain colour channels)
+    img = to_rgb(img)
+    toned = np.dot(img[..., :3], np.array(SEPIA_WEIGHTS).T / SEPIA_SCALE)
+
+    # Add the alpha channel back in if necessary
+    if has_alpha(img):
+        toned = np.concatenate((toned, img[..., 3:]), axis=-1)
+
+    # Clip values to the range [0, 255]
+    np.clip(toned, 0, 255, out=toned)
+
+    # Convert back to uint8
+    return store(toned.astype(np.uint8), out)
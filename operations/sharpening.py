@@ -0,0 +1,45 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .convolving import convolve
+
+
+def sharpen(img: np.ndarray, amount: float = 3, precision: str = 'float64', out: np.ndarray = None) -> np.ndarray:
+    """Sharpen an image using unsharp masking.
+
+    Args:
+        img (np.ndarray): The image to sharpen
+        amount (float): The strength of the sharpening effect
+        precision (str, optional): The arithmetic to use (see convolve). Defaults to 'float64'
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Returns:
+        np.ndarray: The sharpened image
+    """
+
+    # Apply the unsharp masking kernel to the image
+    return convolve(img, sharpen_kernel(amount), precision=precision, out=out)
+
+
+def sharpen_kernel(amount: float = 3) -> np.ndarray:
+    """Builds the 3x3 unsharp masking kernel used by sharpen.
+
+    Args:
+        amount (float): The strength of the sharpening effect
+
+    Returns:
+        np.ndarray: The sharpening kernel
+    """
+
+    # Create the "original" kernel which does not change the image
+    original = np.array([[0, 0, 0], [0, 1, 0], [0, 0, 0]])
+
+    # Create the "blurred" kernel using 5 pixels for sampling
+    blurred = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]) / 5
+
+    # Create the unsharp masking kernel using a typical formula
+    return original + (original - blurred) * amount
@@ -0,0 +1,56 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import numpy as np
+
+from .buffers import store
+from .colour import colour_channels, has_alpha
+from .grayscaling import grayscale
+from .lut import apply_pointwise
+
+
+def threshold(img: np.ndarray, cutoff: int = 128, binary: bool = False, invert: bool = False,
+              out: np.ndarray = None) -> np.ndarray:
+    """Applies a threshold to an image.
+
+    Args:
+        img (np.ndarray): The image to apply the threshold to
+        cutoff (int, optional): The threshold value. Defaults to 128
+        binary (bool, optional): Whether to perform binary segmentation. Defaults to False
+        invert (bool, optional): Whether to invert the threshold. Defaults to False
+        out (np.ndarray, optional): The uint8 array to write the result into, which may be the image itself
+            (in place). Defaults to a new array
+
+    Returns:
+        np.ndarray: The thresholded image
+    """
+
+    # Ensure the threshold value is in the range [0, 255]
+    if cutoff < 0 or cutoff > 255:
+        raise ValueError("Threshold value must be in the range [0, 255]")
+
+    # Use lookup tables for uint8 images
+    if img.dtype == np.uint8:
+        return apply_pointwise(img, (('threshold', cutoff, binary, invert),), out)
+
+    # Convert to grayscale if performing binary segmentation
+    if binary:
+        img = grayscale(img)
+
+    # Extract the colour channels (one for grayscale images) and the alpha channel if necessary
+    colours = img[..., :colour_channels(img)]
+    alpha = img[..., -1:] if has_alpha(img) else None
+
+    # Apply the threshold (choosing between uint8 values, so no wider intermediate arrays are made)
+    img = np.where(colours < cutoff, np.uint8(0), np.uint8(255))
+
+    # Add the alpha channel back in if necessary
+    if alpha is not None:
+        img = np.concatenate((img, alpha), axis=-1)
+
+    # Invert the threshold if specified
+    if invert:
+        img = 255 - img
+
+    return store(img.astype(np.uint8), out)
@@ -2,20 +2,25 @@
 #  Licensed Under the GNU GPL v3.0 License
 #  See LICENSE for more information
 
+import importlib
+import sys
 from argparse import ArgumentParser, Namespace
 
-from utils import non_negative_int, positive_float, positive_int, valid_alpha
+from operations.registry import add_operation_arguments, chain_operations
+from utils import memory_size, non_negative_int, positive_float, positive_int, valid_alpha
 
 
 def parse_args() -> Namespace:
     """Parse command-line arguments, handling multiple sub-commands with options.
 
-    boxblur       [-r, --radius <blur-radius>] [-p, --passes <blur-passes>]
-    chain         <operation> [<operation> ...]
+    boxblur       [-r, --radius <blur-radius>] [-p, --passes <blur-passes>] [-c, --collapse]
+    chain         <operation> [<operation> ...] [-e, --explain] [-t, --then <operation> [<operation> ...]]
     composite     <input-file-2> [-a, --alpha <alpha-value>] [-o, --offset <x-offset> <y-offset>]
-    convolve        <kernel-size> [-i, --iterations <iterations>]
+    convolve        <kernel-size> [-i, --iterations <iterations>] [-m, --method <engine>] [-c, --collapse]
     crop          <x1> <y1> <x2> <y2>
-    edge          [-t, --threshold <threshold-value>]
+    edge          [-t, --threshold <threshold-value>] [-c, --collapse] [-o, --operator <sobel|scharr|prewitt>]
+                  [-d, --direction]
+    gaussblur     [-s, --sigma <standard-deviation>]
     grayscale
     invert
     mirrorH
@@ -23,16 +28,120 @@ def parse_args() -> Namespace:
     rotateCW      [-t, --turns <turns>]
     rotateCCW     [-t, --turns <turns>]
     sepia
-    sharpen       [-s, --strength <sharpness-strength>]
+    sharpen       [-a, --amount <multiplier>]
     threshold     [-t, --threshold <threshold-value>] [-b, --binary] [-i, --invert]
+
+    Operations registered by the modules given with --plugin are added as sub-commands too.
     """
 
+    # Import the plugins first, so that the operations they register have sub-commands
+    plugins = ArgumentParser(add_help=False)
+    plugins.add_argument('--plugin', action='append', default=[])
+    for module in plugins.parse_known_args()[0].plugin:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"[ERROR] Unable to import plugin {module}: {e}")
+            sys.exit(2)
+
     parser = ArgumentParser(description="A python program for image processing.")
 
     # Common required arguments
-    parser.add_argument('in_file', metavar='<image-path>', help="Input image file path")
+    parser.add_argument('in_file', metavar='<image-path>',
+                        help="Input image file path (with --batch: a directory, a glob pattern or - for stdin)")
     parser.add_argument('out_file', metavar='<output-file>',
-                        help="Output image name with file extension (saved in same directory as input file)")
+                        help="Output image name with file extension (saved in same directory as input file, "
+                             "with --batch: a name template such as {stem}-blurred.png)")
+
+    # Common optional arguments
+    parser.add_argument('--max-memory', metavar='<size>', type=memory_size, default=None,
+                        help="Process the image in strips using at most this much working memory (i.e. 512M, 2G)")
+    parser.add_argument('--workers', metavar='<count>', type=positive_int, default=1,
+                        help="Number of threads to process strips of the image with, "
+                             "or images (frames) at once with --batch (--frames) (default: 1)")
+    parser.add_argument('--batch', action='store_true', default=False,
+                        help="Apply the operation to every image matching <image-path> and print a throughput summary")
+    parser.add_argument('--frames', action='store_true', default=False,
+                        help="Apply the operation to every frame of an animation (GIF, PNG, WebP), a multi-page TIFF "
+                             "or an image sequence (a directory, glob pattern or - for stdin) and write an animated "
+                             "or multi-page output (or one file per frame if <output-file> contains {index})")
+    parser.add_argument('--prefetch', metavar='<count>', type=positive_int, default=None,
+                        help="Number of frames held at once with --frames, read ahead of the one being written "
+                             "(default: twice --workers)")
+    parser.add_argument('--precision', metavar='<type>', choices=['float64', 'float32', 'int16-fixed'],
+                        default='float64',
+                        help="Arithmetic used by blurs, sharpen and convolve: float64 (reference), "
+                             "float32 (within 1 LSB) or int16-fixed (exact for integer-weight kernels) "
+                             "(default: float64)")
+    parser.add_argument('--max-size', metavar='<pixels>', type=positive_int, default=None,
+                        help="Scale input images down while decoding so that neither side is longer than this")
+    parser.add_argument('--raw-shape', metavar=('<width>', '<height>', '<channels>'), nargs=3, type=positive_int,
+                        default=None, help="Size of a .raw input image (uint8 samples without a header)")
+    parser.add_argument('--planar', action='store_true', default=False,
+                        help="Raw images store each channel as a separate plane instead of interleaved")
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help="Print the time, memory, shapes and engine of each operation (and chain step)")
+    parser.add_argument('--trace', metavar='<trace-file>', default=None,
+                        help="Profile the operations and write a Chrome trace (JSON) to this file")
+    parser.add_argument('--cache-dir', metavar='<directory>', default=None,
+                        help="Store results in this directory and reuse them when the same operation is performed "
+                             "on the same image again")
+    parser.add_argument('--cache-size', metavar='<size>', type=memory_size, default=memory_size('1G'),
+                        help="Size of the cache above which the least recently used results are deleted "
+                             "(default: 1G)")
+
+    # Output encoder options (each only applies to the formats which use it)
+    parser.add_argument('--compress-level', metavar='<level>', type=int, choices=range(10), default=None,
+                        help="PNG zlib compression level [0-9] (lower is faster, default: 6)")
+    parser.add_argument('--optimize', action='store_true', default=False,
+                        help="Spend extra time making PNG and JPEG output smaller")
+    parser.add_argument('--quality', metavar='<quality>', type=int, choices=range(1, 101), default=None,
+                        help="JPEG, WebP and JPEG-compressed TIFF quality [1-100] (default: 75)")
+    parser.add_argument('--subsampling', metavar='<ratio>', choices=['4:4:4', '4:2:2', '4:2:0'], default=None,
+                        help="JPEG chroma subsampling: 4:4:4, 4:2:2 or 4:2:0 (default: 4:2:0)")
+    parser.add_argument('--tiff-compression', metavar='<scheme>',
+                        choices=['none', 'lzw', 'deflate', 'packbits', 'jpeg'], default=None,
+                        help="TIFF compression: none, lzw, deflate, packbits or jpeg (default: none)")
+    parser.add_argument('--tiff-strip-rows', metavar='<rows>', type=positive_int, default=None,
+                        help="Rows in each strip of TIFF output (smaller strips make crops of the output faster)")
+    parser.add_argument('--encode-workers', metavar='<count>', type=positive_int, default=None,
+                        help="Number of threads encoding output images with --batch (default: same as --workers)")
+    parser.add_argument('--plugin', metavar='<module>', action='append', default=[],
+                        help="Import a module which registers more operations (see operations.registry), "
+                             "repeatable")
+
+    add_operation_parsers(parser)
+
+    return parser.parse_args()
+
+
+def parse_operation(tokens: list[str]) -> Namespace:
+    """Parse an operation and its options given as command-line style tokens (i.e. ['boxblur', '-r', '3']).
+
+    The operations and options are the same as for the command line (see parse_args).
+
+    Raises:
+        ValueError: If the tokens are not a valid operation
+    """
+
+    parser = OperationParser(prog='operation', add_help=False)
+    add_operation_parsers(parser)
+
+    try:
+        return parser.parse_args(tokens)
+    except SystemExit:  # i.e. a help flag
+        raise ValueError(f"Invalid operation: {' '.join(tokens)}")
+
+
+class OperationParser(ArgumentParser):
+    """An argument parser which raises errors instead of printing them and exiting (used for sub-commands too)."""
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+def add_operation_parsers(parser: ArgumentParser):
+    """Add a sub-command parser for each operation to the parser."""
 
     # Setting dest="operation" means that the Namespace returned from
     # parse_args() will contain an attribute called "operation" which
@@ -42,17 +151,25 @@ def parse_args() -> Namespace:
     # Sub-command parsers
     # Boxblur
     parser_op_boxblur = subparsers.add_parser('boxblur', help="Blur the image with a box blur")
-    parser_op_boxblur.add_argument('-r', '--radius', metavar='<blur-radius>', type=int, choices=range(1, 6),
-                                   default=1, help="Radius of pixel sampling (default: 1, max: 5)")
+    parser_op_boxblur.add_argument('-r', '--radius', metavar='<blur-radius>', type=positive_int,
+                                   default=1, help="Radius of pixel sampling (default: 1)")
     parser_op_boxblur.add_argument('-p', '--passes', metavar='<blur-passes>',
                                    type=positive_int, default=1, help="Number of times to apply blur (default: 1)")
+    parser_op_boxblur.add_argument('-c', '--collapse', action='store_true', default=False,
+                                   help="Apply all passes at once with a composed kernel (may differ near borders)")
 
     # Chain (crop, composite, and chain can't be used in chain mode)
-    # Valid operations: grayscale, threshold, sepia, blur, sharpen, edge, invert, mirrorV, mirrorH, rotateCW, rotateCCW, convolve
+    # Valid operations: those registered as chainable (see operations.registry)
     parser_op_chain = subparsers.add_parser('chain', help="Apply multiple operations (without arguments) to the image")
     parser_op_chain.add_argument('operations', metavar='<operation>', nargs='+', help="Operations to apply in sequence",
-                                 choices=['grayscale', 'threshold', 'sepia', 'blur', 'sharpen', 'edge',
-                                          'invert', 'mirrorV', 'mirrorH', 'rotateCW', 'rotateCCW', 'convolve'])
+                                 choices=chain_operations())
+    parser_op_chain.add_argument('-e', '--explain', action='store_true', default=False,
+                                 help="Print the optimized plan before applying it")
+    parser_op_chain.add_argument('-t', '--then', metavar='<operation>', nargs='+', action='append', default=None,
+                                 choices=chain_operations(),
+                                 help="Operations to apply after the chain's operations for an extra output "
+                                      "(repeatable; the shared operations are only applied once, and the outputs "
+                                      "are numbered <output-file>-1, -2, ...)")
 
     # Composite
     parser_op_merge = subparsers.add_parser('composite', help="Composite an image over another (premultiplied alpha)")
@@ -70,6 +187,12 @@ def parse_args() -> Namespace:
                                     help="Side length of square kernel to use in convolution (default: 3)")
     parser_op_convolve.add_argument('-i', '--iterations', metavar='<iterations>', type=positive_int, default=1,
                                     help="Number of convolution passes (default: 1)")
+    parser_op_convolve.add_argument('-m', '--method', metavar='<engine>',
+                                    choices=['auto', 'reference', 'direct', 'separable', 'fft'], default='auto',
+                                    help="Convolution engine: auto, reference, direct, separable or fft "
+                                         "(default: auto, the reference output; the others are faster, within 1)")
+    parser_op_convolve.add_argument('-c', '--collapse', action='store_true', default=False,
+                                    help="Apply all passes at once with a composed kernel (may differ near borders)")
 
     # Crop
     parser_op_crop = subparsers.add_parser('crop', help="Crop the image to within the given coordinates")
@@ -84,6 +207,19 @@ def parse_args() -> Namespace:
     parser_op_edge = subparsers.add_parser('edge', help="Apply edge detection to the image")
     parser_op_edge.add_argument('-t', '--threshold', metavar='<threshold-value>', type=int, choices=range(256),
                                 default=150, help="Threshold value [0-255] (lower = more 'edges', default: 150)")
+    parser_op_edge.add_argument('-c', '--collapse', action='store_true', default=False,
+                                help="Apply both blur passes at once with a composed kernel (may differ near borders)")
+    parser_op_edge.add_argument('-o', '--operator', choices=['sobel', 'scharr', 'prewitt'], default='sobel',
+                                help="Gradient operator (scharr is more accurate for diagonal edges, "
+                                     "default: sobel)")
+    parser_op_edge.add_argument('-d', '--direction', action='store_true', default=False,
+                                help="Shade edges by the direction of their gradient (1-255 for -180 to 180 degrees) "
+                                     "instead of white")
+
+    # Gaussian blur
+    parser_op_gaussblur = subparsers.add_parser('gaussblur', help="Blur the image with an approximate Gaussian blur")
+    parser_op_gaussblur.add_argument('-s', '--sigma', metavar='<standard-deviation>', type=positive_float, default=2,
+                                     help="Standard deviation of the blur in pixels (default: 2)")
 
     # Grayscale
     parser_op_grayscale = subparsers.add_parser('grayscale', help="Grayscale the image")
@@ -120,4 +256,5 @@ def parse_args() -> Namespace:
     parser_op_threshold.add_argument('-i', '--invert', action='store_true', default=False,
                                      help="Invert the threshold operation (above cutoff -> black)")
 
-    return parser.parse_args()
+    # Operations registered by other modules (see operations.registry)
+    add_operation_arguments(subparsers)
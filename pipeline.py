@@ -0,0 +1,281 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Runs the command line's operation: decoding the input image(s), performing the operation (in strips, or from the
+result cache, where possible) and encoding the output. main.py imports this module once the arguments are parsed.
+"""
+
+import atexit
+import sys
+import time
+from argparse import Namespace
+from pathlib import Path
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from batch import collect_inputs, output_path, run_batch
+from cache import ResultCache, operation_spec, worth_caching
+from image_io import FrameWriter, encoder_options, load_image, save_image, unique_path
+from operations.colour import has_alpha
+from operations.profiling import Profiler, add_hook, profiled
+from operations.registry import perform_operation
+from stream import read_frames, run_frames
+from tiling import process_tiled, supports_tiling
+from utils import get_file_size, get_kernel_from_terminal
+
+
+def run(args: Namespace):
+    """Performs the operation given by the parsed command line arguments on the input image(s) and saves the output.
+
+    Args:
+        args (Namespace): The parsed command line arguments
+    """
+
+    # Read the convolution kernel up front so that it is available to every strip (and every image)
+    if args.operation == 'convolve':
+        try:
+            args.kernel = get_kernel_from_terminal(args.kernel_size)
+        except ValueError as e:
+            print("[ERROR]", e)
+            exit(1)
+
+    # A convolve step of a chain reads its kernel from the terminal each time it is performed, so it can not be used
+    # on many images or frames (it would prompt for each of them, from several threads)
+    if (args.batch or args.frames) and args.operation == 'chain':
+        steps = args.operations + [step for tail in args.then or [] for step in tail]
+        if 'convolve' in steps:
+            print("[ERROR] Convolve can not be chained with --batch or --frames (it reads its kernel from the "
+                  "terminal), use the convolve operation instead")
+            exit(1)
+
+    # Record the time and memory of each operation, and report them when the program exits
+    if args.profile or args.trace:
+        profiler = Profiler()
+        add_hook(profiler)
+        atexit.register(report_profile, profiler, args.trace)
+
+    # Look up results of previous runs in the cache, and report its statistics when the program exits
+    args.cache = None
+    if args.cache_dir:
+        args.cache = ResultCache(args.cache_dir, args.cache_size)
+        atexit.register(lambda: print(args.cache.summary()))
+
+    # A crop is performed while decoding, so that only the pixels inside the box are decoded
+    box = (args.x1, args.y1, args.x2, args.y2) if args.operation == 'crop' else None
+
+    def load(in_file: Path) -> np.ndarray:
+        return profiled(f"decode {in_file.name}",
+                        lambda: load_image(in_file, args.raw_shape, args.planar, box, args.max_size))
+
+    def save(img: np.ndarray, out_file: Path):
+        def encode():
+            options = encoder_options(out_file, args.compress_level, args.optimize, args.quality, args.subsampling,
+                                      args.tiff_compression, args.tiff_strip_rows)
+            save_image(img, out_file, args.planar, options)
+
+        profiled(f"encode {out_file.name}", encode, img)
+
+    # Stream the frames of an animation, a multi-page file or an image sequence through the operation
+    if args.frames:
+        exit(0 if process_frames(args) else 1)
+
+    # Process many images in one invocation
+    if args.batch:
+        if args.operation == 'chain' and args.then:
+            print("[ERROR] A chain with several outputs (--then) can not be used with --batch")
+            exit(1)
+
+        in_files = collect_inputs(args.in_file, sys.stdin)
+        if not in_files:
+            print(f"No input images found: {args.in_file}")
+            exit(1)
+
+        # The operation is the same for every image, so it is only announced once
+        if not box:
+            print(f"Performing operation: {args.operation} (on each image, {args.workers} worker(s))")
+
+        failures = run_batch(in_files, lambda in_file: unique_path(output_path(in_file, args.out_file)),
+                             (lambda img: img) if box else lambda img: process_image(img, args, quiet=True),
+                             args.workers, load=load, save=save, encoders=args.encode_workers)
+        exit(1 if failures else 0)
+
+    # Handle input file path
+    in_file = Path(args.in_file)
+    if not in_file.is_file():  # Check if input file exists
+        print(f"File not found: {in_file}")
+        exit(1)
+
+    # Read the input image contents into a numpy array
+    timings = {}
+    try:
+        start = time.perf_counter()
+        img = load(in_file)
+        timings['decode'] = time.perf_counter() - start
+        mapped = " (memory-mapped)" if isinstance(img, np.memmap) else ""
+        print(f"Loaded image: {in_file.name} ({img.shape[1]}x{img.shape[0]}), {get_file_size(in_file)}{mapped}")
+        if box:
+            print("Performing operation: crop (while decoding)")
+
+    except UnidentifiedImageError:
+        print(f"File is not a valid image: {in_file}")
+        exit(1)
+
+    except ValueError as e:
+        print("[ERROR]", e)
+        exit(1)
+
+    # Perform the requested operation(s) (a crop has already been performed while loading)
+    try:
+        start = time.perf_counter()
+        if box is None:
+            img = process_image(img, args)
+        timings['process'] = time.perf_counter() - start
+
+    except ValueError as e:
+        print("[ERROR]", e)
+        print("Use the --help flag for usage information about the requested operation.")
+        print("Exiting...")
+        exit(1)
+
+    # A chain with --then has an output for each tail, numbered in order
+    outputs = img if isinstance(img, list) else [img]
+    for i, img in enumerate(outputs, 1):
+
+        # Get output file path
+        out_file = in_file.parent.joinpath(args.out_file)  # Output to same directory as input file
+        if len(outputs) > 1:
+            out_file = out_file.with_stem(f"{out_file.stem}-{i}")
+        out_file = unique_path(out_file)  # If output file already exists, append number to filename
+
+        # Save the output image
+        try:
+            start = time.perf_counter()
+            save(img, out_file)
+            timings['encode'] = timings.get('encode', 0) + time.perf_counter() - start
+            print(f"Saved image: {out_file.name} ({img.shape[1]}x{img.shape[0]}), {get_file_size(out_file)}")
+
+        except ValueError:
+            print(f"Unrecognized output format: {out_file.suffix}")
+            exit(1)
+
+        except OSError:
+            print(f"Unable to save file: {out_file}")
+
+            if '/' in args.out_file or '\\' in args.out_file:  # Warn about possible invalid file path
+                print("Output file path may be invalid. Relative paths begin from the input file's directory.")
+
+            if has_alpha(img) and out_file.suffix.lower() not in ['.png', '.tiff']:  # Warn about transparency
+                print("Image has transparency. Try saving as another format (i.e. PNG or TIFF)")
+
+            exit(1)
+
+    print("Timings: " + ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings.items()))
+
+
+def process_frames(args: Namespace) -> bool:
+    """Performs the operation on every frame of the input and writes the frames to one output (see stream).
+
+    Args:
+        args (Namespace): The parsed command line arguments
+
+    Returns:
+        bool: Whether every frame was processed and written
+    """
+
+    if args.batch or (args.operation == 'chain' and args.then):
+        print("[ERROR] --frames can not be used with --batch or a chain with several outputs (--then)")
+        return False
+
+    # The output is saved in the directory of the input file (or of the sequence's files)
+    source = Path(args.in_file)
+    directory = source if source.is_dir() else source.parent
+    out_file = directory.joinpath(args.out_file)
+    if '{index' not in out_file.name:
+        out_file = unique_path(out_file)
+
+    # The operation is the same for every frame, so it is only announced once
+    print(f"Performing operation: {args.operation} (on each frame, {args.workers} worker(s))")
+    args.verbose = False
+
+    try:
+        options = encoder_options(out_file, args.compress_level, args.optimize, args.quality, args.subsampling,
+                                  args.tiff_compression, args.tiff_strip_rows)
+        with FrameWriter(out_file, options) as writer:
+            count = run_frames(read_frames(args.in_file, sys.stdin), lambda img: process_image(img, args, quiet=True),
+                               writer, args.workers, args.prefetch)
+
+    except (UnidentifiedImageError, ValueError, OSError) as e:
+        print("[ERROR]", e)
+        return False
+
+    if not count:
+        print(f"No input frames found: {args.in_file}")
+        return False
+
+    print(f"Saved {count} frame(s): {out_file.name}" + (f", {get_file_size(out_file)}" if out_file.is_file() else ""))
+    return True
+
+
+def report_profile(profiler: Profiler, trace_file: str = None):
+    """Prints the profile summary table and writes the Chrome trace, if a file was given."""
+
+    print("\nProfile:")
+    print(profiler.summary())
+    if trace_file:
+        profiler.write_trace(trace_file)
+        print(f"Saved trace: {trace_file} (open in chrome://tracing or https://ui.perfetto.dev)")
+
+
+def process_image(img: np.ndarray, args: Namespace, quiet: bool = False) -> np.ndarray:
+    """Performs the requested operation on the image array, in strips if requested and supported.
+
+    Args:
+        img (np.ndarray): The image array to perform the operation on
+        args (Namespace): The parsed command line arguments
+        quiet (bool, optional): Whether to skip the notices about the operation performed (i.e. for each image of a
+            batch or frame of a stream). Defaults to False
+
+    Returns:
+        np.ndarray: The image array after the operation has been performed
+    """
+
+    # Skip the operation if its result for this image is cached (cheap operations are performed again, and chains
+    # look up each of their steps instead)
+    cache = getattr(args, 'cache', None)
+    if cache is not None and args.operation != 'chain' and worth_caching(args.operation, args):
+        key = cache.derive(cache.input_key(img), operation_spec(args.operation, args))
+        result = cache.get(key)
+        if result is not None:
+            if not quiet:
+                print(f"Performing operation: {args.operation} (cached)")
+            return result
+
+        result = _process_image(img, args, quiet)
+        cache.put(key, result)
+        return result
+
+    return _process_image(img, args, quiet)
+
+
+def _process_image(img: np.ndarray, args: Namespace, quiet: bool = False) -> np.ndarray:
+    """Performs the requested operation on the image array (see process_image)."""
+
+    # In batch (and frames) mode the workers process whole images concurrently instead of strips
+    workers = 1 if args.batch or getattr(args, 'frames', False) else args.workers
+    tiled = args.max_memory is not None or workers > 1
+
+    if tiled and supports_tiling(args.operation):
+        if not quiet:
+            print(f"Performing operation: {args.operation} (in strips, {workers} worker(s))")
+        return profiled(f"{args.operation} (strips)",
+                        lambda: process_tiled(img, args.operation, args, args.max_memory, workers), img)
+
+    if tiled and not quiet:
+        print(f"Operation {args.operation} can not be performed in strips, ignoring --max-memory/--workers")
+
+    # Quiet operations print nothing, including the steps of a chain (which read the verbose argument)
+    if quiet:
+        args = Namespace(**{**vars(args), 'verbose': False})
+    return perform_operation(img, args.operation, args, getattr(args, 'verbose', True))
@@ -0,0 +1,254 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""A long-running image processing server accepting jobs over localhost HTTP or a Unix socket.
+
+Start the server:  python server.py [--port 8765 | --socket /tmp/imageproc.sock] [--concurrency 4] [--queue 16]
+
+Jobs are HTTP requests using the same operation vocabulary as the command line:
+
+    POST /process?op=boxblur -r 3             (request body: the encoded input image)
+    POST /process?op=edge&in=/data/a.png      (read the input from a path instead)
+    POST /process?op=invert&out=/data/b.png   (write the result to a path instead of returning it)
+    POST /process?op=convolve 3&kernel=[[0,0,0],[0,1,0],[0,0,0]]
+    POST /process?op=sharpen&precision=float32  (the arithmetic used by filters, as --precision)
+    GET /status                               (queue and job statistics as JSON)
+
+By default the result is returned in the response body, encoded as PNG (or the format given by format=...).
+"""
+
+import io
+import json
+import shlex
+import socketserver
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from image_io import load_image, save_image, to_pil_image
+from operations.convolving import check_precision
+from operations.registry import perform_operation
+from parse_args import parse_operation
+from utils import non_negative_int, positive_int
+
+
+class QueueFullError(Exception):
+    """Raised when a job is rejected because the queue is full."""
+
+
+class JobLimiter:
+    """Limits the number of jobs running at once, and the number waiting for a turn (backpressure).
+
+    Jobs beyond the running and waiting limits are rejected immediately instead of piling up.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.slots = threading.Semaphore(concurrency)
+        self.lock = threading.Lock()
+        self.active = 0  # running and waiting jobs
+        self.stats = {'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def __enter__(self):
+        with self.lock:
+            if self.active >= self.concurrency + self.queue_size:
+                self.stats['rejected'] += 1
+                raise QueueFullError("Server is busy, try again later")
+            self.active += 1
+
+        self.slots.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.slots.release()
+        with self.lock:
+            self.active -= 1
+            self.stats['failed' if exc_type else 'completed'] += 1
+
+    def status(self) -> dict:
+        """Returns the current queue state and job counts."""
+
+        with self.lock:
+            running = min(self.active, self.concurrency)
+            return {'running': running, 'queued': self.active - running, 'concurrency': self.concurrency,
+                    'queue_size': self.queue_size, **self.stats}
+
+
+def run_job(body: bytes, params: dict) -> tuple[np.ndarray, Path | None]:
+    """Decodes, processes and (optionally) saves one job.
+
+    Args:
+        body (bytes): The encoded input image (ignored if the input path is given)
+        params (dict): The query parameters of the job: op, and optionally in, out, kernel and precision
+
+    Raises:
+        ValueError: If the job is invalid
+
+    Returns:
+        tuple[np.ndarray, Path | None]: The result, and the path it was written to (if any)
+    """
+
+    if 'op' not in params:
+        raise ValueError("Missing operation (op parameter)")
+
+    args = parse_operation(shlex.split(params['op']))
+    args.precision = check_precision(params.get('precision', 'float64'))
+
+    # The kernel can not be read from the terminal, so it must be part of the job
+    if args.operation == 'convolve':
+        if 'kernel' not in params:
+            raise ValueError("Convolve jobs need a kernel parameter (i.e. [[0,0,0],[0,1,0],[0,0,0]])")
+        args.kernel = np.array(json.loads(params['kernel']), dtype=np.float64)
+        if args.kernel.shape != (args.kernel_size, args.kernel_size):
+            raise ValueError(f"Kernel must be {args.kernel_size}x{args.kernel_size}")
+
+    if args.operation == 'chain' and 'convolve' in args.operations:
+        raise ValueError("Convolve can not be chained in server jobs (it reads its kernel from the terminal)")
+
+    if args.operation == 'chain' and args.then:
+        raise ValueError("Chains with several outputs (--then) can not be server jobs")
+
+    if 'in' in params:
+        img = load_image(Path(params['in']))
+    else:
+        img = load_image(io.BytesIO(body))
+
+    img = perform_operation(img, args.operation, args)
+
+    out_file = None
+    if 'out' in params:
+        out_file = Path(params['out'])
+        save_image(img, out_file)
+
+    return img, out_file
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """Handles job requests (the limiter is set on the server)."""
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/status':
+            self.send_json(200, self.server.limiter.status())
+        else:
+            self.send_json(404, {'error': "Not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/process':
+            self.send_json(404, {'error': "Not found"})
+            return
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        try:
+            with self.server.limiter:
+                img, out_file = run_job(body, params)
+
+        except QueueFullError as e:
+            self.send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+            return
+
+        except (ValueError, OSError, UnidentifiedImageError, NotImplementedError) as e:
+            self.send_json(400, {'error': str(e) or type(e).__name__})
+            return
+
+        if out_file is not None:
+            self.send_json(200, {'path': str(out_file), 'width': img.shape[1], 'height': img.shape[0]})
+            return
+
+        # Return the result encoded in the requested format
+        image_format = params.get('format', 'png').upper()
+        buffer = io.BytesIO()
+        try:
+            to_pil_image(img).save(buffer, format=image_format)
+        except (KeyError, ValueError, OSError) as e:
+            self.send_json(400, {'error': f"Unable to encode result as {image_format}: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', Image.MIME.get(image_format, 'application/octet-stream'))
+        self.send_header('Content-Length', str(buffer.getbuffer().nbytes))
+        self.end_headers()
+        self.wfile.write(buffer.getvalue())
+
+    def send_json(self, status: int, content: dict, headers: dict = None):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """An HTTP server listening on a Unix socket."""
+
+    daemon_threads = True
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8765, socket_path: str = None, concurrency: int = 4,
+                  queue_size: int = 16):
+    """Creates (but does not start) a job server.
+
+    Args:
+        host (str, optional): The address to listen on. Defaults to '127.0.0.1'
+        port (int, optional): The TCP port to listen on (0 picks a free port). Defaults to 8765
+        socket_path (str, optional): Listen on this Unix socket instead of TCP. Defaults to None
+        concurrency (int, optional): The number of jobs processed at once. Defaults to 4
+        queue_size (int, optional): The number of jobs which may wait for a turn. Defaults to 16
+
+    Returns:
+        The server, ready for serve_forever()
+    """
+
+    if socket_path is not None:
+        Path(socket_path).unlink(missing_ok=True)
+        server = UnixHTTPServer(socket_path, JobHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), JobHandler)
+
+    server.limiter = JobLimiter(concurrency, queue_size)
+    return server
+
+
+def main():
+    parser = ArgumentParser(description="Serve image processing jobs over localhost HTTP or a Unix socket.")
+    parser.add_argument('--host', metavar='<address>', default='127.0.0.1',
+                        help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', metavar='<port>', type=non_negative_int, default=8765,
+                        help="TCP port to listen on (default: 8765)")
+    parser.add_argument('--socket', metavar='<path>', default=None, help="Listen on a Unix socket instead of TCP")
+    parser.add_argument('--concurrency', metavar='<jobs>', type=positive_int, default=4,
+                        help="Number of jobs processed at once (default: 4)")
+    parser.add_argument('--queue', metavar='<jobs>', type=non_negative_int, default=16,
+                        help="Number of jobs which may wait before new jobs are rejected (default: 16)")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.socket, args.concurrency, args.queue)
+    address = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving image processing jobs on {address} (concurrency {args.concurrency}, queue {args.queue})")
+
+    with server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nExiting...")
+        exit(0)
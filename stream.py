@@ -0,0 +1,174 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Streaming the frames of an animation, a multi-page TIFF file or an image sequence through an operation.
+
+Frames are read by a generator on one thread, processed concurrently by worker threads and written in order by the
+calling thread. Each frame takes one of a fixed number of slots (the prefetch depth) from when it is read until it
+has been written, so only that many frames are held at once however long the input is.
+"""
+
+import queue
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+
+from batch import collect_inputs
+from image_io import FrameWriter, load_frames, load_image
+
+# Marks the end of the frames in the work queue
+_DONE = object()
+
+
+def read_frames(source: str, stdin=None) -> Iterator[tuple[np.ndarray, float | None]]:
+    """Reads frames one at a time from a multi-frame file or an image sequence.
+
+    Args:
+        source (str): An animation or multi-page TIFF file (see image_io.load_frames), or an image sequence with
+            one frame per file: a directory, a glob pattern (i.e. 'frames/*.png') or '-' to read paths from stdin
+            (see batch.collect_inputs)
+        stdin (optional): The stream to read paths from when the source is '-'
+
+    Yields:
+        tuple[np.ndarray, float | None]: Each (H, W, C) frame and how long it is shown in milliseconds (if known)
+    """
+
+    if Path(source).is_file():
+        yield from load_frames(Path(source))
+        return
+
+    for in_file in collect_inputs(source, stdin):
+        yield load_image(in_file), None
+
+
+def run_frames(frames: Iterable, process, writer: FrameWriter, workers: int = 1, depth: int = None) -> int:
+    """Processes a stream of frames with worker threads and writes the results in their original order.
+
+    A summary of the frames per second and the time spent in each stage is printed at the end.
+
+    Args:
+        frames (Iterable): The frames and their durations (see read_frames), read as they are needed
+        process: A function applying the operation(s) to a frame
+        writer (FrameWriter): Where to write the processed frames
+        workers (int, optional): The number of frames processed concurrently. Defaults to 1
+        depth (int, optional): The number of frames held at once (read but not yet written).
+            Defaults to twice the workers
+
+    Raises:
+        Exception: The first error raised while reading, processing or writing a frame (which stops the stream)
+
+    Returns:
+        int: The number of frames written
+    """
+
+    depth = max(depth or workers * 2, 1)
+    slots = threading.Semaphore(depth)
+    tasks = queue.Queue()
+
+    # Processed frames by index, until the frames before them have been written
+    done = {}
+    condition = threading.Condition()
+    state = {'read': None, 'error': None}  # the number of frames once all have been read, the first error
+    seconds = {'decode': 0.0, 'process': 0.0, 'encode': 0.0}  # summed over the threads of each stage
+
+    def fail(error: Exception):
+        with condition:
+            state['error'] = state['error'] or error
+            condition.notify_all()
+
+    def read():
+        count = 0
+        try:
+            frame_iterator = iter(frames)
+            while True:
+                slots.acquire()
+                if state['error'] is not None:
+                    break
+
+                start = time.perf_counter()
+                item = next(frame_iterator, _DONE)
+                seconds['decode'] += time.perf_counter() - start
+                if item is _DONE:
+                    break
+
+                tasks.put((count, *item))
+                count += 1
+
+        except Exception as e:
+            fail(e)
+
+        finally:
+            with condition:
+                state['read'] = count
+                condition.notify_all()
+            for _ in range(workers):
+                tasks.put(_DONE)
+
+    def work():
+        while (task := tasks.get()) is not _DONE:
+            index, img, duration = task
+            try:
+                start = time.perf_counter()
+                result = process(img)
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                fail(e)
+                continue
+
+            with condition:
+                seconds['process'] += elapsed
+                done[index] = (result, duration)
+                condition.notify_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=read, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # Write the frames in order as they are processed
+    written, pixels = 0, 0
+    try:
+        while True:
+            with condition:
+                condition.wait_for(lambda: written in done or state['error'] is not None or state['read'] == written)
+                if state['error'] is not None:
+                    raise state['error']
+                if written not in done:
+                    break
+                img, duration = done.pop(written)
+
+            encode_start = time.perf_counter()
+            writer.write(img, duration)
+            seconds['encode'] += time.perf_counter() - encode_start
+
+            written += 1
+            pixels += img.shape[0] * img.shape[1]
+            slots.release()
+
+    except BaseException as e:
+        # Let the reader see the error (and stop waiting for a slot) before leaving
+        fail(e if isinstance(e, Exception) else RuntimeError("Stream interrupted"))
+        for _ in range(depth):
+            slots.release()
+        raise
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {written} frame(s) in {elapsed:.2f} s: {written / elapsed:.2f} frames/s, "
+          f"{pixels / elapsed / 1e6:.2f} Mpix/s")
+
+    # The stage with the most time per thread limits the throughput
+    stage_threads = {'decode': 1, 'process': workers, 'encode': 1}
+    bottleneck = max(seconds, key=lambda stage: seconds[stage] / stage_threads[stage])
+    print("Stage times (summed over threads): "
+          + ", ".join(f"{stage} {seconds[stage]:.2f} s ({stage_threads[stage]} thread(s))" for stage in seconds)
+          + f", bottleneck: {bottleneck}")
+
+    return written
@@ -0,0 +1,121 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import api
+
+
+class TestApi(unittest.TestCase):
+    """Test the library interface and its batches of images"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create a batch of frames from the test image: the original, its inverse and a shifted copy
+        img = np.array(Image.open('tests/logo.png').convert('RGBA'))[:48, :64]
+        cls.frames = np.stack([img, 255 - img, np.roll(img, 5, axis=1)])
+
+    def assert_frame_by_frame(self, function, frames: np.ndarray, **options):
+        """Checks that a batch gives the same result as each frame on its own, without printing anything."""
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = function(frames, **options)
+            expected = np.stack([function(frame, **options) for frame in frames])
+
+        np.testing.assert_array_equal(result, expected)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_batches(self):
+        """Test that each operation processes a batch as it would each frame"""
+
+        cases = [
+            (api.box_blur, {'radius': 2, 'passes': 2}),
+            (api.box_blur, {'radius': 2, 'precision': 'int16-fixed'}),
+            (api.convolve, {'kernel': np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])}),
+            (api.convolve, {'kernel': np.ones((9, 9)) / 81, 'method': 'fft', 'precision': 'float32'}),
+            (api.crop, {'x1': 4, 'y1': 8, 'x2': 40, 'y2': 30}),
+            (api.edge, {}),
+            (api.gaussian_blur, {'sigma': 1.5}),
+            (api.grayscale, {}),
+            (api.invert, {}),
+            (api.mirror, {'vertical': True}),
+            (api.rotate, {'turns': 3}),
+            (api.sepia, {}),
+            (api.sharpen, {}),
+            (api.threshold, {'binary': True}),
+        ]
+
+        for function, options in cases:
+            with self.subTest(function.__name__, **options):
+                self.assert_frame_by_frame(function, self.frames, **options)
+
+        # Colour models without alpha, and a non-contiguous batch (every other frame and column)
+        self.assert_frame_by_frame(api.gaussian_blur, self.frames[..., :1])
+        self.assert_frame_by_frame(api.grayscale, self.frames[..., :3])
+        self.assert_frame_by_frame(api.sharpen, self.frames[::2, :, ::2])
+        self.assert_frame_by_frame(api.threshold, self.frames[::2, :, ::2])
+
+    def test_groups(self):
+        """Test that batches split into groups of frames give the same results as one group"""
+
+        expected = [api.gaussian_blur(self.frames), api.chain(self.frames, ['sharpen', 'rotateCW', 'edge']),
+                    api.chain_many(self.frames, [['blur', 'invert'], ['blur', 'sepia']])]
+
+        with mock.patch('api.GROUP_PIXELS', 2 * 48 * 64):
+            np.testing.assert_array_equal(api.gaussian_blur(self.frames), expected[0])
+            np.testing.assert_array_equal(api.chain(self.frames, ['sharpen', 'rotateCW', 'edge']), expected[1])
+            for result, pipeline in zip(api.chain_many(self.frames, [['blur', 'invert'], ['blur', 'sepia']]),
+                                        expected[2]):
+                np.testing.assert_array_equal(result, pipeline)
+
+            frames = self.frames.copy()
+            api.gaussian_blur(frames, out=frames)
+            np.testing.assert_array_equal(frames, expected[0])
+
+    def test_chain(self):
+        """Test that chains process batches without printing"""
+
+        self.assert_frame_by_frame(api.chain, self.frames, operations=['grayscale', 'blur', 'rotateCW', 'edge'])
+        self.assert_frame_by_frame(api.chain, self.frames, operations=['sepia', 'sharpen', 'mirrorH', 'invert'])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = api.chain_many(self.frames, [['grayscale', 'blur'], ['grayscale', 'invert']])
+        np.testing.assert_array_equal(results[1], api.chain(self.frames, ['grayscale', 'invert']))
+        self.assertEqual(output.getvalue(), '')
+
+    def test_in_place(self):
+        """Test that a contiguous batch can be written in place"""
+
+        frames = self.frames.copy()
+        expected = api.invert(frames)
+        self.assertIs(api.invert(frames, out=frames), frames)
+        np.testing.assert_array_equal(frames, expected)
+
+        frames = self.frames.copy()
+        expected = api.box_blur(frames)
+        api.box_blur(frames, out=frames)
+        np.testing.assert_array_equal(frames, expected)
+
+    def test_invalid_images(self):
+        """Test that arrays which are not images or batches of images are rejected"""
+
+        for images in [self.frames.astype(np.float64), self.frames[0, ..., 0], self.frames[np.newaxis],
+                       self.frames[..., :0], self.frames[:0], [[[0]]]]:
+            with self.subTest(shape=np.shape(images)), self.assertRaises(ValueError):
+                api.invert(images)
+
+        with self.assertRaises(ValueError):
+            api.chain(self.frames, ['crop'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from argparse import Namespace
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from batch import collect_inputs, output_path, run_batch
+from operations import invert
+from pipeline import process_image, run
+
+
+class TestBatch(unittest.TestCase):
+    """Test processing many images in one invocation"""
+
+    def setUp(self):
+        # Create a directory with a few copies of the test image and a file which is not an image
+        self.dir = Path(tempfile.mkdtemp())
+        for i in range(5):
+            shutil.copy('tests/logo.png', self.dir / f'logo{i}.png')
+        (self.dir / 'notes.txt').write_text("not an image")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_collect_inputs(self):
+        """Test directories, glob patterns and stdin lists"""
+
+        self.assertEqual(len(collect_inputs(str(self.dir))), 5)
+        self.assertEqual(len(collect_inputs(str(self.dir / 'logo[12].png'))), 2)
+        self.assertEqual(collect_inputs('-', io.StringIO("a.png\n\nb.png\n")), [Path('a.png'), Path('b.png')])
+
+    def test_output_path(self):
+        """Test name templates with and without a {stem} placeholder"""
+
+        self.assertEqual(output_path(Path('x/a.jpg'), '{stem}-small.png'), Path('x/a-small.png'))
+        self.assertEqual(output_path(Path('x/a.jpg'), 'edges.png'), Path('x/a-edges.png'))
+
+    def test_run_batch(self):
+        """Test that every image is processed and failures are counted"""
+
+        in_files = collect_inputs(str(self.dir)) + [self.dir / 'notes.txt']
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            failures = run_batch(in_files, lambda in_file: output_path(in_file, 'inverted.png'), invert, workers=3,
+                                 encoders=2)
+
+        self.assertEqual(failures, 1)
+        self.assertIn("images/s", output.getvalue())
+        self.assertIn("encode", output.getvalue().splitlines()[-1])
+
+        expected = invert(np.array(Image.open('tests/logo.png')))
+        for i in range(5):
+            actual = np.array(Image.open(self.dir / f'logo{i}-inverted.png'))
+            self.assertTrue(np.array_equal(actual, expected))
+
+    def test_chained_convolve(self):
+        """Test that a chain reading a kernel from the terminal is rejected before any image is processed"""
+
+        for batch, frames, then in [(True, False, None), (False, True, None), (True, False, [['convolve']])]:
+            args = Namespace(operation='chain', operations=['blur'] if then else ['blur', 'convolve'], then=then,
+                             batch=batch, frames=frames, in_file=str(self.dir))
+            with self.subTest(batch=batch, frames=frames, then=then), mock.patch('builtins.input') as prompt, \
+                    contextlib.redirect_stdout(io.StringIO()) as output, self.assertRaises(SystemExit):
+                run(args)
+            prompt.assert_not_called()
+            self.assertIn("Convolve can not be chained", output.getvalue())
+
+    def test_quiet(self):
+        """Test that images of a batch are processed without printing a notice for each"""
+
+        img = np.array(Image.open('tests/logo.png'))
+        for operation, extra in [('sepia', {}), ('chain', {'operations': ['grayscale', 'blur'], 'then': None,
+                                                           'explain': False})]:
+            args = Namespace(operation=operation, batch=True, max_memory=None, workers=2, **extra)
+            with self.subTest(operation), contextlib.redirect_stdout(io.StringIO()) as output:
+                process_image(img, args, quiet=True)
+            self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@ import unittest
 import numpy as np
 from PIL import Image
 
-from operations import box_blur
+from operations import box_blur, convolve, gaussian_blur
 
 
 class TestBoxBlur(unittest.TestCase):
@@ -52,6 +52,52 @@ class TestBoxBlur(unittest.TestCase):
             expected_a = np.full((3, 3), 255, dtype=np.uint8)
             self.assertTrue(np.array_equal(actual_a, expected_a))
 
+    def test_matches_convolution(self):
+        """Test that the running-sum blur matches convolving with a dense box kernel (exact truncated values)"""
+
+        img = np.random.default_rng(0).integers(0, 256, (40, 60, 4), dtype=np.uint8)
+
+        for radius in (2, 7):
+            with self.subTest(radius=radius):
+                kernel_size = radius * 2 + 1
+                kernel = np.full((kernel_size, kernel_size), 1 / kernel_size ** 2)
+                self.assertTrue(np.array_equal(box_blur(img, radius, 2), convolve(img, kernel, 2, 'direct')))
+
+    def test_large_radius(self):
+        """Test a radius larger than the image (the borders are reflected repeatedly)"""
+
+        actual = box_blur(self.img, 50)
+        self.assertEqual(actual.shape, self.img.shape)
+        self.assertTrue(np.array_equal(actual[..., 3], self.img[..., 3]))
+
+    def test_collapsed_passes(self):
+        """Test that collapsed passes match repeated passes to within 1 LSB away from the borders"""
+
+        img = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        radius, passes = 2, 4
+        margin = radius * passes
+
+        repeated = box_blur(img, radius, passes).astype(int)
+        collapsed = box_blur(img, radius, passes, collapse=True).astype(int)
+
+        interior = np.abs(repeated - collapsed)[margin:-margin, margin:-margin]
+        self.assertLessEqual(interior.max(), 1)
+
+    def test_precisions(self):
+        """Test that integer window sums match float64 and float32 is within 1 LSB"""
+
+        img = np.random.default_rng(0).integers(0, 256, (64, 64, 4), dtype=np.uint8)
+
+        for radius, passes in ((1, 1), (3, 2), (50, 3)):
+            with self.subTest(radius=radius, passes=passes):
+                expected = box_blur(img, radius, passes)
+                self.assertTrue(np.array_equal(box_blur(img, radius, passes, precision='int16-fixed'), expected))
+                single = box_blur(img, radius, passes, precision='float32')
+                self.assertLessEqual(np.abs(single.astype(int) - expected).max(), 1)
+
+        expected = gaussian_blur(img, 2)
+        self.assertTrue(np.array_equal(gaussian_blur(img, 2, 'int16-fixed'), expected))
+
 
 if __name__ == '__main__':
     unittest.main()
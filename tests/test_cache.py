@@ -0,0 +1,131 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from cache import ResultCache, operation_spec
+from operations import chain
+from parse_args import parse_args
+from pipeline import process_image
+
+
+class TestCache(unittest.TestCase):
+    """Test the on-disk result cache"""
+
+    def setUp(self):
+        # Create a random test image and an empty cache
+        self.img = np.random.default_rng(0).integers(0, 256, (40, 30, 3), dtype=np.uint8)
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(Path(self.directory.name), 1 << 20)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keys(self):
+        """Test that keys change with the pixels and the arguments which affect the result, and only those"""
+
+        key = self.cache.input_key(self.img)
+        self.assertEqual(key, self.cache.input_key(self.img.copy()))
+        self.assertEqual(key, self.cache.input_key(np.asfortranarray(self.img)))
+
+        changed = self.img.copy()
+        changed[0, 0, 0] ^= 1
+        self.assertNotEqual(key, self.cache.input_key(changed))
+
+        blur = operation_spec('gaussblur', Namespace(sigma=2, precision='float64', workers=1, out_file='a.png'))
+        self.assertEqual(blur, operation_spec('gaussblur', Namespace(sigma=2, precision='float64', workers=4,
+                                                                     out_file='b.jpg')))
+        self.assertNotEqual(blur, operation_spec('gaussblur', Namespace(sigma=3, precision='float64')))
+        self.assertNotEqual(blur, operation_spec('gaussblur', Namespace(sigma=2, precision='float32')))
+
+        # Convolutions are keyed by their kernel
+        kernels = [operation_spec('convolve', Namespace(kernel=np.full((3, 3), value), kernel_size=3))
+                   for value in (1, 2)]
+        self.assertNotEqual(self.cache.derive(key, kernels[0]), self.cache.derive(key, kernels[1]))
+
+    def test_keys_across_modes(self):
+        """Test that an operation has the same key for a single image, a batch and the frames of a stream"""
+
+        specs = []
+        for argv in (['logo.png', 'out.png', 'sharpen', '-a', '3'],
+                     ['*.png', '{stem}-out.png', '--batch', '--workers', '4', '--plugin', 'string', 'sharpen', '-a',
+                      '3'],
+                     ['clip.gif', 'out.gif', '--frames', '--prefetch', '8', 'sharpen', '-a', '3']):
+            with mock.patch('sys.argv', ['main.py'] + argv):
+                args = parse_args()
+            if args.frames:
+                args.verbose = False  # as set by pipeline.process_frames
+            specs.append(operation_spec(args.operation, args))
+
+        self.assertEqual(specs[0], specs[1])
+        self.assertEqual(specs[0], specs[2])
+
+    def test_process_image(self):
+        """Test that a repeated operation is read from the cache instead of being performed"""
+
+        args = Namespace(operation='gaussblur', sigma=2, precision='float64', batch=False, max_memory=None, workers=1,
+                         cache=self.cache)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = process_image(self.img, args)
+            with mock.patch('pipeline._process_image') as perform:
+                result = process_image(self.img, args)
+
+        perform.assert_not_called()
+        np.testing.assert_array_equal(result, expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_chain_prefix(self):
+        """Test that a chain resumes after the longest prefix of steps with a stored result"""
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            chain(self.img, ['grayscale', 'blur'], cache=self.cache)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                result = chain(self.img, ['grayscale', 'blur', 'mirrorH', 'edge'], cache=self.cache)
+            expected = chain(self.img, ['grayscale', 'blur', 'mirrorH', 'edge'])
+
+        np.testing.assert_array_equal(result, expected)
+        self.assertIn("Using cached result: grayscale, blur", output.getvalue())
+        self.assertNotIn("(fused)", output.getvalue())
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_eviction(self):
+        """Test that the least recently used results are deleted once the cache is too large"""
+
+        cache = ResultCache(Path(self.directory.name), 2 * self.img.nbytes + 512)
+        for i, key in enumerate(['a1', 'b2', 'c3']):
+            cache.put(key, self.img)
+            os.utime(cache._path(key), (i, i))  # distinct modification times
+            if key == 'b2':
+                cache.get('a1')  # used more recently than b2
+
+        self.assertTrue(cache.contains('a1'))
+        self.assertFalse(cache.contains('b2'))
+        self.assertTrue(cache.contains('c3'))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_atomic_write(self):
+        """Test that a failed write leaves neither a result nor a temporary file"""
+
+        with mock.patch('numpy.save', side_effect=OSError("disk full")), self.assertRaises(OSError):
+            self.cache.put('d4', self.img)
+
+        self.assertFalse(self.cache.contains('d4'))
+        self.assertEqual(list(Path(self.directory.name).rglob('*.tmp')), [])
+        self.assertIsNone(self.cache.get('d4'))
+        self.assertEqual(self.cache.misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import tracemalloc
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from operations import chain, chain_many
+from operations.chaining import plan_chain, plan_tree
+
+
+def quiet_chain(img: np.ndarray, operations: list[str], optimize: bool = True) -> np.ndarray:
+    """Runs a chain without printing progress messages"""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return chain(img, operations, optimize=optimize)
+
+
+class TestChain(unittest.TestCase):
+    """Test the chain operation and its optimizer"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Load the test image
+        cls.img = np.array(Image.open('tests/logo.png'))
+
+    def test_geometric_cancellation(self):
+        """Test that four clockwise rotations and a double mirror are removed from the plan"""
+
+        self.assertEqual(plan_chain(['rotateCW'] * 4), [])
+        self.assertEqual(plan_chain(['mirrorH', 'mirrorH']), [])
+
+        actual = quiet_chain(self.img, ['rotateCW', 'rotateCW', 'rotateCW', 'rotateCW', 'mirrorH', 'mirrorH'])
+        self.assertTrue(np.array_equal(actual, self.img))
+
+    def test_geometric_merge(self):
+        """Test that mixed geometric operations merge into one equivalent transform"""
+
+        operations = ['rotateCW', 'mirrorV', 'rotateCCW', 'rotateCCW', 'mirrorH']
+        plan = plan_chain(operations)
+        self.assertEqual([step.kind for step in plan], ['geometric'])
+
+        optimized = quiet_chain(self.img, operations)
+        unoptimized = quiet_chain(self.img, operations, optimize=False)
+        self.assertTrue(np.array_equal(optimized, unoptimized))
+
+    def test_pointwise_fusion(self):
+        """Test that pointwise operations (with geometric ones mixed in) fuse into one pass with identical output"""
+
+        operations = ['invert', 'rotateCW', 'grayscale', 'threshold']
+        plan = plan_chain(operations)
+        self.assertEqual([step.kind for step in plan], ['geometric', 'pointwise'])
+
+        optimized = quiet_chain(self.img, operations)
+        unoptimized = quiet_chain(self.img, operations, optimize=False)
+        self.assertTrue(np.array_equal(optimized, unoptimized))
+
+    def test_linear_merge(self):
+        """Test that a blur followed by a sharpen becomes one 5x5 convolution within the documented bound"""
+
+        plan = plan_chain(['blur', 'sharpen'])
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan[0].kernel.shape, (5, 5))
+
+        # A sharpen can overshoot, so a following blur is not merged into it
+        self.assertEqual(len(plan_chain(['sharpen', 'blur'])), 2)
+
+        optimized = quiet_chain(self.img, ['blur', 'sharpen']).astype(int)
+        unoptimized = quiet_chain(self.img, ['blur', 'sharpen'], optimize=False).astype(int)
+        self.assertLessEqual(np.abs(optimized - unoptimized).max(), 4)
+
+    def test_linear_merge_bounds(self):
+        """Test the documented bounds on how far merged linear filters differ from running them separately"""
+
+        images = [self.img] + [np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+                               for seed in range(10)]
+        for operations, bound in [(['blur', 'blur'], 2), (['blur', 'blur', 'blur'], 3), (['blur', 'sharpen'], 4)]:
+            with self.subTest(operations=operations):
+                self.assertEqual(len(plan_chain(operations)), 1)
+                difference = max(np.abs(quiet_chain(img, operations).astype(int)
+                                        - quiet_chain(img, operations, optimize=False)).max() for img in images)
+                self.assertLessEqual(difference, bound)
+
+    def test_buffer_reuse(self):
+        """Test that steps alternate between two buffers and leave the input untouched"""
+
+        img = self.img.copy()
+        operations = ['invert', 'blur', 'grayscale', 'sharpen', 'mirrorH', 'invert', 'blur', 'blur']
+        expected = quiet_chain(img, operations, optimize=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            actual = chain(img, operations)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.assertTrue(np.array_equal(img, self.img))
+        self.assertLessEqual(np.abs(actual.astype(int) - expected).max(), 2)
+
+        # Two uint8 buffers plus one step's float64 working planes (three colour channels)
+        self.assertLess(peak, 2 * img.nbytes + 3 * img[..., :3].size * 8)
+
+    def test_unsupported_operation(self):
+        """Test that operations which need arguments are rejected"""
+
+        with self.assertRaises(ValueError):
+            plan_chain(['grayscale', 'crop'])
+
+    def test_shared_prefixes(self):
+        """Test that pipelines sharing a prefix match separate chains, with the shared steps performed once"""
+
+        pipelines = [['grayscale', 'blur', 'edge'], ['grayscale', 'blur', 'mirrorH', 'threshold'],
+                     ['grayscale', 'sharpen'], ['rotateCW', 'rotateCCW']]
+
+        root = plan_tree(pipelines)
+        self.assertEqual(len(root.children), 1)  # grayscale (the last pipeline has nothing to do)
+        self.assertEqual(root.outputs, [3])
+        self.assertEqual(len(root.children[0].children), 2)  # blur and sharpen
+
+        # Count the steps performed, with a cache holding every prefix and with one holding none
+        for max_bytes, performed in [(1 << 30, 6), (1, 9)]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                results = chain_many(self.img, pipelines, max_bytes=max_bytes)
+            self.assertEqual(output.getvalue().count("Performing"), performed)
+
+            for operations, result in zip(pipelines, results):
+                np.testing.assert_array_equal(result, quiet_chain(self.img, operations))
+
+
+if __name__ == '__main__':
+    unittest.main()
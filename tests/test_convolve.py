@@ -2,12 +2,41 @@
 #  Licensed Under the GNU GPL v3.0 License
 #  See LICENSE for more information
 
+import tracemalloc
 import unittest
 
 import numpy as np
 from PIL import Image
 
+from scipy.signal import convolve2d
+
 from operations import convolve
+from operations.convolving import compose_kernel, separate_kernel
+from operations.fixed_point import fixed_kernel, separate_fixed
+
+
+def per_channel_convolve(img: np.ndarray, kernel: np.ndarray, passes: int = 1) -> np.ndarray:
+    """The original convolution path (one convolve2d call per channel per pass), kept as a reference"""
+
+    img = img.astype(np.float64)
+    alpha = img[..., 3]
+    channels = [img[..., i] for i in range(3)]
+    for _ in range(passes):
+        channels = [convolve2d(channel, np.flip(kernel), mode='same', boundary='symm') for channel in channels]
+    img = np.dstack((np.dstack(channels), alpha))
+    np.clip(img, 0, 255, out=img)
+    return img.astype(np.uint8)
+
+
+def peak_memory(func, *args) -> int:
+    """Returns the peak number of bytes traced while calling func"""
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
 
 
 class TestConvolve(unittest.TestCase):
@@ -34,6 +63,174 @@ class TestConvolve(unittest.TestCase):
         actual = convolve(self.rand_img, self.identity_kernel)
         self.assertTrue(np.array_equal(actual, self.rand_img))
 
+    def test_separable_detection(self):
+        """Test that rank-1 kernels are split into vectors and other kernels are not"""
+
+        column, row = separate_kernel(np.outer([1, 2, 1], [-1, 0, 1]))
+        self.assertTrue(np.allclose(np.outer(column, row), np.outer([1, 2, 1], [-1, 0, 1])))
+        self.assertIsNone(separate_kernel(np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]])))
+
+    def test_engines_match_reference(self):
+        """Test that the default output is the original convolve2d output, and that the fast engines agree with each
+        other and differ from it by at most 1 LSB"""
+
+        rng = np.random.default_rng(0)
+        kernels = {
+            'separable': np.outer(rng.random(7), rng.random(7)) / 12,
+            'small': rng.random((5, 5)) / 12,
+            'large': rng.random((17, 17)) / 144,
+        }
+
+        for name, kernel in kernels.items():
+            # Reference result computed channel by channel with the original method
+            expected = per_channel_convolve(self.rand_img, kernel)
+            for method in ('auto', 'reference'):
+                with self.subTest(kernel=name, method=method):
+                    self.assertTrue(np.array_equal(convolve(self.rand_img, kernel, method=method), expected))
+
+            reference = convolve(self.rand_img, kernel, method='direct')
+            methods = ['direct', 'fft'] + (['separable'] if name == 'separable' else [])
+            for method in methods:
+                with self.subTest(kernel=name, method=method):
+                    actual = convolve(self.rand_img, kernel, method=method)
+                    self.assertTrue(np.array_equal(actual, reference))
+                    self.assertLessEqual(np.abs(actual.astype(int) - expected).max(), 1)
+                    self.assertTrue(np.array_equal(actual[..., 3], self.rand_img[..., 3]))
+
+    def test_baseline_deviation(self):
+        """Test that the fast engines give the exact truncated values, differing from the original convolve2d output
+        only where its rounding error fell just below an integer"""
+
+        # Exact 3x3 box sums with symmetric boundaries, computed in integers
+        height, width = self.rand_img.shape[:2]
+        padded = np.pad(self.rand_img[..., :3].astype(np.int64), ((1, 1), (1, 1), (0, 0)), mode='symmetric')
+        sums = sum(padded[i:i + height, j:j + width] for i in range(3) for j in range(3))
+
+        kernel = np.ones((3, 3)) / 9
+        for method in ('direct', 'separable', 'fft'):
+            with self.subTest(method=method):
+                actual = convolve(self.rand_img, kernel, method=method)[..., :3].astype(int)
+                self.assertTrue(np.array_equal(actual, sums // 9))
+
+                baseline = per_channel_convolve(self.rand_img, kernel)[..., :3].astype(int)
+                differs = actual != baseline
+                self.assertTrue(np.all(actual[differs] - baseline[differs] == 1))
+                self.assertTrue(np.all(sums[differs] % 9 == 0))
+
+    def test_memory_peak(self):
+        """Test that the batched path peaks well below the per-channel path on an RGBA image"""
+
+        img = np.random.randint(0, 256, (512, 512, 4), dtype=np.uint8)
+        kernel = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]) / 5
+
+        batched = peak_memory(convolve, img, kernel, 3)
+        per_channel = peak_memory(per_channel_convolve, img, kernel, 3)
+
+        # The per-channel path holds a float64 copy of all four channels plus several stacked copies
+        self.assertLess(batched, per_channel * 0.75)
+
+    def test_compose_kernel(self):
+        """Test that composing box kernels gives the expected larger kernel"""
+
+        composed = compose_kernel(np.ones((3, 3)) / 9, 2)
+        expected = np.outer([1, 2, 3, 2, 1], [1, 2, 3, 2, 1]) / 81
+        self.assertTrue(np.allclose(composed, expected))
+
+    def test_collapsed_passes(self):
+        """Test that collapsed passes match repeated passes to within 1 LSB away from the borders"""
+
+        rng = np.random.default_rng(1)
+        kernel = rng.random((5, 5)) / 12
+        passes = 3
+        margin = passes * 2
+
+        repeated = convolve(self.rand_img, kernel, passes).astype(int)
+        collapsed = convolve(self.rand_img, kernel, passes, collapse=True).astype(int)
+
+        interior = np.abs(repeated - collapsed)[margin:-margin, margin:-margin]
+        self.assertLessEqual(interior.max(), 1)
+
+        # Edge handling differs within the margin (intermediate results are not reflected)
+        self.assertGreater(np.abs(repeated - collapsed).max(), 1)
+
+    def test_invalid_method(self):
+        """Test that unknown engines and forcing the separable engine on a full-rank kernel are rejected"""
+
+        with self.assertRaises(ValueError):
+            convolve(self.img, self.identity_kernel, method='winograd')
+        with self.assertRaises(ValueError):
+            convolve(self.img, np.eye(3), method='separable')
+
+    def test_fixed_kernel(self):
+        """Test that kernels with rational weights get exact integer forms and integer splits"""
+
+        weights, divisor, exact = fixed_kernel(np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]]) / 16)
+        self.assertTrue(exact)
+        self.assertEqual(divisor, 16)
+        self.assertTrue(np.array_equal(weights, [[1, 2, 1], [2, 4, 2], [1, 2, 1]]))
+
+        column, row = separate_fixed(np.outer([1, 2, 1], [-1, 0, 1]))
+        self.assertTrue(np.array_equal(np.outer(column, row), np.outer([1, 2, 1], [-1, 0, 1])))
+        self.assertIsNone(separate_fixed(np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]])))
+
+        self.assertFalse(fixed_kernel(np.full((3, 3), np.pi / 30))[2])
+
+    def test_fixed_many_weights(self):
+        """Test that a kernel with many distinct weights falls back to quantized weights instead of overflowing"""
+
+        kernel = np.random.default_rng(3).random((15, 15)) / 112
+        weights, divisor, exact = fixed_kernel(kernel)
+        self.assertFalse(exact)
+        self.assertLessEqual(np.abs(weights / divisor - kernel).max(), 0.5 / divisor)
+
+        fixed = convolve(self.rand_img, kernel, precision='int16-fixed')
+        self.assertLessEqual(np.abs(fixed.astype(int) - convolve(self.rand_img, kernel)).max(), 1)
+
+    def test_precisions(self):
+        """Test that float32 is within 1 LSB of float64, and int16-fixed is exact for integer-weight kernels"""
+
+        kernels = {
+            'blur': np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]]) / 16,
+            'sobel': np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]]),
+            'sharpen': np.array([[0, -0.6, 0], [-0.6, 3.4, -0.6], [0, -0.6, 0]]),
+            'box': np.full((9, 9), 1 / 81),
+        }
+
+        for name, kernel in kernels.items():
+            for passes in (1, 3):
+                with self.subTest(kernel=name, passes=passes):
+                    expected = convolve(self.rand_img, kernel, passes, 'direct')
+                    single = convolve(self.rand_img, kernel, passes, precision='float32')
+                    self.assertLessEqual(np.abs(single.astype(int) - expected).max(), 1)
+                    for method in ('auto', 'direct'):
+                        fixed = convolve(self.rand_img, kernel, passes, method, precision='int16-fixed')
+                        self.assertTrue(np.array_equal(fixed, expected))
+
+        # Kernels without an exact integer form are quantized
+        kernel = np.random.default_rng(2).normal(0, 0.2, (5, 5))
+        fixed = convolve(self.rand_img, kernel, precision='int16-fixed')
+        self.assertLessEqual(np.abs(fixed.astype(int) - convolve(self.rand_img, kernel)).max(), 1)
+
+    def test_invalid_precision(self):
+        """Test that unknown precisions and the reference and fft engines with integer arithmetic are rejected"""
+
+        with self.assertRaises(ValueError):
+            convolve(self.img, self.identity_kernel, precision='float16')
+        for method in ('reference', 'fft'):
+            with self.assertRaises(ValueError):
+                convolve(self.img, self.identity_kernel, method=method, precision='int16-fixed')
+
+    def test_out(self):
+        """Test that every precision can write into a given buffer, including the image itself"""
+
+        kernel = np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]]) / 16
+        for precision in ('float64', 'float32', 'int16-fixed'):
+            with self.subTest(precision=precision):
+                expected = convolve(self.rand_img, kernel, precision=precision)
+                img = self.rand_img.copy()
+                self.assertIs(convolve(img, kernel, precision=precision, out=img), img)
+                self.assertTrue(np.array_equal(img, expected))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -45,6 +45,15 @@ class TestCrop(unittest.TestCase):
 
         self.assertTrue(np.array_equal(actual, expected))
 
+    def test_view_and_out(self):
+        """Test that a crop is a view of the image unless a buffer to copy into is given"""
+
+        self.assertTrue(np.shares_memory(crop(self.img, 1, 0, 3, 2), self.img))
+
+        buffer = np.zeros((2, 2, 4), dtype=np.uint8)
+        self.assertIs(crop(self.img, 1, 0, 3, 2, out=buffer), buffer)
+        self.assertTrue(np.array_equal(buffer, self.img[0:2, 1:3]))
+
 
 if __name__ == '__main__':
     unittest.main()
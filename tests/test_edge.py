@@ -0,0 +1,91 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from operations import edge
+from operations.edge_detection import OPERATORS, gradients
+
+
+class TestEdge(unittest.TestCase):
+    """Test the edge detection operation"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Load the test image
+        cls.img = np.array(Image.open('tests/logo.png').convert('RGBA'))
+
+    def test_signed_gradients(self):
+        """Test that dark-to-light and light-to-dark steps give the same edges (no clipped negative gradients)"""
+
+        img = np.zeros((32, 32, 1), dtype=np.uint8)
+        img[:, 16:] = 200
+        rising = edge(img, 100)
+        falling = edge(255 - img - 55, 100)
+
+        self.assertTrue(np.array_equal(rising, falling))
+        self.assertTrue(np.all(rising[:, 15:17] == 255))
+        self.assertFalse(np.any(rising[:, :12]) or np.any(rising[:, 20:]))
+
+    def test_flat(self):
+        """Test that an image without gradients has no edges"""
+
+        img = np.full((16, 16, 3), 90, dtype=np.uint8)
+        self.assertFalse(np.any(edge(img, 1)))
+
+    def test_operators(self):
+        """Test that every operator finds the same vertical step, and that unknown operators are rejected"""
+
+        img = np.zeros((24, 24, 1), dtype=np.uint8)
+        img[:, 12:] = 255
+        for operator in OPERATORS:
+            with self.subTest(operator):
+                magnitude, _ = gradients(img, operator=operator)
+                self.assertEqual(magnitude.dtype, np.float32)
+                self.assertEqual(np.argmax(magnitude[12]), 11)
+
+        with self.assertRaises(ValueError):
+            edge(img, operator='canny')
+
+    def test_direction(self):
+        """Test that edge pixels are shaded by the direction of their gradient"""
+
+        img = np.zeros((24, 24, 1), dtype=np.uint8)
+        img[:, 12:] = 255  # a horizontal gradient pointing right (0 degrees)
+        _, angle = gradients(img, direction=True)
+        self.assertAlmostEqual(float(angle[12, 11]), 0, places=5)
+
+        shaded = edge(img, 100, direction=True)
+        self.assertEqual(set(np.unique(shaded)), {0, 128})
+        self.assertTrue(np.array_equal(shaded > 0, edge(img, 100) > 0))
+
+        shaded = edge(255 - img, 100, direction=True)  # pointing left (180 degrees)
+        self.assertEqual(set(np.unique(shaded)), {0, 255})
+
+    def test_alpha(self):
+        """Test that the alpha channel is kept, also when writing in place"""
+
+        result = edge(self.img)
+        self.assertEqual(result.shape, self.img.shape[:2] + (2,))
+        self.assertTrue(np.array_equal(result[..., 1], self.img[..., 3]))
+
+        gray = self.img[..., [0, 3]].copy()
+        expected = edge(gray)
+        self.assertIs(edge(gray, out=gray), gray)
+        self.assertTrue(np.array_equal(gray, expected))
+
+    def test_batch(self):
+        """Test that each frame of a batch is normalized on its own"""
+
+        frames = np.stack([self.img, self.img // 4])
+        result = edge(frames, 120, operator='scharr')
+        for frame, actual in zip(frames, result):
+            self.assertTrue(np.array_equal(actual, edge(frame, 120, operator='scharr')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import unittest
+
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+from operations import gaussian_blur
+from operations.gaussian_blurring import box_radii
+
+
+class TestGaussianBlur(unittest.TestCase):
+    """Test the approximate Gaussian blur operation"""
+
+    def test_box_radii(self):
+        """Test that the combined variance of the boxes is close to sigma²"""
+
+        for sigma in (1, 2, 5, 20):
+            with self.subTest(sigma=sigma):
+                radii = box_radii(sigma)
+                variance = sum(((2 * radius + 1) ** 2 - 1) / 12 for radius in radii)
+                self.assertEqual(len(radii), 3)
+                self.assertAlmostEqual(np.sqrt(variance), sigma, delta=0.25)
+
+    def test_close_to_gaussian(self):
+        """Test that the result is within a few LSB of a true Gaussian blur away from the borders"""
+
+        img = np.random.default_rng(0).integers(0, 256, (120, 120, 3), dtype=np.uint8)
+
+        actual = gaussian_blur(img, 4).astype(np.float64)
+        expected = gaussian_filter(img.astype(np.float64), (4, 4, 0))
+
+        self.assertLess(np.abs(actual - expected)[20:-20, 20:-20].max(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
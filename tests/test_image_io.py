@@ -0,0 +1,173 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+from image_io import encoder_options, load_image, save_image
+from operations import crop, edge, grayscale, invert, mirror
+
+
+class TestImageIO(unittest.TestCase):
+    """Test loading and saving images in each colour model"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create a temporary directory with the test image in several modes
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.dir = Path(cls.tmp.name)
+        with Image.open('tests/logo.png') as logo:
+            for mode in ('L', 'LA', 'P', 'RGB'):
+                logo.convert(mode).save(cls.dir / f'logo-{mode}.png')
+            logo.convert('RGB').convert('P').save(cls.dir / 'logo-P-opaque.png')
+            logo.convert('RGB').save(cls.dir / 'logo.jpg')
+
+            # An uncompressed TIFF file in strips of 3 rows (Pillow writes strips through libtiff)
+            TiffImagePlugin.WRITE_LIBTIFF = True
+            try:
+                logo.save(cls.dir / 'logo.tif', compression='raw', strip_size=3000)
+            finally:
+                TiffImagePlugin.WRITE_LIBTIFF = False
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_load_modes(self):
+        """Test that grayscale files load as one luminance channel and palette files as colour"""
+
+        for mode, channels in (('L', 1), ('LA', 2), ('P', 4), ('P-opaque', 3), ('RGB', 3)):
+            with self.subTest(mode=mode):
+                img = load_image(self.dir / f'logo-{mode}.png')
+                self.assertEqual(img.shape, (250, 250, channels))
+                self.assertEqual(img.dtype, np.uint8)
+
+    def test_save_grayscale(self):
+        """Test that grayscale results are saved without expanding them to RGB"""
+
+        img = grayscale(load_image(Path('tests/logo.png')))
+        self.assertEqual(img.shape[2], 2)
+
+        save_image(img, self.dir / 'gray.png')
+        with Image.open(self.dir / 'gray.png') as saved:
+            self.assertEqual(saved.mode, 'LA')
+        self.assertTrue(np.array_equal(load_image(self.dir / 'gray.png'), img))
+
+        save_image(img[..., :1], self.dir / 'gray.jpg')
+        with Image.open(self.dir / 'gray.jpg') as saved:
+            self.assertEqual(saved.mode, 'L')
+
+    def test_grayscale_matches_rgb(self):
+        """Test that an L image gives the same edges as the same image stored as RGB"""
+
+        gray = load_image(self.dir / 'logo-L.png')
+        expected = edge(gray[..., [0, 0, 0]])
+
+        actual = edge(gray)
+        self.assertEqual(actual.shape, gray.shape)
+        self.assertTrue(np.array_equal(actual[..., 0], expected[..., 0]))
+
+    def test_npy(self):
+        """Test that .npy files are memory-mapped and written back unchanged"""
+
+        img = load_image(Path('tests/logo.png'))
+        save_image(img, self.dir / 'logo.npy')
+
+        mapped = load_image(self.dir / 'logo.npy')
+        self.assertIsInstance(mapped, np.memmap)
+        self.assertTrue(np.array_equal(mapped, img))
+
+        # Grayscale arrays without a channel axis are loaded as L images
+        np.save(self.dir / 'gray.npy', img[..., 0])
+        self.assertEqual(load_image(self.dir / 'gray.npy').shape, (250, 250, 1))
+
+        np.save(self.dir / 'float.npy', img.astype(np.float32))
+        with self.assertRaises(ValueError):
+            load_image(self.dir / 'float.npy')
+
+    def test_raw(self):
+        """Test interleaved and planar raw files, and operating on the mapped pixels"""
+
+        img = load_image(Path('tests/logo.png'))
+        shape = (img.shape[1], img.shape[0], img.shape[2])
+
+        for planar in (False, True):
+            with self.subTest(planar=planar):
+                save_image(img, self.dir / 'logo.raw', planar)
+                expected = img.transpose(2, 0, 1) if planar else img
+                self.assertEqual((self.dir / 'logo.raw').read_bytes(), expected.tobytes())
+
+                mapped = load_image(self.dir / 'logo.raw', shape, planar)
+                self.assertTrue(np.array_equal(mapped, img))
+
+                # Views of the mapped image are saved without copying the whole image first
+                view = mirror(crop(mapped, 10, 20, 200, 120))
+                save_image(view, self.dir / 'view.raw', planar)
+                self.assertTrue(np.array_equal(load_image(self.dir / 'view.raw', (190, 100, 4), planar),
+                                               img[20:120, 10:200][:, ::-1]))
+
+                self.assertTrue(np.array_equal(invert(mapped), invert(img)))
+
+        with self.assertRaises(ValueError):
+            load_image(self.dir / 'logo.raw')  # no size given
+        with self.assertRaises(ValueError):
+            load_image(self.dir / 'logo.raw', (250, 250, 3))  # size does not match
+
+    def test_box(self):
+        """Test that cropping while decoding gives the same pixels as cropping the decoded image"""
+
+        box = (10, 20, 200, 120)
+        for path in (Path('tests/logo.png'), self.dir / 'logo.jpg', self.dir / 'logo.tif', self.dir / 'logo-L.png'):
+            with self.subTest(file=path.name):
+                expected = crop(load_image(path), *box)
+                self.assertTrue(np.array_equal(load_image(path, box=box), expected))
+
+        # The box is validated as by crop
+        with self.assertRaises(ValueError):
+            load_image(Path('tests/logo.png'), box=(0, 0, 251, 10))
+
+    def test_max_size(self):
+        """Test downscaling while decoding, with and without a crop"""
+
+        for path in (Path('tests/logo.png'), self.dir / 'logo.jpg', self.dir / 'logo.tif'):
+            with self.subTest(file=path.name):
+                self.assertEqual(load_image(path, max_size=100).shape[:2], (100, 100))
+
+                # The aspect ratio of the region is kept (to the nearest pixel)
+                height, width = load_image(path, box=(0, 0, 250, 100), max_size=50).shape[:2]
+                self.assertEqual(width, 50)
+                self.assertAlmostEqual(height, 20, delta=1)
+
+                # Images which are already small enough are not scaled
+                self.assertEqual(load_image(path, max_size=300).shape[:2], (250, 250))
+
+        save_image(load_image(Path('tests/logo.png')), self.dir / 'logo.npy')
+        self.assertEqual(load_image(self.dir / 'logo.npy', box=(0, 0, 100, 50), max_size=20).shape, (10, 20, 4))
+
+    def test_encoder_options(self):
+        """Test that encoder options are only given to the formats which use them and round-trip losslessly"""
+
+        options = dict(compress_level=1, optimize=False, quality=90, subsampling='4:4:4', tiff_compression='lzw',
+                       strip_rows=16)
+        self.assertEqual(encoder_options(Path('a.png'), **options), {'compress_level': 1})
+        self.assertEqual(encoder_options(Path('a.jpg'), **options), {'quality': 90, 'subsampling': '4:4:4'})
+        self.assertEqual(encoder_options(Path('a.tif'), **options), {'compression': 'tiff_lzw', 'tiffinfo': {278: 16}})
+        self.assertEqual(encoder_options(Path('a.bmp'), **options), {})
+
+        img = load_image(Path('tests/logo.png'))
+        for name in ('fast.png', 'strips.tif'):
+            with self.subTest(file=name):
+                save_image(img, self.dir / name, options=encoder_options(self.dir / name, **options))
+                self.assertTrue(np.array_equal(load_image(self.dir / name), img))
+
+        with Image.open(self.dir / 'strips.tif') as saved:
+            self.assertEqual(saved.tag_v2[278], 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
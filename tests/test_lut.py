@@ -0,0 +1,132 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from operations import grayscale, invert, sepia, threshold
+from operations.lut import apply_pointwise, compile_pointwise
+
+
+class TestLookupTables(unittest.TestCase):
+    """Test the lookup table engine for pointwise operations"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create a random test image with transparency
+        cls.img = np.random.default_rng(0).integers(0, 256, (64, 48, 4), dtype=np.uint8)
+        cls.colour = cls.img[..., :3].astype(np.int64)
+
+    def test_invert(self):
+        expected = np.dstack((255 - self.img[..., :3], self.img[..., 3]))
+        self.assertTrue(np.array_equal(invert(self.img), expected))
+
+    def test_threshold(self):
+        expected = np.dstack((np.where(self.img[..., :3] < 100, 0, 255), self.img[..., 3]))
+        self.assertTrue(np.array_equal(threshold(self.img, 100), expected))
+
+        # Inverting the threshold also inverts alpha
+        self.assertTrue(np.array_equal(threshold(self.img, 100, invert=True), 255 - expected))
+
+    def test_grayscale(self):
+        """Test that the weighted sum is computed exactly (rounded down) into a single luminance channel"""
+
+        gray = (self.colour @ np.array([2989, 5870, 1140])) // 10000
+        expected = np.dstack((gray, self.img[..., 3]))
+        self.assertTrue(np.array_equal(grayscale(self.img), expected))
+        self.assertTrue(np.array_equal(grayscale(self.img[..., :3]), gray[..., np.newaxis]))
+
+    def test_grayscale_images(self):
+        """Test that L and LA images are processed natively and match their RGB(A) expansion"""
+
+        gray = self.img[..., [0, 3]]
+        rgb = gray[..., [0, 0, 0, 1]]
+
+        for specs in ((('invert',),), (('threshold', 100, False, True),), (('grayscale',), ('invert',))):
+            with self.subTest(specs=specs):
+                actual = apply_pointwise(gray, specs)
+                self.assertEqual(actual.shape, gray.shape)
+
+                # The RGBA result is gray (or already LA after grayscale)
+                expected = apply_pointwise(rgb, specs)
+                if expected.shape[2] == 4:
+                    expected = expected[..., [0, 3]]
+                self.assertTrue(np.array_equal(actual, expected))
+
+        # Sepia adds colour, so the image is expanded to RGBA
+        self.assertTrue(np.array_equal(sepia(gray), sepia(rgb)))
+        self.assertEqual(sepia(gray[..., :1]).shape, self.img.shape[:2] + (3,))
+
+    def test_sepia(self):
+        weights = np.array([[393, 769, 189], [349, 686, 168], [272, 534, 131]])
+        toned = np.minimum((self.colour @ weights.T) // 1000, 255)
+        expected = np.dstack((toned, self.img[..., 3]))
+        self.assertTrue(np.array_equal(sepia(self.img), expected))
+
+    def test_combination(self):
+        """Test that combined operations compile into as few passes as possible and match applying them in turn"""
+
+        specs = (('invert',), ('grayscale',), ('threshold', 128, False, False), ('invert',))
+        self.assertEqual(len(compile_pointwise(specs)), 1)
+        self.assertEqual(len(compile_pointwise((('sepia',), ('grayscale',)))), 2)
+
+        expected = invert(threshold(grayscale(invert(self.img))))
+        self.assertTrue(np.array_equal(apply_pointwise(self.img, specs), expected))
+
+    def test_layouts(self):
+        """Test that contiguous, strided and RGB images give the same results"""
+
+        expected = invert(self.img)
+        self.assertTrue(np.array_equal(invert(self.img[:, ::-1]), expected[:, ::-1]))
+        self.assertTrue(np.array_equal(invert(np.ascontiguousarray(self.img[..., :3])), expected[..., :3]))
+        self.assertTrue(np.array_equal(invert(self.img[:, 1:, :3]), expected[:, 1:, :3]))
+
+    def test_out(self):
+        """Test writing into a given buffer and in place"""
+
+        for func in (invert, grayscale, sepia, threshold):
+            with self.subTest(operation=func.__name__):
+                expected = func(self.img)
+
+                buffer = np.empty_like(expected)
+                self.assertIs(func(self.img, out=buffer), buffer)
+                self.assertTrue(np.array_equal(buffer, expected))
+
+                # In place (grayscale changes the number of channels, so it is done on an LA image)
+                img = self.img[..., [0, 3]] if func is grayscale else self.img
+                copy = img.copy()
+                func(copy, out=copy)
+                self.assertTrue(np.array_equal(copy, func(img)))
+
+        with self.assertRaises(ValueError):
+            invert(self.img, out=np.empty((2, 2, 4), dtype=np.uint8))
+
+    def test_out_allocations(self):
+        """Test that writing into a buffer only allocates small fixed-size blocks, not image-sized arrays"""
+
+        img = np.random.default_rng(1).integers(0, 256, (1024, 1024, 4), dtype=np.uint8)
+
+        for specs in ((('invert',),), (('sepia',), ('invert',), ('sepia',), ('threshold', 90, False, True))):
+            with self.subTest(specs=specs):
+                buffer = np.empty_like(img)
+                apply_pointwise(img, specs, out=buffer)  # build the cached tables first
+
+                tracemalloc.start()
+                apply_pointwise(img, specs, out=buffer)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                self.assertLess(peak, img.nbytes / 2)
+
+    def test_cache(self):
+        """Test that compiled tables are reused"""
+
+        specs = (('threshold', 17, True, False),)
+        self.assertIs(compile_pointwise(specs), compile_pointwise(specs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import json
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from operations import chain, convolve
+from operations.profiling import Profiler, add_hook, note_engine, profiled, remove_hook
+
+
+class TestProfiling(unittest.TestCase):
+    """Test the instrumentation of operations"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create a random test image with transparency
+        cls.img = np.random.default_rng(0).integers(0, 256, (64, 48, 4), dtype=np.uint8)
+
+    def test_chain_steps(self):
+        """Test that each step of a chain is recorded with its shapes and engine"""
+
+        with Profiler() as profiler, contextlib.redirect_stdout(io.StringIO()):
+            result = profiled('chain', lambda: chain(self.img, ['grayscale', 'blur', 'invert']), self.img)
+
+        names = [record.name for record in sorted(profiler.records, key=lambda record: record.start)]
+        self.assertEqual(names, ['chain', 'pointwise: grayscale', 'linear: blur', 'pointwise: invert'])
+
+        records = {record.name: record for record in profiler.records}
+        self.assertEqual(records['chain'].depth, 0)
+        self.assertEqual(records['linear: blur'].depth, 1)
+        self.assertEqual(records['chain'].input, '64x48x4 uint8')
+        self.assertEqual(records['chain'].output, 'x'.join(map(str, result.shape)) + ' uint8')
+        self.assertEqual(records['linear: blur'].engines, ['reference float64'])
+        self.assertEqual(records['pointwise: grayscale'].engines, ['lookup tables (1 pass)'])
+
+        # The enclosing operation includes the time and memory of its steps
+        self.assertGreaterEqual(records['chain'].wall, sum(records[name].wall for name in names[1:]))
+        self.assertGreaterEqual(records['chain'].allocated, records['linear: blur'].allocated)
+        self.assertGreater(records['linear: blur'].allocated, 0)
+
+        self.assertIn('reference float64', profiler.summary())
+
+    def test_chrome_trace(self):
+        """Test that the trace is a list of complete events"""
+
+        with Profiler() as profiler:
+            profiled('convolve', lambda: convolve(self.img, np.ones((3, 3)) / 9, method='direct'), self.img)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace.json'
+            profiler.write_trace(path)
+            trace = json.loads(path.read_text())
+
+        (event,) = trace['traceEvents']
+        self.assertEqual(event['name'], 'convolve')
+        self.assertEqual(event['ph'], 'X')
+        self.assertGreater(event['dur'], 0)
+        self.assertEqual(event['args']['engine'], 'direct float64')
+
+    def test_disabled(self):
+        """Test that nothing is recorded or traced without hooks"""
+
+        records = []
+        add_hook(records.append)
+        remove_hook(records.append)
+
+        self.assertEqual(profiled('invert', lambda: 42), 42)
+        note_engine('unused')
+        self.assertEqual(records, [])
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import importlib
+import io
+import types
+import unittest
+from argparse import Namespace
+
+import numpy as np
+
+from operations import convolve
+from operations.chaining import plan_chain
+from operations.registry import (FILTER, GEOMETRIC, POINTWISE, get_operation, operations, perform_operation,
+                                 register, unregister)
+from parse_args import parse_operation
+from tiling import halo_rows, process_tiled, supports_tiling
+
+# A linear filter (with its kernel declared, so chain can fuse it) registered by the tests
+EMBOSS = np.array([[-2, -1, 0], [-1, 1, 1], [0, 1, 2]], dtype=np.float64)
+
+
+class TestRegistry(unittest.TestCase):
+    """Test the operation registry and the dispatchers reading its metadata"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create a random test image with transparency
+        cls.img = np.random.default_rng(0).integers(0, 256, (60, 40, 4), dtype=np.uint8)
+
+    def register_emboss(self):
+        """Registers a third-party filter for the duration of a test."""
+
+        def add_arguments(parser):
+            parser.add_argument('-s', '--strength', type=float, default=1)
+
+        @register('emboss', FILTER, radius=1, cost=40, kernel=lambda: EMBOSS, help="Emboss the image",
+                  add_arguments=add_arguments)
+        def emboss(img, args):
+            return convolve(img, EMBOSS * (args.strength if args else 1))
+
+        self.addCleanup(unregister, 'emboss')
+
+    def test_third_party_operation(self):
+        """Test that a registered operation can be parsed, performed, tiled and chained"""
+
+        self.register_emboss()
+
+        args = parse_operation(['emboss', '--strength', '0.5'])
+        self.assertEqual((args.operation, args.strength), ('emboss', 0.5))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = perform_operation(self.img, 'emboss', args)
+        np.testing.assert_array_equal(expected, convolve(self.img, EMBOSS * 0.5))
+
+        # Filters are tiled with a halo of their radius
+        self.assertTrue(supports_tiling('emboss'))
+        self.assertEqual(halo_rows('emboss', args), 1)
+        np.testing.assert_array_equal(process_tiled(self.img, 'emboss', args, workers=3), expected)
+
+        # Its kernel is fused with the bounded blur before it
+        (step,) = plan_chain(['blur', 'emboss'])
+        self.assertEqual((step.kind, step.operations, step.kernel.shape), ('linear', ['blur', 'emboss'], (5, 5)))
+
+    def test_registration_errors(self):
+        """Test that unknown kinds, duplicate names and unknown operations are rejected"""
+
+        with self.assertRaises(ValueError):
+            register('emboss', 'sideways')
+        with self.assertRaises(ValueError):
+            register('invert', POINTWISE)
+        with self.assertRaises(ValueError):
+            get_operation('emboss')
+        with self.assertRaises(ValueError):
+            plan_chain(['grayscale', 'emboss'])
+
+    def test_unfusable_operations(self):
+        """Test that operations without fusion metadata are chained on their own"""
+
+        @register('posterize', POINTWISE, cost=10)
+        def posterize(img, args):
+            return img & 0xC0
+
+        @register('roll', GEOMETRIC, cost=0)
+        def roll(img, args):
+            return np.roll(img, 1, axis=1)
+
+        self.addCleanup(unregister, 'posterize')
+        self.addCleanup(unregister, 'roll')
+
+        plan = plan_chain(['invert', 'posterize', 'roll', 'mirrorH', 'mirrorH'])
+        self.assertEqual([(step.kind, step.operations) for step in plan],
+                         [('pointwise', ['invert']), ('other', ['posterize']), ('other', ['roll'])])
+
+    def test_declared_alpha(self):
+        """Test that operations declared to keep the alpha channel do (with their default arguments)"""
+
+        for operation in operations():
+            if operation.kind in (POINTWISE, FILTER) and operation.chainable and operation.name != 'convolve':
+                with self.subTest(operation.name):
+                    result = operation.perform(self.img, None)
+                    self.assertEqual(operation.keeps_alpha_for(), np.array_equal(result[..., -1], self.img[..., -1]))
+
+        self.assertFalse(get_operation('threshold').keeps_alpha_for(Namespace(invert=True)))
+
+    def test_tiling_metadata(self):
+        """Test that tiling follows the registered kinds and radii"""
+
+        self.assertTrue(supports_tiling('sepia'))
+        self.assertTrue(supports_tiling('edge'))  # global, with a two-pass implementation
+        self.assertFalse(supports_tiling('rotateCW'))
+        self.assertFalse(supports_tiling('chain'))
+        self.assertEqual(halo_rows('boxblur', Namespace(radius=2, passes=3)), 6)
+        self.assertEqual(halo_rows('edge', Namespace()), 3)
+
+    def test_package_exports(self):
+        """Test that importing the module of each operation does not hide the operation on the package"""
+
+        import operations
+
+        for name, module in operations._EXPORTS.items():
+            with self.subTest(name):
+                importlib.import_module(f'operations.{module}')
+                self.assertIsInstance(getattr(operations, module), types.ModuleType)
+                self.assertIs(getattr(operations, name), getattr(getattr(operations, module), name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -42,6 +42,16 @@ class TestCrop(unittest.TestCase):
 
         self.assertTrue(np.array_equal(actual, expected))
 
+    def test_view_and_out(self):
+        """Test that a rotation is a view of the image unless a buffer to copy into is given"""
+
+        self.assertTrue(np.shares_memory(rotate(self.img), self.img))
+
+        # Rotating a square image in place
+        img = self.img.copy()
+        self.assertIs(rotate(img, out=img), img)
+        self.assertTrue(np.array_equal(img, np.rot90(self.img, -1)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import http.client
+import io
+import json
+import threading
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from operations import invert
+from server import JobLimiter, QueueFullError, create_server
+
+
+class TestServer(unittest.TestCase):
+    """Test the job server"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Start a server on a free port
+        cls.server = create_server(port=0, concurrency=2, queue_size=2)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        with open('tests/logo.png', 'rb') as f:
+            cls.body = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def post(self, url: str, body: bytes = b''):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1])
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection.request('POST', url, body=body)
+            response = connection.getresponse()
+            content = response.read()
+        connection.close()
+        return response.status, content
+
+    def test_process(self):
+        """Test that a job returns the processed image"""
+
+        status, content = self.post('/process?op=invert', self.body)
+        self.assertEqual(status, 200)
+
+        expected = invert(np.array(Image.open('tests/logo.png')))
+        self.assertTrue(np.array_equal(np.array(Image.open(io.BytesIO(content))), expected))
+
+    def test_invalid_job(self):
+        """Test that invalid operations and missing kernels are rejected"""
+
+        for url in ('/process?op=boxblur%20-r%20x', '/process?op=convolve%203', '/process'):
+            with self.subTest(url=url):
+                status, content = self.post(url, self.body)
+                self.assertEqual(status, 400)
+                self.assertIn('error', json.loads(content))
+
+    def test_backpressure(self):
+        """Test that jobs beyond the running and waiting limits are rejected"""
+
+        limiter = JobLimiter(concurrency=1, queue_size=0)
+        with limiter:
+            with self.assertRaises(QueueFullError):
+                with limiter:
+                    pass
+        self.assertEqual(limiter.status()['rejected'], 1)
+        self.assertEqual(limiter.status()['completed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import contextlib
+import io
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_io import FrameWriter, load_frames
+from operations import invert
+from stream import read_frames, run_frames
+
+
+class ListWriter:
+    """A frame writer keeping the frames it is given."""
+
+    def __init__(self):
+        self.frames = []
+        self.durations = []
+
+    def write(self, img, duration=None):
+        self.frames.append(img)
+        self.durations.append(duration)
+
+
+class TestStream(unittest.TestCase):
+    """Test streaming frames through an operation"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Create frames from the test image, shifted further in each
+        img = np.array(Image.open('tests/logo.png').convert('RGBA'))[:64, :80]
+        cls.frames = [np.roll(img, 7 * i, axis=1) for i in range(10)]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_order(self):
+        """Test that frames processed by several workers are written in their original order"""
+
+        def process(img):
+            time.sleep(np.random.default_rng(int(img[0, 0, 0])).uniform(0, 0.01))  # finish out of order
+            return invert(img)
+
+        writer = ListWriter()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            count = run_frames(((frame, 40) for frame in self.frames), process, writer, workers=4)
+
+        self.assertEqual(count, len(self.frames))
+        for result, frame in zip(writer.frames, self.frames):
+            np.testing.assert_array_equal(result, invert(frame))
+        self.assertEqual(writer.durations, [40] * len(self.frames))
+        self.assertIn("frames/s", output.getvalue())
+
+    def test_bounded(self):
+        """Test that no more frames than the prefetch depth are held between reading and writing"""
+
+        lock = threading.Lock()
+        held = [0, 0]  # frames read but not yet written, and the most at once
+
+        def frames():
+            for frame in self.frames:
+                with lock:
+                    held[0] += 1
+                    held[1] = max(held)
+                yield frame, None
+
+        class CountingWriter(ListWriter):
+            def write(self, img, duration=None):
+                super().write(img, duration)
+                with lock:
+                    held[0] -= 1
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_frames(frames(), invert, CountingWriter(), workers=2, depth=3)
+
+        self.assertLessEqual(held[1], 3)
+
+    def test_errors(self):
+        """Test that an error processing a frame stops the stream and is raised"""
+
+        def process(img):
+            if img is self.frames[4]:
+                raise ValueError("bad frame")
+            return img
+
+        writer = ListWriter()
+        with self.assertRaisesRegex(ValueError, "bad frame"):
+            run_frames(((frame, None) for frame in self.frames), process, writer, workers=2, depth=2)
+        self.assertLessEqual(len(writer.frames), 4)
+
+        # The animation is not written
+        with self.assertRaises(ValueError), FrameWriter(self.path / 'failed.gif') as gif_writer:
+            gif_writer.write(self.frames[0])
+            raise ValueError("bad frame")
+        self.assertFalse((self.path / 'failed.gif').exists())
+
+    def test_formats(self):
+        """Test writing and reading back multi-page TIFF files, animations and files per frame"""
+
+        for name in ['pages.tiff', 'animation.gif', 'animation.png', 'frames/{index:02d}.png']:
+            with self.subTest(name), FrameWriter(self.path / name) as writer:
+                for frame in self.frames[:4]:
+                    writer.write(frame, 50)
+
+        # TIFF and PNG files (and sequences) are lossless
+        for source in ['pages.tiff', 'animation.png', 'frames']:
+            loaded = list(read_frames(str(self.path / source)))
+            self.assertEqual(len(loaded), 4)
+            for (frame, _), expected in zip(loaded, self.frames):
+                np.testing.assert_array_equal(frame, expected)
+
+        # GIF frames are reduced to a palette, keep their durations and come back with the same colour model
+        gif = list(load_frames(self.path / 'animation.gif'))
+        self.assertEqual([(frame.shape, duration) for frame, duration in gif], [((64, 80, 4), 50)] * 4)
+
+        with self.assertRaises(ValueError):
+            FrameWriter(self.path / 'frames.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+import unittest
+from argparse import Namespace
+
+import numpy as np
+from PIL import Image
+
+import operations as op
+from operations.convolving import PRECISIONS
+from operations.registry import perform_operation
+from tiling import BYTES_PER_VALUE, process_tiled, strip_rows
+
+
+class TestTiling(unittest.TestCase):
+    """Test strip-by-strip processing against the in-memory operations"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Load the test image and work out the memory needed per row
+        cls.img = np.array(Image.open('tests/logo.png'))
+        cls.row_bytes = cls.img.shape[1] * cls.img.shape[2] * BYTES_PER_VALUE
+
+    def assertTiledEqual(self, op_name, args, expected):
+        for extra_rows in (1, 10):
+            with self.subTest(operation=op_name, extra_rows=extra_rows):
+                budget = (2 * 20 + extra_rows) * self.row_bytes
+                actual = process_tiled(self.img, op_name, args, budget)
+                self.assertTrue(np.array_equal(actual, expected))
+
+    def test_boxblur(self):
+        for precision in PRECISIONS:
+            args = Namespace(radius=3, passes=2, collapse=False, precision=precision)
+            self.assertTiledEqual('boxblur', args, op.box_blur(self.img, 3, 2, precision=precision))
+
+    def test_convolve(self):
+        kernel = np.random.default_rng(0).random((5, 5)) / 12
+        for precision in PRECISIONS:
+            args = Namespace(kernel=kernel, iterations=2, method='auto', collapse=False, precision=precision)
+            self.assertTiledEqual('convolve', args, op.convolve(self.img, kernel, 2, precision=precision))
+
+    def test_edge(self):
+        args = Namespace(threshold=100, collapse=False, operator='sobel', direction=False)
+        self.assertTiledEqual('edge', args, op.edge(self.img, 100))
+
+    def test_gaussblur(self):
+        for precision in PRECISIONS:
+            for sigma in (2, 5):
+                args = Namespace(sigma=sigma, precision=precision)
+                self.assertTiledEqual('gaussblur', args, op.gaussian_blur(self.img, sigma, precision))
+
+    def test_sharpen(self):
+        for precision in PRECISIONS:
+            args = Namespace(amount=2, precision=precision)
+            self.assertTiledEqual('sharpen', args, op.sharpen(self.img, 2, precision))
+
+    def test_workers(self):
+        """Test that multi-threaded processing gives the same bytes as the in-memory path, at every precision"""
+
+        # A larger noisy image, so the running sums of the blurs span many strips
+        rng = np.random.default_rng(1)
+        img = np.array(Image.fromarray(self.img).resize((600, 450)))
+        img = np.clip(img + rng.integers(-20, 20, img.shape), 0, 255).astype(np.uint8)
+
+        for op_name, args in [('boxblur', Namespace(radius=4, passes=3, collapse=False)),
+                              ('convolve', Namespace(kernel=np.ones((3, 3)) / 9, iterations=1, method='auto',
+                                                     collapse=False)),
+                              ('edge', Namespace(threshold=150, collapse=False, operator='sobel', direction=False)),
+                              ('gaussblur', Namespace(sigma=2)),
+                              ('gaussblur', Namespace(sigma=5)),
+                              ('sharpen', Namespace(amount=3))]:
+            for precision in PRECISIONS:
+                args = Namespace(**{**vars(args), 'precision': precision})
+                with self.subTest(operation=op_name, args=args):
+                    expected = perform_operation(img, op_name, args, verbose=False)
+                    multi = process_tiled(img, op_name, args, workers=4)
+                    self.assertTrue(np.array_equal(multi, expected))
+
+    def test_budget_too_small(self):
+        """Test that a budget which can not fit one row with its halo is rejected"""
+
+        with self.assertRaises(ValueError):
+            strip_rows(1000, 4, 10, 1000)
+
+        # The reported limit is enough for every worker
+        with self.assertRaisesRegex(ValueError, r"at least (\d+) bytes") as context:
+            strip_rows(1000, 4, 10, 1000, workers=4)
+        needed = int(context.exception.args[0].split("at least ")[1].split()[0])
+        self.assertEqual(strip_rows(1000, 4, 10, needed, workers=4), 1)
+        with self.assertRaises(ValueError):
+            strip_rows(1000, 4, 10, needed - 1, workers=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#  Copyright (C) 2023  Cullen St-Clair
+#  Licensed Under the GNU GPL v3.0 License
+#  See LICENSE for more information
+
+"""Memory-bounded and multi-threaded execution of operations on horizontal strips of an image."""
+
+import math
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from operations.edge_detection import edge_image, gradients
+from operations.profiling import profiled
+from operations.registry import FILTER, POINTWISE, get_operation
+
+# Global operations with their own two-pass strip implementation (see process_tiled)
+TWO_PASS_OPERATIONS = ['edge']
+
+# Number of strips given to each worker when no memory limit is set (smaller strips balance the load better)
+STRIPS_PER_WORKER = 4
+
+# Approximate working memory per channel value of a strip (uint8 input and output plus float64 buffers)
+BYTES_PER_VALUE = 40
+
+
+def supports_tiling(op_name: str) -> bool:
+    """Returns whether an operation can be processed in strips.
+
+    Pointwise operations and filters can be (by their registered kind), as can the global operations
+    implemented in two passes.
+    """
+
+    try:
+        kind = get_operation(op_name).kind
+    except ValueError:
+        return False
+    return kind in (POINTWISE, FILTER) or op_name in TWO_PASS_OPERATIONS
+
+
+def halo_rows(op_name: str, args: Namespace) -> int:
+    """Returns the number of neighbouring rows above and below a strip that its output depends on.
+
+    Args:
+        op_name (str): The name of the operation
+        args (Namespace): The arguments of the operation
+
+    Returns:
+        int: The halo height in rows (the radius registered for the operation)
+    """
+
+    return get_operation(op_name).radius_for(args)
+
+
+def strip_rows(width: int, channels: int, halo: int, max_memory: int, workers: int = 1) -> int:
+    """Returns the number of output rows per strip which keeps the working memory within the budget.
+
+    Args:
+        width (int): The width of the image
+        channels (int): The number of channels of the image
+        halo (int): The halo height in rows
+        max_memory (int): The working memory budget in bytes, shared by the workers
+        workers (int, optional): The number of strips processed at once. Defaults to 1
+
+    Raises:
+        ValueError: If the budget can not fit a single row with its halo
+
+    Returns:
+        int: The number of rows per strip
+    """
+
+    row_bytes = width * channels * BYTES_PER_VALUE
+    rows = max_memory // workers // row_bytes - 2 * halo
+
+    if rows < 1:
+        # Each worker needs room for a strip of one row with its halo
+        needed = (2 * halo + 1) * row_bytes * workers
+        raise ValueError(f"Memory limit is too small for this image and operation (at least {needed} bytes needed)")
+
+    return rows
+
+
+def process_tiled(img: np.ndarray, op_name: str, args: Namespace, max_memory: int = None, workers: int = 1,
+                  out: np.ndarray = None) -> np.ndarray:
+    """Performs an operation one horizontal strip at a time, producing the same result as the in-memory path.
+
+    Each strip is processed together with a halo of neighbouring rows wide enough to cover the kernel,
+    which is then discarded. Edge detection normalizes by the maximum gradient of the whole image,
+    so it makes two passes over the strips (finding the maximum, then producing the output).
+
+    With multiple workers, strips are processed concurrently on a thread pool (numpy and scipy release the GIL
+    while filtering) and each writes to its own rows of the output, so the result is the same bytes
+    as with a single worker.
+
+    Args:
+        img (np.ndarray): The image to process (may be a memory-mapped array)
+        op_name (str): The name of the operation (see supports_tiling)
+        args (Namespace): The arguments of the operation
+        max_memory (int, optional): The working memory budget in bytes, shared by all workers
+            (excluding the input and output images). Defaults to no limit
+        workers (int, optional): The number of threads to process strips with. Defaults to 1
+        out (np.ndarray, optional): The array to write the result into. Defaults to a new array
+
+    Raises:
+        ValueError: If the operation can not be tiled or the budget is too small
+
+    Returns:
+        np.ndarray: The processed image
+    """
+
+    if not supports_tiling(op_name):
+        raise ValueError(f"Operation {op_name} can not be performed in strips")
+
+    halo = halo_rows(op_name, args)
+    if max_memory is not None:
+        rows = strip_rows(img.shape[1], img.shape[2], halo, max_memory, workers)
+    else:
+        rows = math.ceil(img.shape[0] / (workers * STRIPS_PER_WORKER))
+    strips = list(strip_bounds(img.shape[0], rows, halo))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if op_name == 'edge':
+            # First pass: find the maximum gradient magnitude over the whole image
+            def strip_peak(bounds):
+                start, stop, lo, hi = bounds
+                magnitude, _ = gradients(img[lo:hi], args.collapse, args.operator)
+                return np.max(_crop(magnitude, start - lo, stop - start))
+
+            peak = max(executor.map(strip_peak, strips))
+
+            # Second pass: threshold each strip against the image's peak exactly as edge does
+            def process(strip):
+                magnitude, angle = gradients(strip, args.collapse, args.operator, args.direction)
+                return edge_image(strip, magnitude, angle, peak, args.threshold)
+        else:
+            process = strip_function(op_name, args)
+
+        def run_strip(bounds) -> np.ndarray:
+            start, stop, lo, hi = bounds
+            result = profiled(f"{op_name} rows {start}-{stop}", lambda: process(img[lo:hi]), img[lo:hi])
+            return _crop(result, start - lo, stop - start)
+
+        def process_strip(bounds):
+            start, stop, _, _ = bounds
+            out[start:stop] = run_strip(bounds)
+
+        # The first strip is processed on its own, as the operation may change the number of channels
+        # (i.e. grayscale produces a single luminance channel)
+        start, stop, _, _ = strips[0]
+        first = run_strip(strips[0])
+        if out is None:
+            out = np.empty(img.shape[:2] + first.shape[2:], dtype=np.uint8)
+        out[start:stop] = first
+
+        # Consume the results so that any exception is raised here
+        for _ in executor.map(process_strip, strips[1:]):
+            pass
+
+    return out
+
+
+def strip_bounds(height: int, rows: int, halo: int):
+    """Yields (start, stop, lo, hi) for each strip: its output rows and its input rows including the halo."""
+
+    for start in range(0, height, rows):
+        stop = min(start + rows, height)
+        yield start, stop, max(0, start - halo), min(height, stop + halo)
+
+
+def strip_function(op_name: str, args: Namespace):
+    """Returns a function which applies the operation (with its arguments) to a strip."""
+
+    if not supports_tiling(op_name) or op_name in TWO_PASS_OPERATIONS:
+        raise ValueError(f"Operation {op_name} can not be performed in strips")
+
+    perform = get_operation(op_name).perform
+    return lambda strip: perform(strip, args)
+
+
+def _crop(result: np.ndarray, offset: int, rows: int) -> np.ndarray:
+    """Removes the halo rows from a processed strip."""
+    return result[offset:offset + rows]
@@ -4,12 +4,16 @@
 
 from argparse import ArgumentTypeError
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import numpy as np
+if TYPE_CHECKING:
+    import numpy as np
 
 
-def get_kernel_from_terminal(kernel_size: int) -> np.ndarray:
+def get_kernel_from_terminal(kernel_size: int) -> 'np.ndarray':
     """Read a square kernel from the terminal row by row."""
+    import numpy as np  # imported here so that parsing arguments (with the validators below) does not load numpy
+
     kernel = np.zeros((kernel_size, kernel_size), dtype=np.float64)
     for i in range(kernel_size):
         row = input(f"Enter row {i + 1} of the kernel: ").replace(',', '')
@@ -39,6 +43,22 @@ def get_file_size(file: Path) -> str:
         return f'{round(size / 1024 ** 3, 2)} GB'
 
 
+def memory_size(value):
+    """Check that the value is a positive amount of memory (i.e. 512M, 2G or a number of bytes) and return it in bytes"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    text = str(value).strip().upper().removesuffix('B')
+    try:
+        if text and text[-1] in units:
+            ivalue = int(float(text[:-1]) * units[text[-1]])
+        else:
+            ivalue = int(text)
+    except ValueError:
+        raise ArgumentTypeError(f"'{value}' is an invalid memory size (i.e. 512M, 2G)")
+    if ivalue <= 0:
+        raise ArgumentTypeError(f"'{value}' is an invalid memory size (i.e. 512M, 2G)")
+    return ivalue
+
+
 def non_negative_int(value):
     """Check that the value is a non-negative integer"""
     try: